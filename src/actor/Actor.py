@@ -5,7 +5,7 @@ from panda3d.pphysics import *
 
 from direct.directbase import DirectRender
 from direct.directnotify.DirectNotifyGlobal import directNotify
-from tf.tfbase import CollisionGroups
+from tf.tfbase import CollisionGroups, TFFilters
 from tf.tfbase.SurfaceProperties import SurfaceProperties
 
 from .AnimEvents import AnimEvent, AnimEventType
@@ -13,6 +13,9 @@ from .HitBox import HitBox
 from .Model import Model
 from .Ragdoll import Ragdoll
 
+syncHitBoxesPColl = PStatCollector("App:HitBoxes:Sync")
+hitBoxesSyncedPColl = PStatCollector("HitBoxes:Synced")
+hitBoxesSkippedPColl = PStatCollector("HitBoxes:SyncSkipped")
 
 class Actor(Model):
     """
@@ -34,6 +37,10 @@ class Actor(Model):
 
     AllCharacters = NodePathCollection()
 
+    # Bumped every time all characters are animated at once.  Hit boxes
+    # synchronized before that need to be re-synced.
+    AnimationGeneration = 0
+
     def __init__(self):
         Model.__init__(self)
 
@@ -46,7 +53,14 @@ class Actor(Model):
         # Boxes parented to joints for hit detection.
         # TODO: Use an aggregate.
         self.hitBoxes = []
-        self.lastHitBoxSyncTime = 0.0
+        # Bumped whenever something changes the pose of the hit boxes other
+        # than moving the character node itself, ie animation or lag
+        # compensation.  syncHitBoxes() does nothing if neither this nor the
+        # character's net transform changed since the last sync.
+        self.hitBoxGeneration = 0
+        self.hitBoxSyncGeneration = -1
+        self.hitBoxSyncAnimGeneration = -1
+        self.hitBoxSyncTransform = None
         self.hitBoxesEnabled = False
 
         # Set of Actors that are joint merged to me.
@@ -69,6 +83,17 @@ class Actor(Model):
     @staticmethod
     def updateAllAnimations():
         CharacterNode.animateCharacters(Actor.AllCharacters)
+        Actor.AnimationGeneration += 1
+        Actor.resetHitBoxStats()
+
+    @staticmethod
+    def resetHitBoxStats():
+        """
+        Resets the hit box sync counters reported to PStats.  Called once
+        per frame.
+        """
+        hitBoxesSyncedPColl.setLevel(0)
+        hitBoxesSkippedPColl.setLevel(0)
 
     @staticmethod
     def setGlobalActivitySeed(seed):
@@ -532,6 +557,7 @@ class Actor(Model):
 
         if update:
             self.character.update()
+            self.invalidateHitBoxes()
 
         if net:
             return self.character.getAttachmentNetTransform(attachment)
@@ -572,6 +598,7 @@ class Actor(Model):
         if not self.character:
             return
         self.character.update()
+        self.invalidateHitBoxes()
 
     def buildAnimTable(self):
         """
@@ -587,7 +614,7 @@ class Actor(Model):
     def cleanup(self):
         Model.cleanup(self)
         self.channelsByName = None
-        self.lastHitBoxSyncTime = None
+        self.hitBoxSyncTransform = None
         self.hitBoxes = None
 
         # Remove link to my parent.
@@ -611,6 +638,7 @@ class Actor(Model):
             hbox.body.clearPythonTag("entity")
             hbox.body.clearPythonTag("object")
             hbox.body.clearPythonTag("hitbox")
+            TFFilters.clearActorFilterData(hbox.body)
             if hbox.body.getScene():
                 hbox.body.removeFromScene(base.physicsWorld)
             hbox.body = None
@@ -710,6 +738,7 @@ class Actor(Model):
         body.setPythonTag("entity", self)
         body.setPythonTag("object", self)
         self.hitBoxes.append(hbox)
+        self.invalidateHitBoxes()
 
     def disableHitBoxes(self):
         """
@@ -734,6 +763,7 @@ class Actor(Model):
             if not hbox.body.getScene():
                 hbox.body.addToScene(base.physicsWorld)
         self.hitBoxesEnabled = True
+        self.invalidateHitBoxes()
 
     def syncHitBoxes(self):
         """
@@ -744,20 +774,34 @@ class Actor(Model):
         if not self.hitBoxes or not self.character:
             return
 
-        #now = base.clockMgr.getTime()
-        #if now == self.lastHitBoxSyncTime:
-            # We're already synchronized with the current point in time.
-        #    return
+        netTransform = self.characterNp.getNetTransform()
+        if self.hitBoxSyncGeneration == self.hitBoxGeneration and \
+            self.hitBoxSyncAnimGeneration == Actor.AnimationGeneration and \
+            netTransform == self.hitBoxSyncTransform:
+            # Nothing moved since we last synced.
+            hitBoxesSkippedPColl.addLevel(1)
+            return
+
+        syncHitBoxesPColl.start()
 
-        #self.lastHitBoxSyncTime = now
+        self.hitBoxSyncGeneration = self.hitBoxGeneration
+        self.hitBoxSyncAnimGeneration = Actor.AnimationGeneration
+        self.hitBoxSyncTransform = netTransform
 
-        netTransform = self.characterNp.getNetTransform().getMat()
+        netMat = netTransform.getMat()
         for hbox in self.hitBoxes:
-            hboxMat = self.character.getJointNetTransform(hbox.joint) * netTransform
+            hboxMat = self.character.getJointNetTransform(hbox.joint) * netMat
             hbox.body.setTransform(TransformState.makeMat(hboxMat))
 
+        hitBoxesSyncedPColl.addLevel(1)
+        syncHitBoxesPColl.stop()
+
     def invalidateHitBoxes(self):
-        self.lastHitBoxSyncTime = 0.0
+        """
+        Forces the next syncHitBoxes() call to re-sync the hit boxes.  Call
+        this after changing the character's pose.
+        """
+        self.hitBoxGeneration += 1
 
     def needsToProcessAnimationEvents(self):
         if not self.character:
@@ -102,6 +102,8 @@ class DistributedChar(Actor, DistributedEntity):
             # Parent model to entity.
             self.modelNp.reparentTo(self)
         Actor.onModelChanged(self)
+        # Hit boxes were rebuilt.
+        self.updateFilterData()
 
     def becomeRagdoll(self, forceJoint, forcePosition, forceVector, initialVel):
         if self.ragdoll:
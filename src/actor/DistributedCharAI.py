@@ -1,6 +1,9 @@
 
+from panda3d.core import NodePath
+
 from tf.entity.DistributedEntity import DistributedEntityAI
-from tf.tfbase.TFGlobals import SolidShape
+from tf.tfbase.TFGlobals import (HITBOX_PADDING, SolidShape,
+                                 sphereIntersectsCone)
 
 from .Actor import Actor
 from .AnimEvents import AnimEventType
@@ -21,6 +24,23 @@ class DistributedCharAI(Actor, DistributedEntityAI):
         for char in DistributedCharAI.AllChars:
             char.syncHitBoxes()
 
+    @staticmethod
+    def syncHitBoxesInCone(origin, direction, distance, spread, coneRadius=0.0):
+        """
+        Like syncAllHitBoxes(), but skips characters whose bounds can't
+        overlap the given ray or cone.  Must be called after lag
+        compensation has moved players to their backtracked positions.
+        """
+        for char in DistributedCharAI.AllChars:
+            if not char.hitBoxes:
+                continue
+            if char.hullMins != char.hullMaxs:
+                center = char.getPos(NodePath()) + (char.hullMins + char.hullMaxs) * 0.5
+                radius = (char.hullMaxs - char.hullMins).length() * 0.5 + HITBOX_PADDING
+                if not sphereIntersectsCone(center, radius, origin, direction, distance, spread, coneRadius):
+                    continue
+            char.syncHitBoxes()
+
     def delete(self):
         DistributedCharAI.AllChars.remove(self)
         self.cleanup()
@@ -32,6 +52,8 @@ class DistributedCharAI(Actor, DistributedEntityAI):
             # Parent model to entity.
             self.modelNp.reparentTo(self)
         Actor.onModelChanged(self)
+        # Hit boxes were rebuilt.
+        self.updateFilterData()
 
     def loadModelBBoxIntoHull(self):
         data = self.modelData
@@ -0,0 +1,111 @@
+"""BotThinkScheduler module: contains the BotThinkScheduler class."""
+
+import collections
+import time
+
+from panda3d.core import PStatCollector
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+botThinkPColl = PStatCollector("App:BotThink")
+botThinksPColl = PStatCollector("BotAI:Thinks")
+botDeferredPColl = PStatCollector("BotAI:Deferred")
+
+class BotThinkScheduler:
+    """
+    Time-slices the expensive decision making of bots (perception, tactical
+    mode and movement target selection) across ticks.  Each tick, bots that
+    have gone the longest without thinking get to think until the per-tick
+    budget is used up; the rest keep acting on their previous decisions and
+    go first next tick.  Bots still simulate and issue a PlayerCommand every
+    tick.
+
+    If maxThinksPerTick is set, it replaces the time budget: that many bots
+    think each tick no matter how long they take, so which bot thinks on
+    which tick doesn't depend on wall-clock time.
+    """
+
+    notify = directNotify.newCategory("BotThinkScheduler")
+
+    def __init__(self, budget, minInterval=3, maxInterval=15):
+        # Seconds of bot thinking allowed per tick.
+        self.budget = budget
+        # A bot thinks at most once every minInterval ticks.
+        self.minInterval = minInterval
+        # A bot that hasn't thought in maxInterval ticks thinks regardless
+        # of the budget.
+        self.maxInterval = maxInterval
+        # Fixed number of thinks per tick instead of the time budget, or 0.
+        self.maxThinksPerTick = 0
+
+        # Bots ordered by the tick they last thought on, oldest first.
+        self.queue = collections.deque()
+        self.lastThinkTicks = {}
+
+        self.numThinks = 0
+        self.numDeferred = 0
+        self.task = None
+
+    def start(self, sort=-1):
+        if not self.task:
+            self.task = base.simTaskMgr.add(self.__thinkTask, 'botThink', sort=sort)
+
+    def stop(self):
+        if self.task:
+            self.task.remove()
+            self.task = None
+
+    def addBot(self, bot):
+        if bot in self.lastThinkTicks:
+            return
+        # Think as soon as possible.
+        self.lastThinkTicks[bot] = -1
+        self.queue.appendleft(bot)
+
+    def removeBot(self, bot):
+        if bot not in self.lastThinkTicks:
+            return
+        del self.lastThinkTicks[bot]
+        self.queue.remove(bot)
+
+    def __thinkTask(self, task):
+        tick = base.tickCount
+        queue = self.queue
+        lastThinkTicks = self.lastThinkTicks
+        perfCounter = time.perf_counter
+
+        botThinkPColl.start()
+        start = perfCounter()
+        numThinks = 0
+        maxThinks = self.maxThinksPerTick
+        for _ in range(len(queue)):
+            bot = queue[0]
+            sinceThink = tick - lastThinkTicks[bot]
+            if sinceThink < self.minInterval:
+                # Everyone after this one thought even more recently.
+                break
+            if maxThinks:
+                if numThinks >= maxThinks:
+                    break
+            elif numThinks and sinceThink < self.maxInterval and (perfCounter() - start) >= self.budget:
+                break
+            queue.popleft()
+            bot.think()
+            lastThinkTicks[bot] = tick
+            queue.append(bot)
+            numThinks += 1
+        botThinkPColl.stop()
+
+        # Bots that were due but didn't get to think this tick.
+        deferred = 0
+        for bot in queue:
+            if (tick - lastThinkTicks[bot]) < self.minInterval:
+                break
+            deferred += 1
+
+        self.numThinks += numThinks
+        self.numDeferred += deferred
+        botThinksPColl.setLevel(numThinks)
+        botDeferredPColl.setLevel(deferred)
+
+        return task.cont
@@ -9,6 +9,8 @@ from tf.player.PlayerCommand import PlayerCommand
 from tf.player.TFClass import BaseSpeed, Class
 from tf.tfbase import CollisionGroups, TFFilters, TFGlobals
 
+from .NavGraph import NavPath
+
 
 class TacicalMode:
     Retreat = 0
@@ -33,6 +35,10 @@ PRIMARY = 0
 SECONDARY = 1
 MELEE = 2
 
+# How far away bots can notice other players.  0 means no limit, which is
+# how bots used to behave.
+bot_perception_range = ConfigVariableDouble("tf-bot-perception-range", 3000.0)
+
 WeaponDists = {
     Class.Scout: (
         ((0, 200), PRIMARY),
@@ -104,10 +110,10 @@ class EnemySelection:
 
     def addPlayerDamage(self, player, dmg):
         if not player in self.playerDamages:
-            self.playerDamages[player] = [dmg, globalClock.frame_time]
+            self.playerDamages[player] = [dmg, base.clockMgr.getTime()]
         else:
             self.playerDamages[player][0] += dmg
-            self.playerDamages[player][1] = globalClock.frame_time
+            self.playerDamages[player][1] = base.clockMgr.getTime()
 
     def clearPlayerDamage(self, plyr):
         if plyr in self.playerDamages:
@@ -119,20 +125,22 @@ class EnemySelection:
         self.visiblePlayers = []
 
         myEyes = self.bot.getEyePosition()
-        for team, players in base.game.playersByTeam.items():
-            if team == self.bot.team and self.bot.tfClass != Class.Medic:
+        if self.bot.tfClass != Class.Medic:
+            team = TFGlobals.getEnemyTeam(self.bot.team)
+        else:
+            team = None
+        perceptionRange = bot_perception_range.value
+        for pl in base.entGrid.queryCone(myEyes, viewForward, 0.35, perceptionRange or None,
+                                         entType=DistributedTFPlayerAI.EntTypePlayer, team=team):
+            if pl == self.bot:
+                continue
+            if pl.team not in base.game.playersByTeam:
+                continue
+            if pl.isDead():
                 continue
-            for pl in players:
-                if pl == self.bot:
-                    continue
-                if pl.isDead():
-                    continue
-                toPlayer = (pl.getEyePosition() - myEyes).normalized()
-                if toPlayer.dot(viewForward) < 0.35:
-                    continue
-                if not self.bot.isEntityVisible(pl, CollisionGroups.World)[0]:
-                    continue
-                self.visiblePlayers.append(pl)
+            if not self.bot.isEntityVisible(pl, CollisionGroups.World)[0]:
+                continue
+            self.visiblePlayers.append(pl)
 
         if self.visiblePlayers:
             self.visiblePlayers.sort(key = lambda x: (x.getEyePosition() - myEyes).lengthSquared())
@@ -146,7 +154,7 @@ class EnemySelection:
 
         dmgTimeMax = 5.0
 
-        now = globalClock.frame_time
+        now = base.clockMgr.getTime()
 
         points = 0
 
@@ -252,6 +260,9 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
 
         self.combatStanding = 0
         self.targetMovePos = None
+        # Path through the level's nav graph to targetMovePos.
+        self.navPath = None
+        self.roamTarget = None
 
         self.accept('PlayerDied', self.__onPlayerDied)
 
@@ -262,7 +273,7 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
         elif self.shouldRetreat():
             self.tacticalMode = TacicalMode.Retreat
 
-        elif self.nextTacticalModeChange <= globalClock.frame_time:
+        elif self.nextTacticalModeChange <= base.clockMgr.getTime():
             if self.combatStanding >= 400:
                 self.tacticalMode = TacicalMode.Ambush
             elif self.combatStanding >= 200:
@@ -279,10 +290,10 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
                 else:
                     self.tacticalMode = TacicalMode.Strafe
 
-            self.nextTacticalModeChange = globalClock.frame_time + random.uniform(2, 5)
+            self.nextTacticalModeChange = base.clockMgr.getTime() + random.uniform(2, 5)
 
             if self.tacticalMode == TacicalMode.Strafe:
-                self.nextStrafeChangeTime = globalClock.frame_time
+                self.nextStrafeChangeTime = base.clockMgr.getTime()
 
     def getMyCombatStanding(self):
         points = self.health * 0.5
@@ -335,9 +346,9 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
         if not self.targetPlayer:
             return None
 
-        if self.nextStrafeChangeTime <= globalClock.frame_time:
+        if self.nextStrafeChangeTime <= base.clockMgr.getTime():
             self.strafeDir = not self.strafeDir
-            self.nextStrafeChangeTime = globalClock.frame_time + random.uniform(0.3, 1.0)
+            self.nextStrafeChangeTime = base.clockMgr.getTime() + random.uniform(0.3, 1.0)
 
         targetToMe = (self.getPos() - self.targetPlayer.getPos()).normalized()
         meToTarget = -targetToMe
@@ -348,6 +359,33 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
         perp.z = 0
         return perp.normalized()
 
+    def getRoamTarget(self):
+        # Wander around the level when there's nobody to fight.
+        graph = base.game.navGraph
+        if not graph:
+            return None
+
+        if self.roamTarget is None or (self.roamTarget - self.getPos()).lengthSquared() < 64 * 64:
+            self.roamTarget = graph.getRandomNodePos()
+        return self.roamTarget
+
+    def updateNavPath(self):
+        graph = base.game.navGraph
+        if not graph:
+            self.navPath = None
+            return
+
+        if not self.navPath or self.navPath.graph is not graph:
+            self.navPath = NavPath(graph)
+
+        if self.targetMovePos is None or (self.targetPlayer and self.tacticalMode == TacicalMode.Strafe):
+            # Strafing only moves us a short way from where we are.
+            self.navPath.clear()
+        elif not self.navPath.setGoal(self.targetMovePos, self.getPos()):
+            if self.targetMovePos is self.roamTarget:
+                # Can't get there, pick somewhere else next time.
+                self.roamTarget = None
+
     def getHealTarget(self):
         if not self.targetPlayer:
             return None
@@ -371,7 +409,12 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
             # They died, forget their damage.
             self.enemySelection.clearPlayerDamage(plyr)
 
+    def generate(self):
+        DistributedTFPlayerAI.generate(self)
+        base.botThinkMgr.addBot(self)
+
     def delete(self):
+        base.botThinkMgr.removeBot(self)
         base.game.botRemoved(self)
         DistributedTFPlayerAI.delete(self)
 
@@ -457,20 +500,27 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
             self.currMoveDir = Vec3(0)
             return
 
-        currToTarget = (self.targetMovePos - self.getPos())
+        movePos = None
+        if self.navPath:
+            movePos = self.navPath.getMoveTarget(self.getPos())
+        if movePos is not None:
+            currToTarget = movePos - self.getPos()
+            currToTarget.z = 0
+        else:
+            currToTarget = (self.targetMovePos - self.getPos())
         if currToTarget.lengthSquared() < 1:
             self.currMoveDir = Vec3(0)
         else:
             self.currMoveDir = currToTarget.normalized()
 
     def getLookAroundHpr(self):
-        if self.nextLookAroundHprChangeTime <= globalClock.frame_time:
+        if self.nextLookAroundHprChangeTime <= base.clockMgr.getTime():
             self.lookAroundHpr = Vec3(
                 random.uniform(0, 360),
                 random.uniform(-45, 45),
                 0
             )
-            self.nextLookAroundHprChangeTime = globalClock.frame_time + random.uniform(0.5, 3)
+            self.nextLookAroundHprChangeTime = base.clockMgr.getTime() + random.uniform(0.5, 3)
         return self.lookAroundHpr
 
     def interpView(self):
@@ -544,23 +594,21 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
 
         self.damagePos = Vec3(target.getWorldSpaceCenter())
         self.tookDamage = True
-        self.tookDamageTime = globalClock.frame_time
+        self.tookDamageTime = base.clockMgr.getTime()
 
         self.enemySelection.addPlayerDamage(target, abs(info.damage))
 
-    def simulate(self):
-        self.bulletForce = Vec3()
-
-        # Make sure to not simulate this guy twice per frame.
-        if self.simulationTick == base.tickCount:
-            return
-
-        self.simulationTick = base.tickCount
-
+    def think(self):
+        """
+        Runs the expensive decision making: finds visible players, picks a
+        target and tactical mode and decides where to move.  Called by the
+        BotThinkScheduler on a staggered schedule, not every tick; simulate()
+        acts on the last decisions in between.
+        """
         if self.isDead():
             return
 
-        now = globalClock.frame_time
+        now = base.clockMgr.getTime()
 
         if self.tookDamage and (now - self.tookDamageTime) > 3.0:
             self.tookDamage = False
@@ -581,7 +629,28 @@ class DistributedTFPlayerBotAI(DistributedTFPlayerAI):
                 strafeDir = self.getStrafeTargetDir()
                 self.targetMovePos = self.getPos() + strafeDir * random.uniform(32, 128)
         else:
+            self.targetMovePos = self.getRoamTarget()
+
+        self.updateNavPath()
+
+    def simulate(self):
+        self.bulletForce = Vec3()
+
+        # Make sure to not simulate this guy twice per frame.
+        if self.simulationTick == base.tickCount:
+            return
+
+        self.simulationTick = base.tickCount
+
+        if self.isDead():
+            return
+
+        if self.targetPlayer and (self.targetPlayer.isDODeleted() or self.targetPlayer.isDead()):
+            # Our target went away since we last thought.
+            self.targetPlayer = None
             self.targetMovePos = None
+            if self.navPath:
+                self.navPath.clear()
 
         self.determineMoveDir()
         self.interpView()
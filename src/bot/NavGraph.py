@@ -0,0 +1,533 @@
+"""NavGraph module: contains the NavGraph, NavPath and NavGraphBuilder classes."""
+
+import array
+import collections
+import heapq
+import math
+import random
+import struct
+import sys
+
+from panda3d.core import Filename, Point3, Vec3, VirtualFileSystem, getModelPath
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+from tf.tfbase import CollisionGroups, TFFilters
+from tf.tfbase.TFGlobals import VEC_HULL_MAX, VEC_HULL_MIN
+
+NAV_MAGIC = b'TFNV'
+NAV_VERSION = 1
+# Magic, version, grid size, number of nodes, number of edges.
+NAV_HEADER = struct.Struct('<4sIfII')
+
+# Movement limits the graph is built with, matching the player controller.
+NAV_STEP_HEIGHT = 16.0
+NAV_MAX_DROP = 250.0
+NAV_MIN_FLOOR_NORMAL_Z = 0.7
+# Extra cost per unit dropped, so paths prefer stairs to ledges.
+NAV_DROP_COST = 0.5
+
+def getNavFilename(levelName):
+    """
+    Returns the name of the nav graph file that goes with the given level,
+    which lives next to the level's BAM file.
+    """
+    fn = Filename.fromOsSpecific(levelName)
+    fn.setExtension('nav')
+    return fn
+
+class NavGraph:
+    """
+    Walkable-space graph of a level, built offline by NavGraphBuilder.
+    Nodes are floor points on a regular grid and edges join neighbouring
+    nodes a player hull can walk, step up or drop between.  Stored in
+    flat arrays (positions and a compressed adjacency list) so it is small
+    on disk and in memory.
+
+    Path queries are A* searches over the graph, with the results of
+    recent queries cached.
+    """
+
+    notify = directNotify.newCategory("NavGraph")
+
+    def __init__(self, gridSize, positions, offsets, targets, costs):
+        self.gridSize = gridSize
+        # x, y, z of each node.
+        self.positions = positions
+        # The edges leaving node n are targets/costs[offsets[n]:offsets[n + 1]].
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        self.numNodes = len(positions) // 3
+
+        # Grid cell -> nodes in the cell, for nearest node lookups.
+        self.cells = {}
+        for node in range(self.numNodes):
+            cell = self.getCell(positions[node * 3], positions[node * 3 + 1])
+            self.cells.setdefault(cell, []).append(node)
+
+        # (startNode, goalNode) -> path tuple, most recently used last.
+        self.pathCache = collections.OrderedDict()
+        self.maxCachedPaths = 512
+
+        self.numQueries = 0
+        self.numCacheHits = 0
+        self.numExpansions = 0
+
+    def getCell(self, x, y):
+        return (int(math.floor(x / self.gridSize)), int(math.floor(y / self.gridSize)))
+
+    def getNodePos(self, node):
+        i = node * 3
+        return Point3(self.positions[i], self.positions[i + 1], self.positions[i + 2])
+
+    def getRandomNodePos(self):
+        if not self.numNodes:
+            return None
+        return self.getNodePos(random.randrange(self.numNodes))
+
+    def getNearestNode(self, pos, maxRings=2):
+        """
+        Returns the node closest to the given position, looking at most
+        maxRings grid cells away, or -1 if there isn't one.  Nodes below the
+        position are preferred over nodes above it, since the position is
+        usually standing on the floor the node is on.
+        """
+        cx, cy = self.getCell(pos[0], pos[1])
+        positions = self.positions
+        best = -1
+        bestDist = 0.0
+        for ring in range(maxRings + 1):
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if ring and abs(x - cx) != ring and abs(y - cy) != ring:
+                        # Already looked at this one in an inner ring.
+                        continue
+                    for node in self.cells.get((x, y), ()):
+                        i = node * 3
+                        dx = positions[i] - pos[0]
+                        dy = positions[i + 1] - pos[1]
+                        dz = positions[i + 2] - pos[2]
+                        if dz > 0:
+                            dz *= 2
+                        dist = dx * dx + dy * dy + dz * dz
+                        if best == -1 or dist < bestDist:
+                            best = node
+                            bestDist = dist
+            if best != -1:
+                # Anything in an outer ring is farther away.
+                break
+        return best
+
+    def findPath(self, startNode, goalNode):
+        """
+        Returns a tuple of the nodes on the shortest path from startNode to
+        goalNode, both included, or None if the goal isn't reachable.
+        """
+        self.numQueries += 1
+        key = (startNode, goalNode)
+        path = self.pathCache.get(key)
+        if path is not None:
+            self.numCacheHits += 1
+            self.pathCache.move_to_end(key)
+            return path or None
+
+        path = self.search(startNode, (goalNode,), self.getNodePos(goalNode))
+        self.pathCache[key] = path or ()
+        if len(self.pathCache) > self.maxCachedPaths:
+            self.pathCache.popitem(last=False)
+        return path
+
+    def search(self, startNode, goalNodes, goalPos=None, maxExpansions=0):
+        """
+        A* search from startNode to the nearest of goalNodes.  goalPos is
+        used for the heuristic; without it this is a Dijkstra search, which
+        is what you want for multiple goals.  Gives up after expanding
+        maxExpansions nodes, if it's non-zero.  Returns a tuple of nodes or
+        None.
+        """
+        positions = self.positions
+        offsets = self.offsets
+        targets = self.targets
+        costs = self.costs
+        if goalPos is not None:
+            # Edge costs are horizontal distances (plus a drop penalty), so
+            # the heuristic must ignore height to never overestimate.
+            gx, gy = goalPos[0], goalPos[1]
+            def heuristic(node):
+                i = node * 3
+                dx = positions[i] - gx
+                dy = positions[i + 1] - gy
+                return math.sqrt(dx * dx + dy * dy)
+        else:
+            def heuristic(node):
+                return 0.0
+
+        openHeap = [(heuristic(startNode), 0.0, startNode)]
+        cameFrom = {startNode: -1}
+        gScores = {startNode: 0.0}
+        closed = set()
+        expansions = 0
+        while openHeap:
+            _, g, node = heapq.heappop(openHeap)
+            if node in goalNodes:
+                self.numExpansions += expansions
+                path = []
+                while node != -1:
+                    path.append(node)
+                    node = cameFrom[node]
+                path.reverse()
+                return tuple(path)
+            if node in closed:
+                continue
+            closed.add(node)
+            expansions += 1
+            if maxExpansions and expansions > maxExpansions:
+                break
+            for e in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[e]
+                newG = g + costs[e]
+                if newG < gScores.get(neighbor, math.inf):
+                    gScores[neighbor] = newG
+                    cameFrom[neighbor] = node
+                    heapq.heappush(openHeap, (newG + heuristic(neighbor), newG, neighbor))
+
+        self.numExpansions += expansions
+        return None
+
+    def getStats(self):
+        """
+        Returns (numQueries, numCacheHits, numExpansions).
+        """
+        return (self.numQueries, self.numCacheHits, self.numExpansions)
+
+    def save(self, filename):
+        positions, offsets, targets, costs = self.positions, self.offsets, self.targets, self.costs
+        if sys.byteorder != 'little':
+            positions, offsets, targets, costs = [array.array(a.typecode, a) for a in (positions, offsets, targets, costs)]
+            for a in (positions, offsets, targets, costs):
+                a.byteswap()
+        with open(filename.toOsSpecific(), 'wb') as f:
+            f.write(NAV_HEADER.pack(NAV_MAGIC, NAV_VERSION, self.gridSize, self.numNodes, len(self.targets)))
+            for a in (positions, offsets, targets, costs):
+                f.write(a.tobytes())
+        self.notify.info("Wrote %i nodes and %i edges to %s" % (self.numNodes, len(self.targets), filename))
+
+    @classmethod
+    def fromData(cls, data):
+        magic, version, gridSize, numNodes, numEdges = NAV_HEADER.unpack_from(data, 0)
+        if magic != NAV_MAGIC or version != NAV_VERSION:
+            cls.notify.warning("Bad nav graph header or version %i" % version)
+            return None
+
+        arrays = []
+        offset = NAV_HEADER.size
+        for typecode, count in (('f', numNodes * 3), ('I', numNodes + 1), ('I', numEdges), ('f', numEdges)):
+            a = array.array(typecode)
+            size = a.itemsize * count
+            a.frombytes(data[offset:offset + size])
+            offset += size
+            if sys.byteorder != 'little':
+                a.byteswap()
+            arrays.append(a)
+        return cls(gridSize, *arrays)
+
+    @classmethod
+    def loadForLevel(cls, levelName):
+        """
+        Loads the nav graph of the given level, or returns None if the level
+        doesn't have one.
+        """
+        fn = getNavFilename(levelName)
+        vfs = VirtualFileSystem.getGlobalPtr()
+        if not vfs.resolveFilename(fn, getModelPath().value):
+            cls.notify.info("No nav graph for %s, bots will not navigate" % levelName)
+            return None
+        graph = cls.fromData(vfs.readFile(fn, True))
+        if graph:
+            cls.notify.info("Loaded %i nav nodes from %s" % (graph.numNodes, fn))
+        return graph
+
+class NavPath:
+    """
+    A path through a NavGraph followed by one bot.  Rather than searching
+    again whenever the goal moves or the bot gets pushed off the path, it
+    first tries to repair the existing path with a small local search.
+    """
+
+    # Distance at which a node counts as reached.
+    ArriveDist = 24.0
+    # Expansion limit of repair searches before giving up and replanning.
+    RepairExpansions = 64
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = ()
+        self.index = 0
+        self.goalNode = -1
+        self.goalPos = None
+
+        self.numReplans = 0
+        self.numRepairs = 0
+
+    def clear(self):
+        self.nodes = ()
+        self.index = 0
+        self.goalNode = -1
+        self.goalPos = None
+
+    def isActive(self):
+        return self.goalPos is not None and len(self.nodes) > 0
+
+    def setGoal(self, goalPos, fromPos):
+        """
+        Points the path at a new goal position.  Returns False if the goal
+        isn't reachable from fromPos.
+        """
+        graph = self.graph
+        goalNode = graph.getNearestNode(goalPos)
+        if goalNode == -1:
+            self.clear()
+            return False
+
+        self.goalPos = Point3(goalPos)
+        if goalNode == self.goalNode and self.nodes:
+            return True
+
+        remaining = self.nodes[self.index:]
+        if remaining:
+            if goalNode in remaining:
+                # New goal is on the way to the old one, just stop there.
+                self.nodes = self.nodes[:self.nodes.index(goalNode, self.index) + 1]
+                self.goalNode = goalNode
+                self.numRepairs += 1
+                return True
+            ext = graph.search(self.goalNode, (goalNode,), graph.getNodePos(goalNode), self.RepairExpansions)
+            if ext:
+                # New goal is near the old one, extend the path to it.
+                self.nodes = self.nodes + ext[1:]
+                self.goalNode = goalNode
+                self.numRepairs += 1
+                return True
+
+        return self.replan(fromPos, goalNode)
+
+    def replan(self, fromPos, goalNode):
+        graph = self.graph
+        self.numReplans += 1
+        startNode = graph.getNearestNode(fromPos)
+        path = graph.findPath(startNode, goalNode) if startNode != -1 else None
+        if not path:
+            self.clear()
+            return False
+        self.nodes = path
+        self.index = 0
+        self.goalNode = goalNode
+        return True
+
+    def getMoveTarget(self, pos):
+        """
+        Returns the position the bot at pos should be moving towards to
+        follow the path, or None if there is no path.
+        """
+        if not self.isActive():
+            return None
+
+        graph = self.graph
+        nodes = self.nodes
+        arriveSqr = self.ArriveDist * self.ArriveDist
+
+        # Advance past the nodes we reached, looking a couple nodes ahead
+        # in case we cut a corner.
+        for i in range(min(len(nodes), self.index + 3) - 1, self.index - 1, -1):
+            nodePos = graph.getNodePos(nodes[i])
+            dx = nodePos[0] - pos[0]
+            dy = nodePos[1] - pos[1]
+            if (dx * dx + dy * dy) <= arriveSqr and abs(nodePos[2] - pos[2]) <= NAV_STEP_HEIGHT * 4:
+                self.index = i + 1
+                break
+
+        if self.index >= len(nodes):
+            return self.goalPos
+
+        nodePos = graph.getNodePos(nodes[self.index])
+        offPath = graph.gridSize * 3
+        if (nodePos.getXy() - pos.getXy()).lengthSquared() > offPath * offPath:
+            # Knocked off the path.
+            self.repair(pos)
+            if not self.isActive():
+                return None
+            if self.index >= len(self.nodes):
+                return self.goalPos
+            nodePos = graph.getNodePos(self.nodes[self.index])
+
+        return nodePos
+
+    def repair(self, pos):
+        """
+        Gets back onto the path from pos, by searching locally for the
+        nearest node still ahead on the path.
+        """
+        graph = self.graph
+        currNode = graph.getNearestNode(pos)
+        if currNode == -1:
+            self.clear()
+            return
+
+        remaining = self.nodes[self.index:]
+        if currNode in remaining:
+            self.index = self.nodes.index(currNode, self.index)
+            return
+
+        detour = graph.search(currNode, frozenset(remaining), None, self.RepairExpansions)
+        if detour:
+            rejoin = self.nodes.index(detour[-1], self.index)
+            self.nodes = detour + self.nodes[rejoin + 1:]
+            self.index = 0
+            self.numRepairs += 1
+        elif not self.replan(pos, self.goalNode):
+            self.clear()
+
+class NavGraphBuilder:
+    """
+    Builds the nav graph of the loaded level offline, by flood filling a
+    grid of floor points from the team spawns.  Floor points are found by
+    dropping a player hull onto the world, and neighbouring points are
+    connected if a hull can sweep between them at step height.  Points
+    outside of the level's area clusters are thrown away.
+
+    Run with TFStart --build-nav, which writes the graph next to the level
+    file and quits.
+    """
+
+    notify = directNotify.newCategory("NavGraphBuilder")
+
+    Directions = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    def __init__(self, lvlData, gridSize=32.0, maxNodes=200000):
+        self.lvlData = lvlData
+        self.gridSize = gridSize
+        self.maxNodes = maxNodes
+        self.tree = lvlData.getAreaClusterTree()
+        self.filter = TFFilters.TFQueryFilter()
+        self.tr = TFFilters.TraceResult()
+
+        self.nodePositions = []
+        self.edges = []
+        # Grid cell -> nodes in the cell.
+        self.cellNodes = {}
+
+    def findFloor(self, x, y, z):
+        """
+        Drops a player hull at x, y from step height above z.  Returns the
+        point it landed on, or None if there is no standable floor within
+        the maximum drop.
+        """
+        start = Point3(x, y, z + NAV_STEP_HEIGHT)
+        end = Point3(x, y, z - NAV_MAX_DROP)
+        tr = TFFilters.traceBox(start, end, VEC_HULL_MIN, VEC_HULL_MAX,
+                                CollisionGroups.World, self.filter, tr=self.tr)
+        if not tr.hit or tr.frac <= 0.0 or tr.startsolid:
+            return None
+        if tr.norm[2] < NAV_MIN_FLOOR_NORMAL_Z:
+            return None
+        floor = Point3(tr.endpos)
+        if self.tree.getLeafValueFromPoint(floor + Vec3(0, 0, 1)) < 0:
+            return None
+        return floor
+
+    def canWalk(self, fromPos, toPos):
+        start = Point3(fromPos[0], fromPos[1], fromPos[2] + NAV_STEP_HEIGHT)
+        end = Point3(toPos[0], toPos[1], fromPos[2] + NAV_STEP_HEIGHT)
+        tr = TFFilters.traceBox(start, end, VEC_HULL_MIN, VEC_HULL_MAX,
+                                CollisionGroups.World, self.filter, tr=self.tr)
+        return not tr.hit
+
+    def getNode(self, cell, floor):
+        """
+        Returns the node at the given floor point of the cell, creating it
+        if it doesn't exist yet, and whether it was created.
+        """
+        nodes = self.cellNodes.setdefault(cell, [])
+        for node in nodes:
+            if abs(self.nodePositions[node][2] - floor[2]) <= NAV_STEP_HEIGHT:
+                return (node, False)
+        node = len(self.nodePositions)
+        self.nodePositions.append(floor)
+        self.edges.append({})
+        nodes.append(node)
+        return (node, True)
+
+    def build(self, seeds):
+        grid = self.gridSize
+        queue = collections.deque()
+        for seed in seeds:
+            cell = (int(math.floor(seed[0] / grid)), int(math.floor(seed[1] / grid)))
+            floor = self.findFloor((cell[0] + 0.5) * grid, (cell[1] + 0.5) * grid, seed[2])
+            if not floor:
+                self.notify.warning("No floor under seed %s" % seed)
+                continue
+            node, isNew = self.getNode(cell, floor)
+            if isNew:
+                queue.append((node, cell))
+
+        while queue:
+            node, (cx, cy) = queue.popleft()
+            pos = self.nodePositions[node]
+            for dx, dy in self.Directions:
+                cell = (cx + dx, cy + dy)
+                floor = self.findFloor((cell[0] + 0.5) * grid, (cell[1] + 0.5) * grid, pos[2])
+                if not floor or not self.canWalk(pos, floor):
+                    continue
+                if len(self.nodePositions) >= self.maxNodes and not any(
+                        abs(self.nodePositions[n][2] - floor[2]) <= NAV_STEP_HEIGHT
+                        for n in self.cellNodes.get(cell, ())):
+                    continue
+                other, isNew = self.getNode(cell, floor)
+                if other == node:
+                    continue
+                if isNew:
+                    queue.append((other, cell))
+
+                dist = (floor - pos).getXy().length()
+                drop = pos[2] - floor[2]
+                self.edges[node][other] = dist + max(0.0, drop) * NAV_DROP_COST
+                if drop <= NAV_STEP_HEIGHT:
+                    # We can climb back up.
+                    self.edges[other][node] = dist + max(0.0, -drop) * NAV_DROP_COST
+
+        if len(self.nodePositions) >= self.maxNodes:
+            self.notify.warning("Hit the limit of %i nav nodes" % self.maxNodes)
+
+        positions = array.array('f')
+        offsets = array.array('I', [0])
+        targets = array.array('I')
+        costs = array.array('f')
+        for pos, edges in zip(self.nodePositions, self.edges):
+            positions.extend((pos[0], pos[1], pos[2]))
+            for other, cost in sorted(edges.items()):
+                targets.append(other)
+                costs.append(cost)
+            offsets.append(len(targets))
+        return NavGraph(grid, positions, offsets, targets, costs)
+
+    @classmethod
+    def buildForCurrentLevel(cls, gridSize=32.0):
+        """
+        Builds and saves the nav graph of the level the server has loaded.
+        """
+        game = base.game
+        seeds = [spawn.spawnPos for spawn in game.teamSpawns]
+        builder = cls(game.lvlData, gridSize)
+        cls.notify.info("Building nav graph of %s from %i spawns" % (game.levelName, len(seeds)))
+        graph = builder.build(seeds)
+
+        fn = getNavFilename(game.levelName)
+        # Write it next to the level file.
+        bamFn = Filename(fn)
+        bamFn.setExtension('bam')
+        if VirtualFileSystem.getGlobalPtr().resolveFilename(bamFn, getModelPath().value):
+            fn = Filename(bamFn)
+            fn.setExtension('nav')
+        graph.save(fn)
+        return graph
@@ -47,6 +47,9 @@ dc-file $TF/src/configfiles/tf.dc
 anim-events $TF/src/configfiles/tf_anim_events.pdx
 anim-activities $TF/src/configfiles/tf_anim_activities.pdx
 
+# Data-driven particle effect definitions, see TFEffects.py.
+particle-effects $TF/src/configfiles/tf_effects.txt
+
 # TF2 on Source runs at 66 ticks per second.
 sv_tickrate 66
 
@@ -4,14 +4,16 @@
   #define OTHER_LIBS \
     dtool:m dtoolbase:c dtoolutil:c prc interrogatedb \
     pandaexpress:m express:c downloader:c gobj:c pgraph:c pipeline:c \
-    panda:m putil:c linmath:c pstatclient:c parametrics:c mathutil:c jobsystem:c
-  #define USE_PACKAGES eigen
+    panda:m putil:c linmath:c pstatclient:c parametrics:c mathutil:c jobsystem:c \
+    pphysics:c
+  #define USE_PACKAGES eigen physx
 
   #define SOURCES \
     config_tf.h config_tf.cxx \
     tfbase.h tfsymbols.h \
     quickRopeNode.h quickRopeNode.I quickRopeNode.cxx \
     ropePhysics.h ropePhysics.I ropePhysics.cxx \
+    tfQueryFilter.h tfQueryFilter.I tfQueryFilter.cxx \
 
   #define IGATESCAN all
   #define IGATEEXT prediction.h prediction.I prediction.cxx
@@ -13,6 +13,7 @@
 
 #include "config_tf.h"
 #include "quickRopeNode.h"
+#include "tfQueryFilter.h"
 
 ConfigureDef(config_tf);
 ConfigureFn(config_tf) {
@@ -31,4 +32,5 @@ init_libtf() {
   initialized = true;
 
   QuickRopeNode::init_type();
+  TFQueryFilter::init_type();
 }
@@ -0,0 +1,167 @@
+/**
+ * PANDA 3D SOFTWARE
+ * Copyright (c) Carnegie Mellon University.  All rights reserved.
+ *
+ * All use of this software is subject to the terms of the revised BSD
+ * license.  You should have received a copy of this license along
+ * with this source code in a file named "LICENSE."
+ *
+ * @file tfQueryFilter.cxx
+ * @author agent
+ * @date 2026-10-18
+ */
+
+#include "tfQueryFilter.h"
+#include "physQueryFilter.h"
+#include "physRigidActorNode.h"
+#include "pStatCollector.h"
+#include "pStatTimer.h"
+
+IMPLEMENT_CLASS(TFQueryFilter);
+
+TFQueryFilter::ActorDataMap TFQueryFilter::_actor_data;
+BitMask32 TFQueryFilter::_hit_box_mask = BitMask32::all_off();
+
+static PStatCollector filter_pcollector("App:TFFilterQuery:DoFilterNative");
+
+/**
+ *
+ */
+TFQueryFilter::
+TFQueryFilter(int source_id, int source_team, unsigned int flags) :
+  _source_id(source_id),
+  _source_team(source_team),
+  _flags(flags)
+{
+}
+
+/**
+ * Registers or updates the entity information associated with the given
+ * physics actor.  Must be called for every actor belonging to an entity, and
+ * again whenever the entity's team or builder changes.
+ */
+void TFQueryFilter::
+set_actor_data(PandaNode *actor, int entity_id, int team,
+               unsigned int entity_flags, int builder_id) {
+  nassertv(actor != nullptr);
+  ActorData &data = _actor_data[actor];
+  data._actor = actor;
+  data._entity_id = entity_id;
+  data._team = team;
+  data._flags = entity_flags;
+  data._builder_id = builder_id;
+}
+
+/**
+ * Removes the entity information associated with the given physics actor.
+ * Must be called when the actor is removed from the scene, or the record
+ * keeps the actor alive.
+ */
+void TFQueryFilter::
+clear_actor_data(PandaNode *actor) {
+  _actor_data.erase(actor);
+}
+
+/**
+ *
+ */
+bool TFQueryFilter::
+has_actor_data(PandaNode *actor) {
+  return _actor_data.find(actor) != _actor_data.end();
+}
+
+/**
+ *
+ */
+void TFQueryFilter::
+do_callback(CallbackData *cbdata) {
+  PStatTimer timer(filter_pcollector);
+
+  PhysQueryFilterCallbackData *data = (PhysQueryFilterCallbackData *)cbdata;
+  PhysRigidActorNode *actor = data->get_actor();
+  if (actor == nullptr ||
+      !filter_actor(actor, actor->get_from_collide_mask(), data->get_into_collide_mask())) {
+    data->set_result(0);
+  }
+  // Otherwise, leave the hit type as-is.
+}
+
+/**
+ * Returns true if the query should consider the given actor, or false if it
+ * should be ignored.  This is the native equivalent of the Python filter
+ * functions in TFFilters.
+ */
+bool TFQueryFilter::
+filter_actor(PandaNode *actor, BitMask32 from_mask, BitMask32 into_mask) const {
+  ActorDataMap::const_iterator it = _actor_data.find(actor);
+  if (it == _actor_data.end()) {
+    // It must be associated with an entity.
+    return false;
+  }
+  const ActorData &ent = (*it).second;
+
+  // A negative ID means no entity (no source, or not generated yet), which
+  // never matches anything.
+  bool has_source = _source_id >= 0;
+
+  if ((_flags & F_ignore_self) != 0 && has_source && ent._entity_id == _source_id) {
+    return false;
+  }
+
+  if (_flags & F_hit_boxes) {
+    bool is_hit_box = (from_mask & _hit_box_mask) != 0;
+    if ((into_mask & _hit_box_mask) == 0) {
+      // Not checking against hitboxes, ignore hitboxes.
+      if (is_hit_box) {
+        return false;
+      }
+    } else if ((ent._flags & EF_has_hit_boxes) != 0 && !is_hit_box) {
+      // The entity has hitboxes, so ignore anything that isn't a hitbox.
+      return false;
+    }
+  }
+
+  if ((_flags & F_world_only) != 0 && (ent._flags & EF_world) == 0) {
+    return false;
+  }
+
+  bool is_player = (ent._flags & EF_player) != 0;
+  bool is_object = (ent._flags & EF_object) != 0;
+  bool same_team = ent._team == _source_team;
+
+  if ((_flags & F_ignore_players) != 0 && is_player) {
+    return false;
+  }
+
+  if (same_team) {
+    if (_flags & F_ignore_teammates) {
+      return false;
+    }
+    if ((_flags & F_ignore_teammate_players) != 0 && is_player) {
+      return false;
+    }
+    if ((_flags & F_ignore_teammate_buildings) != 0 && is_object) {
+      return false;
+    }
+    if ((_flags & F_ignore_teammate_buildings_non_builder) != 0 && is_object &&
+        (ent._flags & EF_teleporter) == 0 &&
+        (!has_source || ent._builder_id != _source_id)) {
+      // Teleporters collide with everyone, otherwise only the builder
+      // collides with their building.
+      return false;
+    }
+
+  } else {
+    if (_flags & F_ignore_enemies) {
+      return false;
+    }
+    if ((_flags & F_ignore_enemy_players) != 0 && is_player) {
+      return false;
+    }
+    if ((_flags & F_ignore_enemy_buildings) != 0 && is_object) {
+      return false;
+    }
+  }
+
+  return true;
+}
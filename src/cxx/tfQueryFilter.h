@@ -0,0 +1,111 @@
+/**
+ * PANDA 3D SOFTWARE
+ * Copyright (c) Carnegie Mellon University.  All rights reserved.
+ *
+ * All use of this software is subject to the terms of the revised BSD
+ * license.  You should have received a copy of this license along
+ * with this source code in a file named "LICENSE."
+ *
+ * @file tfQueryFilter.h
+ * @author agent
+ * @date 2026-10-18
+ */
+
+#ifndef TFQUERYFILTER_H
+#define TFQUERYFILTER_H
+
+#include "tfbase.h"
+#include "callbackObject.h"
+#include "pandaNode.h"
+#include "bitMask.h"
+#include "pmap.h"
+
+/**
+ * Physics scene query filter that implements the common TF2 filters natively
+ * instead of calling back into Python for every candidate actor.
+ *
+ * The filters to apply are specified as a bitmask of FilterFlags.  The filter
+ * evaluates them against small records of entity information (entity ID,
+ * team, builder, player/building/world) that the game code registers for
+ * each physics actor that belongs to an entity.  Actors without a record
+ * don't belong to an entity and are always ignored.
+ */
+class EXPCL_TF_CXX TFQueryFilter : public CallbackObject {
+  DECLARE_CLASS(TFQueryFilter, CallbackObject);
+
+PUBLISHED:
+  enum FilterFlags {
+    // Ignore the source entity of the query.
+    F_ignore_self = 1 << 0,
+    // Only test against hit boxes if the query mask contains the hit box
+    // group and the entity has hit boxes, otherwise ignore hit boxes.
+    F_hit_boxes = 1 << 1,
+    F_ignore_players = 1 << 2,
+    F_ignore_enemies = 1 << 3,
+    F_ignore_enemy_players = 1 << 4,
+    F_ignore_enemy_buildings = 1 << 5,
+    F_ignore_teammates = 1 << 6,
+    F_ignore_teammate_players = 1 << 7,
+    F_ignore_teammate_buildings = 1 << 8,
+    // Ignore friendly buildings not built by the source, except teleporters.
+    F_ignore_teammate_buildings_non_builder = 1 << 9,
+    F_world_only = 1 << 10,
+  };
+
+  enum EntityFlags {
+    EF_player = 1 << 0,
+    EF_object = 1 << 1,
+    EF_world = 1 << 2,
+    EF_has_hit_boxes = 1 << 3,
+    EF_teleporter = 1 << 4,
+  };
+
+  TFQueryFilter(int source_id, int source_team, unsigned int flags);
+
+  INLINE void set_source(int source_id, int source_team);
+  INLINE int get_source_id() const;
+  INLINE int get_source_team() const;
+  MAKE_PROPERTY(source_id, get_source_id);
+  MAKE_PROPERTY(source_team, get_source_team);
+
+  INLINE void set_flags(unsigned int flags);
+  INLINE unsigned int get_flags() const;
+  MAKE_PROPERTY(flags, get_flags, set_flags);
+
+  static void set_actor_data(PandaNode *actor, int entity_id, int team,
+                             unsigned int entity_flags, int builder_id);
+  static void clear_actor_data(PandaNode *actor);
+  static bool has_actor_data(PandaNode *actor);
+
+  INLINE static void set_hit_box_mask(BitMask32 mask);
+  INLINE static BitMask32 get_hit_box_mask();
+
+public:
+  virtual void do_callback(CallbackData *cbdata) override;
+
+  bool filter_actor(PandaNode *actor, BitMask32 from_mask, BitMask32 into_mask) const;
+
+private:
+  int _source_id;
+  int _source_team;
+  unsigned int _flags;
+
+  class ActorData {
+  public:
+    // Keeps the actor alive while it has a record, so a record that wasn't
+    // cleared can't be picked up by a new node at the same address.
+    PT(PandaNode) _actor;
+    int _entity_id;
+    int _team;
+    unsigned int _flags;
+    int _builder_id;
+  };
+  typedef pflat_hash_map<const PandaNode *, ActorData, pointer_hash> ActorDataMap;
+  static ActorDataMap _actor_data;
+
+  static BitMask32 _hit_box_mask;
+};
+
+#include "tfQueryFilter.I"
+
+#endif // TFQUERYFILTER_H
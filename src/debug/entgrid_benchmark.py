@@ -0,0 +1,112 @@
+"""
+Benchmark for the server-side entity grid.
+
+Populates a 2fort-sized area with players, buildings and projectiles and
+compares a brute-force scan over every entity against EntityGrid for the
+splash damage, sentry targeting and bot perception queries, plus the
+per-tick cost of moving every entity through the grid.
+
+Usage: python entgrid_benchmark.py [numPlayers] [numBuildings] [numProjectiles]
+"""
+
+import random
+import sys
+import time
+
+from panda3d.core import Point3, Vec3
+
+from tf.entity.EntityGrid import EntityGrid
+
+EntTypeOther = 0
+EntTypePlayer = 1
+EntTypeObject = 2
+
+# Default of tf-bot-perception-range.
+BotPerceptionRange = 3000.0
+
+class FakeEntity:
+    def __init__(self, entType, team, pos):
+        self.entType = entType
+        self.team = team
+        self.pos = pos
+        self.viewOffset = Vec3(0, 0, 64 if entType == EntTypePlayer else 32)
+
+    def getPos(self, other=None):
+        return Point3(self.pos)
+
+    def getEyePosition(self):
+        return Point3(self.pos + self.viewOffset)
+
+def randomPos(rand):
+    return Point3(rand.uniform(-4096, 4096), rand.uniform(-4096, 4096), rand.uniform(0, 512))
+
+def bruteRadius(ents, center, radius, entType=None, team=None):
+    ret = []
+    for ent in ents:
+        if entType is not None and ent.entType != entType:
+            continue
+        if team is not None and ent.team != team:
+            continue
+        if (ent.getPos() - center).length() <= radius:
+            ret.append(ent)
+    return ret
+
+def bruteCone(ents, origin, direction, minDot, distance, entType=None, team=None):
+    ret = []
+    for ent in ents:
+        if entType is not None and ent.entType != entType:
+            continue
+        if team is not None and ent.team != team:
+            continue
+        delta = ent.getEyePosition() - origin
+        if delta.length() > distance:
+            continue
+        if delta.normalized().dot(direction) >= minDot:
+            ret.append(ent)
+    return ret
+
+def timeIt(func, iterations):
+    s = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - s) / iterations * 1e6
+
+def main():
+    numPlayers = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    numBuildings = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    numProjectiles = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    iterations = 2000
+
+    rand = random.Random(1234)
+    ents = []
+    for i in range(numPlayers):
+        ents.append(FakeEntity(EntTypePlayer, i % 2, randomPos(rand)))
+    for i in range(numBuildings):
+        ents.append(FakeEntity(EntTypeObject, i % 2, randomPos(rand)))
+    for i in range(numProjectiles):
+        ents.append(FakeEntity(EntTypeOther, i % 2, randomPos(rand)))
+
+    grid = EntityGrid()
+    for ent in ents:
+        grid.addEntity(ent)
+
+    center = randomPos(rand)
+    direction = Vec3(1, 0, 0)
+
+    def moveAll():
+        # Like DistributedEntity.setPos(), which re-buckets the entity.
+        for ent in ents:
+            ent.pos += Vec3(rand.uniform(-10, 10), rand.uniform(-10, 10), 0)
+            grid.updateEntity(ent)
+
+    print("%i players, %i buildings, %i projectiles" % (numPlayers, numBuildings, numProjectiles))
+    print("move all + update:  %8.2f us/tick" % timeIt(lambda: (moveAll(), grid.update()), 200))
+    print("radiusDamage brute: %8.2f us" % timeIt(lambda: bruteRadius(ents, center, 146), iterations))
+    print("radiusDamage grid:  %8.2f us" % timeIt(lambda: grid.queryRadius(center, 146), iterations))
+    print("sentry brute:       %8.2f us" % timeIt(lambda: bruteRadius(ents, center, 1200, team=1), iterations))
+    print("sentry grid:        %8.2f us" % timeIt(lambda: grid.queryRadius(center, 1200, team=1), iterations))
+    print("bot cone brute:     %8.2f us" % timeIt(lambda: bruteCone(ents, center, direction, 0.35, BotPerceptionRange, EntTypePlayer, 1), iterations))
+    print("bot cone grid:      %8.2f us" % timeIt(lambda: grid.queryCone(center, direction, 0.35, BotPerceptionRange, entType=EntTypePlayer, team=1), iterations))
+
+if __name__ == "__main__":
+    main()
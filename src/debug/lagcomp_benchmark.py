@@ -0,0 +1,119 @@
+"""
+Microbenchmark for the lag compensation history.
+
+Measures the per-tick cost of recording every player's position and of one
+shooter backtracking everybody else, with a full second of history.
+
+Usage: python lagcomp_benchmark.py [numPlayers] [numTicks]
+"""
+
+import builtins
+import math
+import sys
+import time
+
+from panda3d.core import Point3, Vec3
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def getTime(self):
+        return self.t
+
+class FakeOwner:
+    averageRtt = 50.0
+    interpAmount = 0.1
+
+class FakePlayer:
+    def __init__(self, doId):
+        self.doId = doId
+        self.pos = Point3(doId * 64.0, 0, 0)
+        self.hpr = Vec3(0)
+        self.eyeH = 0.0
+        self.eyeP = 0.0
+        self.owner = FakeOwner()
+
+    def getPos(self):
+        return Point3(self.pos)
+
+    def setPos(self, pos):
+        self.pos = Point3(pos)
+
+    def getHpr(self):
+        return Vec3(self.hpr)
+
+    def setHpr(self, hpr):
+        self.hpr = Vec3(hpr)
+
+    def isDead(self):
+        return False
+
+    def invalidateHitBoxes(self):
+        pass
+
+class FakeCmd:
+    tickCount = 0
+
+class FakeAir:
+    def __init__(self):
+        self.doId2do = {}
+
+class FakeBase:
+    ticksPerSec = 66
+    intervalPerTick = 1.0 / 66
+
+    def __init__(self):
+        self.clockMgr = FakeClock()
+        self.air = FakeAir()
+        self.tickCount = 0
+
+    def timeToTicks(self, t):
+        return int(0.5 + t / self.intervalPerTick)
+
+    def ticksToTime(self, ticks):
+        return ticks * self.intervalPerTick
+
+def main():
+    numPlayers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    numTicks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    builtins.base = FakeBase()
+    from tf.player.LagCompensation import LagCompensation
+
+    lagComp = LagCompensation()
+    players = []
+    for i in range(numPlayers):
+        plyr = FakePlayer(i + 1)
+        players.append(plyr)
+        base.air.doId2do[plyr.doId] = plyr
+        lagComp.registerPlayer(plyr)
+
+    shooter = players[0]
+    cmd = FakeCmd()
+    recordTime = 0.0
+    backtrackTime = 0.0
+
+    for tick in range(numTicks):
+        base.tickCount = tick
+        base.clockMgr.t = base.ticksToTime(tick)
+        for plyr in players:
+            plyr.pos[0] += math.sin(tick * 0.1)
+            plyr.hpr[0] = (plyr.hpr[0] + 1.0) % 360.0
+
+        s = time.perf_counter()
+        lagComp.recordPlayerPositions()
+        recordTime += time.perf_counter() - s
+
+        cmd.tickCount = tick
+        s = time.perf_counter()
+        lagComp.startLagCompensation(shooter, cmd)
+        lagComp.finishLagCompensation(shooter)
+        backtrackTime += time.perf_counter() - s
+
+    print("%i players, %i ticks" % (numPlayers, numTicks))
+    print("record:    %.2f us/tick" % (recordTime / numTicks * 1e6))
+    print("backtrack: %.2f us/tick" % (backtrackTime / numTicks * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Round-trip benchmark for the PlayerCommand delta codec.
+
+Encodes the command stream of numClients clients sending cmd packets at
+cl_cmdrate (each packet carries the new command plus two backups, like the
+client does), then times decoding it the way the server's playerCommand
+handler does.  Prints the decode cost per command and per server tick.
+
+Usage: python playercommand_benchmark.py [numClients] [cmdRate] [seconds]
+"""
+
+import math
+import random
+import sys
+import time
+
+from panda3d.core import Datagram, DatagramIterator, Vec2, Vec3
+
+from tf.player.PlayerCommand import PlayerCommand
+
+NumBackup = 2
+
+def makeCommands(rand, count):
+    cmds = []
+    buttons = 0
+    weapon = 0
+    for i in range(count):
+        cmd = PlayerCommand()
+        cmd.commandNumber = i + 1
+        cmd.tickCount = i + 1
+        cmd.viewAngles = Vec3(math.sin(i * 0.05) * 180.0, math.cos(i * 0.03) * 60.0, 0.0)
+        if rand.random() < 0.05:
+            buttons ^= 1 << rand.randint(0, 8)
+        cmd.buttons = buttons
+        cmd.move = Vec3(450.0 if buttons & 1 else 0.0, 0.0, 0.0)
+        if rand.random() < 0.01:
+            weapon = rand.randint(0, 2)
+        cmd.weaponSelect = weapon
+        cmd.mouseDelta = Vec2(rand.uniform(-2, 2), rand.uniform(-2, 2))
+        cmds.append(cmd)
+    return cmds
+
+def encodePackets(cmds):
+    packets = []
+    nullCmd = PlayerCommand()
+    for i in range(len(cmds)):
+        dg = Datagram()
+        first = max(0, i - NumBackup)
+        dg.addUint8(i - first)
+        dg.addUint8(1)
+        prev = nullCmd
+        for cmd in cmds[first:i + 1]:
+            cmd.writeDatagram(dg, prev)
+            prev = cmd
+        packets.append(bytes(dg))
+    return packets
+
+def decodePacket(data):
+    dgi = DatagramIterator(Datagram(data))
+    total = dgi.getUint8() + dgi.getUint8()
+    prev = PlayerCommand()
+    cmds = []
+    for _ in range(total):
+        prev = PlayerCommand.readDatagram(dgi, prev)
+        cmds.append(prev)
+    return cmds
+
+def main():
+    numClients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    cmdRate = int(sys.argv[2]) if len(sys.argv) > 2 else 66
+    seconds = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    rand = random.Random(1)
+    numPackets = cmdRate * seconds
+    streams = [encodePackets(makeCommands(rand, numPackets)) for _ in range(numClients)]
+    numBytes = sum(len(p) for stream in streams for p in stream)
+
+    # Check that the stream round-trips.
+    src = makeCommands(random.Random(1), numPackets)
+    for i, data in enumerate(streams[0]):
+        cmd = decodePacket(data)[-1]
+        assert cmd.commandNumber == src[i].commandNumber
+        assert cmd.buttons == src[i].buttons
+        assert cmd.weaponSelect == src[i].weaponSelect
+        assert cmd.viewAngles.almostEqual(src[i].viewAngles, 0.001)
+
+    numCmds = 0
+    s = time.perf_counter()
+    for i in range(numPackets):
+        for stream in streams:
+            numCmds += len(decodePacket(stream[i]))
+    elapsed = time.perf_counter() - s
+
+    print("%i clients at cl_cmdrate %i, %i s" % (numClients, cmdRate, seconds))
+    print("wire:   %.1f bytes/packet" % (numBytes / (numPackets * numClients)))
+    print("decode: %.2f us/cmd, %.2f us/tick" % (elapsed / numCmds * 1e6, elapsed / numPackets * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Startup benchmark for the compiled sound-script cache.
+
+Times Sounds.loadSounds() parsing every script listed in load-sounds, then
+loading the same sounds from a warm sound cache, and the cost of building
+every SoundInfo on first use.  Run it from the game directory so the
+load-sounds scripts resolve.
+
+Usage: python sound_cache_benchmark.py [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from panda3d.core import loadPrcFileData
+
+from tf.tfbase import Sounds
+
+def timeLoad(useCache, iterations):
+    best = None
+    for _ in range(iterations):
+        s = time.perf_counter()
+        Sounds.loadSounds(useCache=useCache)
+        elapsed = time.perf_counter() - s
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    cacheFile = os.path.join(tempfile.mkdtemp(), "sounds.cache")
+    loadPrcFileData("sound cache benchmark", "sound-cache-file %s" % cacheFile)
+
+    parseTime = timeLoad(False, iterations)
+    numSounds = len(Sounds.AllSounds)
+
+    # Write the cache, then time loading from it.
+    Sounds.loadSounds()
+    cacheTime = timeLoad(True, iterations)
+
+    s = time.perf_counter()
+    for i in range(numSounds):
+        Sounds.AllSounds[i]
+    materializeTime = time.perf_counter() - s
+
+    print("%i sounds, best of %i" % (numSounds, iterations))
+    print("parse scripts: %.2f ms" % (parseTime * 1000))
+    print("sound cache:   %.2f ms (%.1fx), %i bytes" %
+          (cacheTime * 1000, parseTime / cacheTime, os.path.getsize(cacheFile)))
+    print("build all SoundInfos on first use: %.2f ms" % (materializeTime * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,13 @@ from panda3d.pphysics import *
 from direct.directbase import DirectRender
 from direct.distributed2.DistributedObject import DistributedObject
 from direct.gui.DirectGui import DirectLabel
-from direct.interval.IntervalGlobal import (Func, LerpPosInterval,
-                                            LerpScaleInterval, Parallel,
-                                            Sequence, Wait)
+from direct.interval.IntervalGlobal import Func, Sequence, Wait
 from tf.distributed.GameContextMessages import ContextMessages
 from tf.tfbase import TFEffects, TFGlobals, TFLocalizer
 from tf.tfbase.Soundscapes import SoundscapeManager
 from tf.tfgui import TFGuiProperties
 from tf.tfgui.WinPanel import WinPanel
-from tf.weapon import WeaponEffects
+from tf.weapon.TracerRenderer import TracerRenderer
 
 from .CubemapRendering import CubemapRendering
 from .DistributedGameBase import DistributedGameBase
@@ -32,8 +30,6 @@ ClusterColors = [
     LColor(0.5, 0.5, 1.0, 1.0)
 ]
 
-CachedTracer = None
-
 class DistributedGame(DistributedObject, DistributedGameBase):
 
     def __init__(self):
@@ -72,6 +68,8 @@ class DistributedGame(DistributedObject, DistributedGameBase):
         self.winPanel = None
         self.winPanelRemoveTask = None
 
+        self.tracers = TracerRenderer(ConfigVariableInt('tf-max-tracers', 128).value)
+
     def toggleProbeVis(self):
         self.probeVis = not self.probeVis
         if not self.probeVis:
@@ -269,6 +267,9 @@ class DistributedGame(DistributedObject, DistributedGameBase):
     def unloadLevel(self):
         DistributedGameBase.unloadLevel(self)
 
+        if self.tracers:
+            self.tracers.clear()
+
         base.disableReverb()
 
         if self.fogMgr:
@@ -758,6 +759,9 @@ class DistributedGame(DistributedObject, DistributedGameBase):
         base.localAvatar.killFeed.pushEvent(text, priority)
 
     def delete(self):
+        if self.tracers:
+            self.tracers.cleanup()
+            self.tracers = None
         if self.contextIval:
             self.contextIval.pause()
             self.contextIval = None
@@ -783,9 +787,9 @@ class DistributedGame(DistributedObject, DistributedGameBase):
         tmp = NodePath("tmp")
         tmp.setPos(pos)
         tmp.setQuat(q)
-        effect = TFEffects.getExplosionWallEffect()
+        effect = TFEffects.acquireEffect("explosion_wall")
         effect.setInput(0, tmp, True)
-        base.queueParticleSystem(effect, base.dynRender, 0.1)
+        base.queueParticleSystem(effect, base.dynRender, 0.1, "explosion_wall")
 
         l = qpLight(qpLight.TPoint)
         l.setColorSrgb((1 * 2.5, 0.7 * 2.5, 0))
@@ -811,54 +815,9 @@ class DistributedGame(DistributedObject, DistributedGameBase):
         """
 
     def doTracer(self, start, end, doSound=True, delay=0.0):
-        global CachedTracer
-
         start = Point3(start[0], start[1], start[2])
         end = Point3(end[0], end[1], end[2])
-        speed = 7500
-
-        traceDir = end - start
-        traceLen = traceDir.length()
-        traceDir /= traceLen
-        length = traceLen / speed
-
-        if not CachedTracer:
-            color = Vec4(1.0, 0.9, 0.6, 1)
-            segs = LineSegs('segs')
-            segs.setColor(color)
-            segs.moveTo(Point3(0))
-            segs.setColor(Vec4(0, 0, 0, 0))
-            segs.drawTo(Vec3(0, -1, 0))
-            segs.setThickness(4)
-            np = NodePath(segs.create())
-            np.setLightOff(1)
-            np.setBin('fixed', 2)
-            np.lookAt(traceDir)
-            np.setAttrib(ColorBlendAttrib.make(ColorBlendAttrib.MAdd, ColorBlendAttrib.OOne, ColorBlendAttrib.OOne), 1)
-            CachedTracer = np
-
-        np = CachedTracer.copyTo(base.dynRender)
-        np.lookAt(traceDir)
-
-        tracerScale = min(128, traceLen)
-
-        seq = Sequence()
-        seq.append(Wait(delay))
-        if doSound:
-            seq.append(Func(WeaponEffects.tracerSound, start, end))
-
-        p1 = Parallel()
-        p1.append(LerpPosInterval(np, length, end, start))
-        p1.append(LerpScaleInterval(np, tracerScale / speed, (1, tracerScale, 1), (1, 0.01, 1)))
-        p2 = Parallel()
-        p2.append(LerpScaleInterval(np, tracerScale / speed, (1, 0.01, 1), (1, tracerScale, 1)))
-
-        seq.append(p1)
-        seq.append(p2)
-        seq.append(Func(np.removeNode))
-
-        seq.start()
-
+        self.tracers.addTracer(start, end, doSound, delay)
 
     def doTracers(self, origin, ends):
         if base.clockMgr.isInSimulationClock():
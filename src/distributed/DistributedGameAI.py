@@ -8,7 +8,7 @@ from direct.directnotify.DirectNotifyGlobal import directNotify
 from direct.distributed2.DistributedObjectAI import DistributedObjectAI
 from direct.distributed2.ServerRepository import ServerRepository
 from tf.bot.DistributedTFPlayerBotAI import DistributedTFPlayerBotAI
-from tf.entity.DistributedEntity import DistributedEntity
+from tf.bot.NavGraph import NavGraph
 from tf.entity.EntityRegistryAI import EntityRegistry
 from tf.entity.TFGameRulesProxyAI import TFGameRulesProxyAI
 from tf.object.BaseObject import BaseObject
@@ -39,6 +39,8 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
         DistributedGameBase.__init__(self)
 
         self.gameModeImpl = None
+        # Bot navigation graph of the current level, if it has one.
+        self.navGraph = None
 
         self.waitingForPlayers = True
 
@@ -462,6 +464,10 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
         else:
             self.gameRulesProxy = TFGameRulesProxyAI()
 
+        # Now that every level entity exists, look up the targets of their
+        # output connections once instead of on every output.
+        base.entMgr.resolveConnections()
+
         self.logicAutos = base.entMgr.findAllEntitiesByClassName("logic_auto")
         for la in self.logicAutos:
             la.connMgr.fireOutput("OnMultiNewMap")
@@ -485,6 +491,10 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
 
         self.loadLevelEntities()
 
+        self.navGraph = NavGraph.loadForLevel(lvlName)
+
+        base.air.buildPHSTables()
+
         #
         # Free up memory from the darn cube map textures embedded in the level.
         # We ought to implement some way to just create dummy 1x1 textures on
@@ -516,8 +526,7 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
                         tex.clearRamImage()
 
     def d_doExplosion(self, pos, scale, dir):
-        #base.air.sendUpdatePHSOnly(self, 'doExplosion', [pos, scale, dir], pos)
-        self.sendUpdate('doExplosion', [pos, scale, dir])
+        base.air.sendUpdatePHSOnly(self, 'doExplosion', [pos, scale, dir], pos)
 
     def radiusDamage(self, info, origin, radius, ignoreClass, ignoreEntity):
         # I don't think other players/buildings should block splash damage.
@@ -538,19 +547,13 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
 
         filter = TFFilters.TFQueryFilter(inflictor)
 
-        for do in list(base.net.doId2do.values()):
+        for do in base.entGrid.queryRadius(src, radius):
             if do == info.inflictor:
                 continue
 
             if do.isDODeleted():
                 continue
 
-            if not isinstance(do, DistributedEntity):
-                continue
-
-            if (src - do.getPos()).length() > radius:
-                continue
-
             # This value is used to scale damage when the explosion is blocked by some other object.
             blockedDamagePercent = 0.0
 
@@ -562,6 +565,8 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
 
             # Check that the explosion can "see" the entity.
             spot = do.getPos() + (do.viewOffset * 0.5)
+            if not base.visCache.isPointPotentiallyVisible(src, spot):
+                continue
             tr = TFFilters.traceLine(src, spot, mask, filter)
             if tr['hit']:
                 hitEnt = tr['ent']
@@ -623,8 +628,7 @@ class DistributedGameAI(DistributedObjectAI, DistributedGameBase):
             # TODO: hit all triggers
 
     def d_doTracers(self, origin, ends, excludeClients = []):
-        #base.air.sendUpdatePHSOnly(self, 'doTracers', [origin, ends], origin)
-        self.sendUpdate('doTracers', [origin, ends], excludeClients = excludeClients)
+        base.air.sendUpdatePHSOnly(self, 'doTracers', [origin, ends], origin, excludeClients=excludeClients)
 
     def playerCanTakeDamage(self, player, inflictor):
         if player == inflictor:
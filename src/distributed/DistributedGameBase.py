@@ -3,7 +3,7 @@ from panda3d.core import *
 from panda3d.pphysics import *
 
 from direct.directbase import DirectRender
-from tf.tfbase import CollisionGroups
+from tf.tfbase import CollisionGroups, CollisionMeshCache, TFFilters
 from tf.tfbase.SurfaceProperties import SurfaceProperties
 from tf.tfbase.TFGlobals import TFTeam
 from tf.tfbase.IndexBufferCombiner import IndexBufferCombiner
@@ -130,6 +130,61 @@ class DistributedGameBase:
                 hasAny = True
         return hasAny
 
+    def levelLoadProgress(self, stage, done, total):
+        """
+        Called as each step of a level load completes.  Sends out an event
+        so a loading screen can display the progress.
+        """
+        messenger.send('levelLoadProgress', [stage, done, total])
+
+    def loadPropModels(self, filenames):
+        """
+        Loads the given prop model filenames, each one only once.  The loads
+        are all issued up front and run in parallel on the prop loader
+        threads, so the disk reads and BAM decoding overlap.  Returns a
+        dictionary of full path -> ModelRoot, leaving out the models that
+        failed to load.
+        """
+        models = {}
+        total = len(filenames)
+        if not total:
+            return models
+
+        numThreads = ConfigVariableInt("tf-prop-load-threads", 4).value
+        if numThreads <= 0 or not Thread.isThreadingSupported():
+            for i, filename in enumerate(filenames):
+                propModel = loader.loadModel(filename, okMissing=True)
+                if propModel and not propModel.isEmpty():
+                    models[filename.getFullpath()] = propModel.node()
+                self.levelLoadProgress("models", i + 1, total)
+            return models
+
+        taskMgr = AsyncTaskManager.getGlobalPtr()
+        chain = taskMgr.findTaskChain("propLoader")
+        if not chain:
+            chain = taskMgr.makeTaskChain("propLoader")
+        chain.setNumThreads(min(numThreads, total))
+
+        opts = LoaderOptions()
+        requests = []
+        for filename in filenames:
+            request = loader.loader.makeAsyncRequest(filename, opts)
+            request.setTaskChain("propLoader")
+            taskMgr.add(request)
+            requests.append((filename, request))
+
+        for i, (filename, request) in enumerate(requests):
+            request.wait()
+            node = request.getModel()
+            if node:
+                models[filename.getFullpath()] = node
+            self.levelLoadProgress("models", i + 1, total)
+
+        # Don't keep idle loader threads around until the next level load.
+        chain.stopThreads()
+
+        return models
+
     def loadLevelProps(self):
         # Create a dedicated DynamicVisNode for culling static props.
         # We have one node dedicated to culling static props and another
@@ -149,25 +204,39 @@ class DistributedGameBase:
         propPhysRoot.hide()
         lightNodes = []
 
+        # Collision meshes used by this level.
+        usedMeshHashes = set()
+        CollisionMeshCache.beginLevelLoad()
+
+        # Load every unique prop model up front, then instance the loaded
+        # models for each prop.
+        props = []
+        modelFilenames = {}
+        for i in range(self.lvlData.getNumStaticProps()):
+            sprop = self.lvlData.getStaticProp(i)
+            modelFilename = sprop.getModelFilename()
+            if not modelFilename.getBasenameWoExtension():
+                continue
+            props.append(sprop)
+            modelFilenames.setdefault(modelFilename.getFullpath(), modelFilename)
+
+        propModelNodes = self.loadPropModels(list(modelFilenames.values()))
+
         # We keep track of the models that we loaded so we can evict them
         # from the ModelPoolc ache after we are done.
         # Prop models are typically only loaded one during level loads
         # and fully manipulated after, we so can free up memory by not
         # having them in the cache.
-        loadedModels = []
-
-        for i in range(self.lvlData.getNumStaticProps()):
-            sprop = self.lvlData.getStaticProp(i)
+        loadedModels = list(propModelNodes.values())
 
-            if not sprop.getModelFilename().getBasenameWoExtension():
-                continue
+        for i, sprop in enumerate(props):
+            self.levelLoadProgress("props", i, len(props))
 
             modelFilename = sprop.getModelFilename()
-            propModel = loader.loadModel(modelFilename, okMissing=True)
-            if not propModel or propModel.isEmpty():
+            mdlNode = propModelNodes.get(modelFilename.getFullpath())
+            if not mdlNode:
                 continue
-
-            loadedModels.append(propModel.node())
+            propModel = NodePath(mdlNode.copySubgraph())
 
             if sprop.getSkin() < propModel.node().getNumMaterialGroups():
                 propModel.node().setActiveMaterialGroup(sprop.getSkin())
@@ -180,17 +249,10 @@ class DistributedGameBase:
             cnode = None
             cinfo = propModel.node().getCollisionInfo()
             if sprop.getSolid() and cinfo and cinfo.getPart(0).mesh_data:
-                part = cinfo.getPart(0)
-                if part.concave:
-                    mdata = PhysTriangleMeshData(part.mesh_data)
-                else:
-                    mdata = PhysConvexMeshData(part.mesh_data)
-                if mdata.generateMesh():
-                    if part.concave:
-                        mesh = PhysTriangleMesh(mdata)
-                    else:
-                        mesh = PhysConvexMesh(mdata)
-
+                # Instances of the same model share one mesh.
+                mesh, meshHash = CollisionMeshCache.getCollisionMesh(cinfo.getPart(0), modelFilename.getFullpath())
+                usedMeshHashes.add(meshHash)
+                if mesh:
                     surfaceProp = "default"
                     cdata = propModel.node().getCustomData()
                     if cdata:
@@ -253,6 +315,10 @@ class DistributedGameBase:
             if cnode:
                 cnode.syncTransform()
 
+        self.levelLoadProgress("props", len(props), len(props))
+
+        CollisionMeshCache.endLevelLoad(usedMeshHashes)
+
         #self.flatten(propRoot)
 
         for propModel, hasVtxLight, in3DSky in lightNodes:
@@ -337,6 +403,8 @@ class DistributedGameBase:
         self.unloadLevel()
 
     def unloadLevel(self):
+        # Flames from the old level shouldn't burn on in the new one.
+        base.flameMgr.clear()
         if self.skyFaceRoot:
             self.skyFaceRoot.removeNode()
             self.skyFaceRoot = None
@@ -345,6 +413,7 @@ class DistributedGameBase:
             self.propRoot = None
         if self.propPhysRoot:
             for cnp in self.propPhysRoot.findAllMatches("**/+PhysRigidActorNode"):
+                TFFilters.clearActorFilterData(cnp.node())
                 cnp.node().removeFromScene(base.physicsWorld)
             self.propPhysRoot.removeNode()
             self.propPhysRoot = None
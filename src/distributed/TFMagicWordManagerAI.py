@@ -1,5 +1,7 @@
 """TFMagicWordManagerAI module: contains the TFMagicWordManagerAI class."""
 
+import os
+
 from direct.distributed2.DistributedObjectAI import DistributedObjectAI
 
 
@@ -13,7 +15,11 @@ class TFMagicWordManagerAI(DistributedObjectAI):
             "clearbots": self.__clearBots,
             "noclip": self.__toggleNoClip,
             "kill": self.__kill,
-            "explode": self.__explode
+            "explode": self.__explode,
+            "tickprof": self.__tickProfile,
+            "thinkstats": self.__thinkStats,
+            "losstats": self.__losStats,
+            "phsstats": self.__phsStats
         }
 
     def __makeBot(self, args, av):
@@ -56,6 +62,54 @@ class TFMagicWordManagerAI(DistributedObjectAI):
         info.setDamage(100000)
         av.takeDamage(info)
 
+    def __tickProfile(self, args, av):
+        prof = base.tickProfiler
+        if len(args) > 0:
+            if args[0] == "reset":
+                prof.reset()
+                return "Tick profile reset"
+            elif args[0] == "dump":
+                # Only allow writing into the server's working directory.
+                filename = os.path.basename(args[1]) if len(args) > 1 else "tickprof.csv"
+                prof.dump(filename)
+                return "Wrote tick profile to " + filename
+            elif args[0] == "on":
+                prof.start()
+                return "Tick profiler ON"
+            elif args[0] == "off":
+                prof.stop()
+                return "Tick profiler OFF"
+        return prof.getSummary()
+
+    def __thinkStats(self, args, av):
+        if len(args) > 0 and args[0] == "reset":
+            base.thinkMgr.resetStats()
+            return "Think stats reset"
+        lines = ["%i thinks scheduled" % base.thinkMgr.getNumScheduled()]
+        for name, count, totalMs, meanUs in base.thinkMgr.getStats()[:8]:
+            lines.append("%s: %i thinks, %.1f ms total, %.1f us avg" % (name, count, totalMs, meanUs))
+        return "\n".join(lines)
+
+    def __losStats(self, args, av):
+        if len(args) > 0 and args[0] == "reset":
+            base.visCache.resetStats()
+            return "LOS stats reset"
+        hits, traces, culled = base.visCache.getStats()
+        totalHits, totalTraces, totalCulled = base.visCache.getTotalStats()
+        total = totalHits + totalTraces + totalCulled
+        return ("Last tick: %i cache hits, %i traces, %i PVS culled\n"
+                "Total: %i cache hits, %i traces, %i PVS culled (%.1f%% traces saved)" %
+                (hits, traces, culled, totalHits, totalTraces, totalCulled,
+                 (100.0 * (total - totalTraces) / total) if total else 0.0))
+
+    def __phsStats(self, args, av):
+        if len(args) > 0 and args[0] == "reset":
+            base.air.phsNumFiltered = 0
+            base.air.phsBytesSaved = 0
+            return "PHS stats reset"
+        return "PHS filtered %i updates, saving about %i bytes (%i bytes sent in total)" % (
+            base.air.phsNumFiltered, base.air.phsBytesSaved, base.air.bytesSent)
+
     def sendResponse(self, client, resp):
         self.sendUpdate('magicWordResp', [resp], client)
 
@@ -20,6 +20,18 @@ class TFServerRepository(ServerRepository):
 
         base.sv = self
 
+        # Total bytes of datagrams sent to clients, for load testing.
+        self.bytesSent = 0
+
+        # Potentially hearable set of each cluster of the current level.
+        self.phsTables = []
+        # Update field name -> bytes it took per client last time.
+        self.phsUpdateSizes = {}
+        # Number of updates not sent to clients outside of the PHS, and
+        # about how many bytes that saved.
+        self.phsNumFiltered = 0
+        self.phsBytesSaved = 0
+
         self.lagComp = LagCompensation()
         base.simTaskMgr.add(self.__recordPlayerPositions, 'recordPlayerPositions', sort=1000)
 
@@ -106,43 +118,78 @@ class TFServerRepository(ServerRepository):
                 dg.addUint8(client.authAttemptsLeft)
                 self.sendDatagram(dg, client.connection)
 
+    def sendDatagram(self, dg, *args, **kwargs):
+        self.bytesSent += dg.getLength()
+        return ServerRepository.sendDatagram(self, dg, *args, **kwargs)
+
+    def buildPHSTables(self):
+        """
+        Builds the potentially hearable set of every cluster of the current
+        level, so PHS filtering doesn't have to walk the cluster's PVS data
+        on every update.
+        """
+        self.phsTables = []
+        lvlData = self.game.lvlData
+        if not lvlData:
+            return
+        for cluster in range(lvlData.getNumClusters()):
+            phs = BitArray()
+            phs.setBit(cluster)
+            pvs = lvlData.getClusterPvs(cluster)
+            for i in range(pvs.getNumHearableClusters()):
+                phs.setBit(pvs.getHearableCluster(i))
+            self.phsTables.append(phs)
+
     def sendUpdatePHSOnly(self, do, name, args, refPos, client=None, excludeClients=[]):
+        """
+        Sends the update only to clients in the potentially hearable set of
+        refPos.
+        """
         if client:
             # This is targeted update, just send it to them.
             self.sendUpdate(do, name, args, client=client)
             return
 
-        tree = self.game.lvlData.getAreaClusterTree()
-        leaf = tree.getLeafValueFromPoint(refPos)
-        if leaf == -1:
+        cluster = base.visCache.getCluster(refPos)
+        if cluster < 0 or cluster >= len(self.phsTables):
+            # Outside of the level, we can't tell who can hear it.
+            self.sendUpdate(do, name, args, excludeClients=excludeClients)
             return
-        print("phs filter at pos", refPos)
-        phs = BitArray()
-        pvs = self.game.lvlData.getClusterPvs(leaf)
-        for i in range(pvs.getNumHearableClusters()):
-            phs.setBit(pvs.getHearableCluster(i))
-        print("filter ref leaf", leaf)
-        print(phs.getNumOnBits(), "hearable leaves")
 
+        phs = self.phsTables[cluster]
+        numRecipients = 0
+        numFiltered = 0
         excludeClients = list(excludeClients)
         for cl in self.clientsByConnection.values():
             if cl in excludeClients:
                 continue
-            if not hasattr(cl, 'player'):
-                continue
-            if not cl.player:
-                continue
-            clLeaf = tree.getLeafValueFromPoint(cl.player.getEyePosition())
-            if clLeaf == -1 or not phs.getBit(clLeaf):
-                print(cl, "not in phs")
-                excludeClients.append(cl)
-
+            player = getattr(cl, 'player', None)
+            if player:
+                clCluster = base.visCache.getEntityCluster(player)
+                if clCluster >= 0 and not phs.getBit(clCluster):
+                    excludeClients.append(cl)
+                    numFiltered += 1
+                    continue
+            numRecipients += 1
+
+        bytesBefore = self.bytesSent
         self.sendUpdate(do, name, args, excludeClients=excludeClients)
 
+        if numRecipients:
+            # Remember what this update costs per client, to estimate what
+            # we save when nobody in the PHS gets it.
+            self.phsUpdateSizes[name] = (self.bytesSent - bytesBefore) // numRecipients
+        self.phsNumFiltered += numFiltered
+        self.phsBytesSaved += self.phsUpdateSizes.get(name, 0) * numFiltered
+
     def syncAllHitBoxes(self):
         from tf.actor.DistributedCharAI import DistributedCharAI
         DistributedCharAI.syncAllHitBoxes()
 
+    def syncHitBoxesInCone(self, origin, direction, distance, spread, coneRadius=0.0):
+        from tf.actor.DistributedCharAI import DistributedCharAI
+        DistributedCharAI.syncHitBoxesInCone(origin, direction, distance, spread, coneRadius)
+
     def __recordPlayerPositions(self, task):
         self.lagComp.recordPlayerPositions()
         return task.cont
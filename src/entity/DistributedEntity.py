@@ -26,6 +26,8 @@ from .EntityBase import EntityBase
 
 if IS_CLIENT:
     from tf.player.Prediction import *
+else:
+    from .ThinkScheduler import ThinkContext
 
 class DistributedEntity(BaseClass, NodePath, EntityBase):
 
@@ -48,6 +50,9 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
 
         self.entType = self.EntTypeOther
 
+        # Context name -> ThinkContext, created on the first setNextThink().
+        self.thinkContexts = None
+
         self.hitBoxes = []
 
         # Are we allowed to take damage?
@@ -62,8 +67,8 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
         # component system would come in handy.  We could allow entities/DOs
         # to contain components that add new data/functionality onto an
         # entity that needs it, without having to modify the base class for
-        # all entities.
-        self.team = TFTeam.NoTeam
+        # all entities.  Accessed through the team property.
+        self._team = TFTeam.NoTeam
 
         # Another thing that could be done with components.  Surely, not all
         # entities need health.
@@ -163,9 +168,9 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             q = Quat()
             lookAt(q, norm)
             tmp.setQuat(q)
-            effect = TFEffects.getBulletImpactConcreteEffect()
+            effect = TFEffects.acquireEffect("bullet_impact_concrete")
             effect.setInput(0, tmp, True)
-            base.queueParticleSystem(effect, base.dynRender, 0.1)
+            base.queueParticleSystem(effect, base.dynRender, 0.1, "bullet_impact_concrete")
 
     def traceImpact(self, tr, impactInfo, excludeClients=[], client=None):
 
@@ -208,6 +213,10 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
         self.node().setName(self.uniqueName(self.__class__.__name__))
         # Don't let Actor override the name.
         self.gotName = 1
+        # The collisions may have been built before we had a doId.
+        self.updateFilterData()
+        if not IS_CLIENT:
+            base.entGrid.addEntity(self, self.isGridPolled())
 
     def isPlayer(self):
         """
@@ -322,8 +331,9 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
 
         # Ensure it's not in any PhysScene.
         self.node().removeFromScene(base.physicsWorld)
+        TFFilters.clearActorFilterData(self.node())
 
-        self.removeTask("physSync")
+        self.stopPhysSync()
 
         if replaceWithNormalNode:
             # Replace the physics node with a regular PandaNode.
@@ -331,6 +341,8 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             entNode.replaceNode(self.node())
             entNode.setFinal(self.MakeFinal)
         self.hasCollisions = False
+        if not IS_CLIENT:
+            base.entGrid.setPolled(self, self.isGridPolled())
 
     def makeModelCollisionShape(self):
         return None
@@ -460,7 +472,52 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
 
         self.hasCollisions = True
 
+        self.updateFilterData()
+
         self.considerPhysSyncTask()
+        if not IS_CLIENT:
+            base.entGrid.setPolled(self, self.isGridPolled())
+
+    def getFilterActors(self):
+        """
+        Returns the list of physics actors that belong to this entity, which
+        scene queries may hit.
+        """
+        actors = []
+        if self.hasCollisions:
+            actors.append(self.node())
+        for hbox in self.hitBoxes:
+            actors.append(hbox.body)
+        return actors
+
+    @property
+    def team(self):
+        return self._team
+
+    @team.setter
+    def team(self, team):
+        if team != self._team:
+            self._team = team
+            # The native query filter has its own copy of our team.
+            self.updateFilterData()
+
+    def updateFilterData(self):
+        """
+        Pushes the entity's team, type and builder to the native query
+        filter for each of the entity's physics actors.  Called when the
+        actors are created, when the entity is generated and by the team
+        setter; must also be called when the builder changes.
+        """
+        for actor in self.getFilterActors():
+            TFFilters.setActorFilterData(actor, self)
+
+    def clearFilterData(self):
+        """
+        Removes the native query filter records of the entity's physics
+        actors.  Must be called before the actors go away.
+        """
+        for actor in self.getFilterActors():
+            TFFilters.clearActorFilterData(actor)
 
     def getEyePosition(self):
         return Point3(self.getPos() + self.viewOffset)
@@ -471,11 +528,15 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
     def fireBullets(self, info):
         clearMultiDamage()
 
-        base.net.syncAllHitBoxes()
-
         # Fire a bullet (ignoring the shooter).
         start = info['src']
         end = start + info['dirShooting'] * info['distance']
+
+        if not IS_CLIENT:
+            # Only sync the hitboxes that could be along the bullet.
+            base.net.syncHitBoxesInCone(start, info['dirShooting'], info['distance'], 0.0)
+        else:
+            base.net.syncAllHitBoxes()
         tr = TFFilters.traceLine(start, end, CollisionGroups.Mask_BulletCollide,
                                  TFFilters.TFQueryFilter(self))
         if tr['hit']:
@@ -678,9 +739,18 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
         """
 
         if self.parentEntityId >= 0 and self.parentEntity and self.hasCollisions and self.kinematic:
-            self.addTask(self.__physSync, "physSync", sim=True, appendTask=True)
+            if IS_CLIENT:
+                self.addTask(self.__physSync, "physSync", sim=True, appendTask=True)
+            elif self.getNextThink("physSync") < 0:
+                self.setNextThink(base.clockMgr.getTime(), self.__physSyncThink, "physSync")
         else:
+            self.stopPhysSync()
+
+    def stopPhysSync(self):
+        if IS_CLIENT:
             self.removeTask("physSync")
+        else:
+            self.setNextThink(-1, context="physSync")
 
     def __physSync(self, task):
         """
@@ -690,6 +760,10 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
         self.node().syncTransform()
         return task.cont
 
+    def __physSyncThink(self):
+        self.setNextThink(base.clockMgr.getTime(), context="physSync")
+        self.node().syncTransform()
+
     def updateParentEntity(self):
         parentId = self.parentEntityId
         if parentId < 0:
@@ -713,6 +787,9 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             self.parentEntity = parentEntity
 
         self.considerPhysSyncTask()
+        if not IS_CLIENT:
+            base.entGrid.setPolled(self, self.isGridPolled())
+            base.entGrid.updateEntity(self)
 
     def setParentEntityId(self, parentId):
         """
@@ -772,6 +849,62 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             self.teleportParity %= 256
 
     if not IS_CLIENT:
+        def setPos(self, *args, **kwargs):
+            NodePath.setPos(self, *args, **kwargs)
+            base.entGrid.updateEntity(self)
+
+        def setPosHpr(self, *args, **kwargs):
+            NodePath.setPosHpr(self, *args, **kwargs)
+            base.entGrid.updateEntity(self)
+
+        def isGridPolled(self):
+            """
+            Returns True if the entity can move without going through
+            setPos(), so the entity grid has to check its position every
+            tick.  That is the case for dynamic physics bodies, which the
+            physics scene moves, and for entities that move with a parent
+            entity.
+            """
+            return (self.hasCollisions and not self.kinematic) or self.parentEntityId >= 0
+
+        def setNextThink(self, thinkTime, func=None, context=''):
+            """
+            Schedules func to be called on the first simulation tick at or
+            after thinkTime.  Each named context has its own schedule, and
+            func may be omitted to reuse the context's previous function.
+            A thinkTime of -1 stops the context from thinking.
+            """
+            if self.thinkContexts is None:
+                self.thinkContexts = {}
+            ctx = self.thinkContexts.get(context)
+            if ctx is None:
+                if thinkTime < 0:
+                    return
+                assert func is not None
+                ctx = ThinkContext(self, func, context)
+                self.thinkContexts[context] = ctx
+            elif func is not None:
+                ctx.func = func
+            base.thinkMgr.setNextThink(ctx, thinkTime)
+
+        def getNextThink(self, context=''):
+            """
+            Returns the time the given context will next think, or -1.
+            """
+            if not self.thinkContexts:
+                return -1
+            ctx = self.thinkContexts.get(context)
+            if not ctx:
+                return -1
+            return base.thinkMgr.getNextThinkTime(ctx)
+
+        def stopThinking(self):
+            if not self.thinkContexts:
+                return
+            for ctx in self.thinkContexts.values():
+                base.thinkMgr.setNextThink(ctx, -1)
+            self.thinkContexts = None
+
         def initFromLevel(self, ent, properties):
             """
             Called to initialize the level entity from the given property
@@ -840,8 +973,8 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
                 soundInfo[4] = chan
             soundInfo.append(offset)
             soundInfo.append(loop)
-            if False:# phsOnly:
-                base.air.sendUpdatePHSOnly(self, 'emitSoundSpatial_sv', soundInfo, self.getPos() + offset, client=client, excludeClients=excludeClients)
+            if phsOnly:
+                base.air.sendUpdatePHSOnly(self, 'emitSoundSpatial_sv', soundInfo, self.getPos() + Vec3(*offset), client=client, excludeClients=excludeClients)
             else:
                 self.sendUpdate('emitSoundSpatial_sv', soundInfo, client=client, excludeClients=excludeClients)
 
@@ -858,6 +991,19 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             is returned as the second return value in a tuple.
             """
 
+            if traceMask == CollisionGroups.World:
+                # World-only LOS is shared between everyone asking this
+                # tick.
+                return base.visCache.isEntityVisible(self, entity)
+            elif traceMask & CollisionGroups.World:
+                # If the world alone already blocks it, nothing else in the
+                # mask can unblock it.
+                if not base.visCache.isEntityPotentiallyVisible(self, entity):
+                    return (False, base.world)
+                cached = base.visCache.getCachedEntityVisibility(self, entity)
+                if cached is not None and not cached[0]:
+                    return cached
+
             lookerOrigin = self.getEyePosition()
             targetOrigin = entity.getEyePosition()
             tr = TFFilters.traceLine(lookerOrigin, targetOrigin, traceMask, TFFilters.TFQueryFilter(self))
@@ -1005,6 +1151,9 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             NodePath.removeNode(self)
 
     def delete(self):
+        if not IS_CLIENT:
+            base.entGrid.removeEntity(self)
+            self.stopThinking()
         if IS_CLIENT:
             self.ivPos = None
             self.ivRot = None
@@ -1013,6 +1162,7 @@ class DistributedEntity(BaseClass, NodePath, EntityBase):
             self.soundEmitter.delete()
             self.soundEmitter = None
         EntityBase.delete(self)
+        self.clearFilterData()
         # There's no point in replacing the physics node with a PandaNode
         # since we're about to delete it anyway.  Saves a tiny bit of time.
         self.destroyCollisions(replaceWithNormalNode=False)
@@ -25,8 +25,7 @@ class EntityBase(DirectObject):
         for i in range(ent.getNumConnections()):
             conn = ent.getConnection(i)
             oconn = OutputConnection()
-            # Convert wildcards to python regex wildcard.
-            oconn.targetEntityName = conn.getTargetName().replace("*", ".+")
+            oconn.targetEntityName = conn.getTargetName()
             oconn.inputName = conn.getInputName()
             oconn.once = conn.getRepeat()
             oconn.delay = conn.getDelay()
@@ -1,7 +1,16 @@
 """EntityConnectionManager module: contains the EntityConnectionManager class."""
 
+import heapq
+
+from panda3d.core import PStatCollector
+
 from direct.directnotify.DirectNotifyGlobal import directNotify
 
+ioQueuedPColl = PStatCollector("EntityIO:Queued")
+ioFiredPColl = PStatCollector("EntityIO:Fired")
+ioDroppedPColl = PStatCollector("EntityIO:Dropped")
+ioDelayedPColl = PStatCollector("EntityIO:Delayed")
+
 class OutputConnection:
 
     def __init__(self):
@@ -10,6 +19,10 @@ class OutputConnection:
         self.parameters = []
         self.once = False
         self.delay = 0.0
+        # Cached result of looking up targetEntityName, valid while
+        # targetsGeneration matches the EntityManager's generation.
+        self.targets = None
+        self.targetsGeneration = -1
 
 class EntityConnectionManager:
 
@@ -17,13 +30,55 @@ class EntityConnectionManager:
 
     GlobalIOQueue = []
 
+    # Delayed inputs, as a heap of (fireTick, sequence, event).  The
+    # sequence number makes inputs due on the same tick fire in the order
+    # they were queued.
+    DelayedIOQueue = []
+    DelayedIOSequence = 0
+
+    # Counters for the most recent tick.
+    NumQueued = 0
+    NumFired = 0
+    NumDropped = 0
+
     def __init__(self, entity):
         self.entity = entity
         self.outputs = {}
-        self.delayedTasks = set()
+
+    @staticmethod
+    def queueInput(entity, targetEnt, func, params, delay=0.0):
+        """
+        Queues an input to be fired on the next IO queue run, or on the first
+        run at least delay seconds from now.
+        """
+        event = (entity, targetEnt, func, params)
+        EntityConnectionManager.NumQueued += 1
+        if delay > 0.0:
+            fireTick = base.tickCount + max(1, base.timeToTicks(delay))
+            seq = EntityConnectionManager.DelayedIOSequence
+            EntityConnectionManager.DelayedIOSequence = seq + 1
+            heapq.heappush(EntityConnectionManager.DelayedIOQueue, (fireTick, seq, event))
+        else:
+            EntityConnectionManager.GlobalIOQueue.append(event)
 
     def processIOQueue(task):
-        if not EntityConnectionManager.GlobalIOQueue:
+        cls = EntityConnectionManager
+
+        # Move the delayed inputs that are due onto the queue.
+        delayed = cls.DelayedIOQueue
+        tick = base.tickCount
+        while delayed and delayed[0][0] <= tick:
+            cls.GlobalIOQueue.append(heapq.heappop(delayed)[2])
+
+        ioQueuedPColl.setLevel(cls.NumQueued)
+        ioDelayedPColl.setLevel(len(delayed))
+        cls.NumQueued = 0
+
+        if not cls.GlobalIOQueue:
+            cls.NumFired = 0
+            cls.NumDropped = 0
+            ioFiredPColl.setLevel(0)
+            ioDroppedPColl.setLevel(0)
             return task.cont
 
         # Hold a temporary reference to the current queue, clear
@@ -31,26 +86,28 @@ class EntityConnectionManager:
         # This allows a new queue to be built up this frame while
         # we fire the inputs of the previous queue.
 
-        theQueue = EntityConnectionManager.GlobalIOQueue
-        EntityConnectionManager.GlobalIOQueue = list()
+        theQueue = cls.GlobalIOQueue
+        cls.GlobalIOQueue = list()
+        fired = 0
+        dropped = 0
         for entity, targetEnt, func, params in theQueue:
             if entity.connMgr is None or targetEnt.connMgr is None:
                 # Source or target entity was deleted.
+                dropped += 1
                 continue
             # Fire the input.
+            fired += 1
             if params:
                 func(entity, *params)
             else:
                 func(entity)
 
-        return task.cont
+        cls.NumFired = fired
+        cls.NumDropped = dropped
+        ioFiredPColl.setLevel(fired)
+        ioDroppedPColl.setLevel(dropped)
 
-    def __delayedConnectionTask(self, entity, targetEnt, func, params, task):
-        # FIXME: Need to check that the entity we're calling still exists.
-        if task in self.delayedTasks:
-            self.delayedTasks.remove(task)
-        EntityConnectionManager.GlobalIOQueue.append((entity, targetEnt, func, params))
-        return task.done
+        return task.cont
 
     def addConnection(self, outputName, connection):
         connections = self.outputs.get(outputName, [])
@@ -58,11 +115,10 @@ class EntityConnectionManager:
         self.outputs[outputName] = connections
 
     def cleanup(self):
+        # Any inputs still queued from or to this entity are dropped when
+        # they come due, since connMgr is cleared along with us.
         self.entity = None
         self.outputs = None
-        for t in self.delayedTasks:
-            t.remove()
-        self.delayedTasks = None
 
     def getConnectionEntity(self, targetName, activator, caller):
         if targetName == '!self':
@@ -77,6 +133,30 @@ class EntityConnectionManager:
             # Look up target name in entity dictionary.
             return base.entMgr.findAllEntities(targetName)
 
+    def isDynamicTarget(self, targetName):
+        """
+        Returns True if the target of a connection to the given name isn't
+        an entity name lookup, and therefore can't be cached.
+        """
+        return targetName in ('!activator', '!caller', 'tf_gamerules')
+
+    def resolveConnection(self, connection):
+        """
+        Returns the target entities of the given connection, resolving and
+        caching them if the set of entities changed since the last lookup.
+        """
+        generation = base.entMgr.generation
+        if connection.targetsGeneration != generation:
+            connection.targets = self.getConnectionEntity(connection.targetEntityName, None, None)
+            connection.targetsGeneration = generation
+        return connection.targets
+
+    def resolveConnections(self):
+        for connections in self.outputs.values():
+            for connection in connections:
+                if not self.isDynamicTarget(connection.targetEntityName):
+                    self.resolveConnection(connection)
+
     def fireOutput(self, name, extraArgs=[], activator=None):
         connections = self.outputs.get(name)
         if not connections:
@@ -85,7 +165,10 @@ class EntityConnectionManager:
 
         # Trigger all connections.
         for connection in list(connections):
-            ents = self.getConnectionEntity(connection.targetEntityName, activator, None)
+            if self.isDynamicTarget(connection.targetEntityName):
+                ents = self.getConnectionEntity(connection.targetEntityName, activator, None)
+            else:
+                ents = self.resolveConnection(connection)
             if not ents:
                 self.notify.warning(f'Output {name} is connected to non-existent entity {connection.targetEntityName}.')
                 continue
@@ -94,14 +177,8 @@ class EntityConnectionManager:
             for ent in ents:
                 func = getattr(ent, funcName, None)
                 if func:
-                    if connection.delay > 0.0:
-                        # Add a task to fire it later.
-                        task = base.simTaskMgr.doMethodLater(connection.delay, self.__delayedConnectionTask,
-                            'delayedConnection', extraArgs=[self.entity, ent, func, params], appendTask=True)
-                        self.delayedTasks.add(task)
-                    else:
-                        # Fire it immediately.
-                        EntityConnectionManager.GlobalIOQueue.append((self.entity, ent, func, params))
+                    # Fire it on the next IO queue run, or later if delayed.
+                    EntityConnectionManager.queueInput(self.entity, ent, func, params, connection.delay)
                 else:
                     self.notify.warning(f'Handling output {name} from entity {self.entity.__class__}, input method {funcName} does not exist on entity {ent.__class__}.')
             if connection.once:
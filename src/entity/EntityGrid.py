@@ -0,0 +1,218 @@
+"""EntityGrid module: contains the EntityGrid class."""
+
+import math
+
+from panda3d.core import NodePath
+
+class EntityGrid:
+    """
+    Server-side uniform grid of entity positions, used to answer proximity
+    queries (splash damage, sentry targeting, bot perception) without
+    scanning every distributed object.
+
+    Entities are bucketed by their world-space XY position.  Entities that
+    are moved through setPos() re-bucket themselves right away with
+    updateEntity().  Only entities that can move behind Python's back, such
+    as dynamic physics bodies and entities parented to another entity, are
+    marked as polled, and update() checks just those once per tick.
+    Queries gather candidates from the overlapping cells, padded by
+    moveSlack to account for polled entities that moved since the last
+    refresh, then do the exact test against each entity's live position.
+
+    Cells are insertion-ordered dicts rather than sets, so query results
+    come back in the same order from run to run.
+    """
+
+    def __init__(self, cellSize=256.0, moveSlack=64.0):
+        self.cellSize = cellSize
+        self.invCellSize = 1.0 / cellSize
+        self.moveSlack = moveSlack
+        # (cellX, cellY) -> {entity: None}, used as an ordered set.
+        self.cells = {}
+        # Entity -> (cellX, cellY) it is currently bucketed in.
+        self.entCells = {}
+        # Entities whose position update() checks every tick, as an
+        # ordered set.
+        self.polled = {}
+        self.root = NodePath()
+
+    def cleanup(self):
+        self.cells = None
+        self.entCells = None
+        self.polled = None
+
+    def getCellKey(self, x, y):
+        return (math.floor(x * self.invCellSize), math.floor(y * self.invCellSize))
+
+    def getEntityPos(self, ent):
+        return ent.getPos(self.root)
+
+    def addEntity(self, ent, polled=False):
+        if ent in self.entCells:
+            return
+        pos = self.getEntityPos(ent)
+        key = self.getCellKey(pos[0], pos[1])
+        self.entCells[ent] = key
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = {}
+            self.cells[key] = cell
+        cell[ent] = None
+        if polled:
+            self.polled[ent] = None
+
+    def removeEntity(self, ent):
+        key = self.entCells.pop(ent, None)
+        if key is None:
+            return
+        self.polled.pop(ent, None)
+        cell = self.cells[key]
+        del cell[ent]
+        if not cell:
+            del self.cells[key]
+
+    def setPolled(self, ent, polled):
+        """
+        Sets whether update() checks the entity's position every tick.  Does
+        nothing if the entity isn't in the grid.
+        """
+        if ent not in self.entCells:
+            return
+        if polled:
+            self.polled[ent] = None
+        else:
+            self.polled.pop(ent, None)
+
+    def updateEntity(self, ent):
+        """
+        Re-buckets the entity immediately.  Called whenever the entity is
+        moved through setPos(), and by update() for polled entities.
+        """
+        key = self.entCells.get(ent)
+        if key is None:
+            return
+        pos = self.getEntityPos(ent)
+        newKey = self.getCellKey(pos[0], pos[1])
+        if newKey == key:
+            return
+        cell = self.cells[key]
+        del cell[ent]
+        if not cell:
+            del self.cells[key]
+        self.entCells[ent] = newKey
+        cell = self.cells.get(newKey)
+        if cell is None:
+            cell = {}
+            self.cells[newKey] = cell
+        cell[ent] = None
+
+    def update(self):
+        """
+        Refreshes the cell of every polled entity.  Called once per
+        simulation tick.
+        """
+        for ent in list(self.polled):
+            self.updateEntity(ent)
+
+    def __gatherCells(self, minX, minY, maxX, maxY):
+        slack = self.moveSlack
+        x0, y0 = self.getCellKey(minX - slack, minY - slack)
+        x1, y1 = self.getCellKey(maxX + slack, maxY + slack)
+        cells = self.cells
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            # The query covers more cells than are occupied, faster to just
+            # walk the occupied ones.
+            return [cell for (cx, cy), cell in cells.items()
+                    if x0 <= cx <= x1 and y0 <= cy <= y1]
+        ret = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    ret.append(cell)
+        return ret
+
+    @staticmethod
+    def __accept(ent, entType, team):
+        if entType is not None and ent.entType != entType:
+            return False
+        if team is not None and ent.team != team:
+            return False
+        return True
+
+    def queryRadius(self, center, radius, entType=None, team=None):
+        """
+        Returns a list of the entities whose world position lies within
+        radius units of center.  Optionally only returns entities of the
+        given DistributedEntity.EntType* and/or team.
+        """
+        cx, cy, cz = center[0], center[1], center[2]
+        radius2 = radius * radius
+        ret = []
+        for cell in self.__gatherCells(cx - radius, cy - radius, cx + radius, cy + radius):
+            for ent in cell:
+                if not self.__accept(ent, entType, team):
+                    continue
+                pos = self.getEntityPos(ent)
+                dx = pos[0] - cx
+                dy = pos[1] - cy
+                dz = pos[2] - cz
+                if dx * dx + dy * dy + dz * dz <= radius2:
+                    ret.append(ent)
+        return ret
+
+    def queryAABB(self, mins, maxs, entType=None, team=None):
+        """
+        Returns a list of the entities whose world position lies inside the
+        given world-space box.
+        """
+        ret = []
+        for cell in self.__gatherCells(mins[0], mins[1], maxs[0], maxs[1]):
+            for ent in cell:
+                if not self.__accept(ent, entType, team):
+                    continue
+                pos = self.getEntityPos(ent)
+                if mins[0] <= pos[0] <= maxs[0] and \
+                   mins[1] <= pos[1] <= maxs[1] and \
+                   mins[2] <= pos[2] <= maxs[2]:
+                    ret.append(ent)
+        return ret
+
+    def queryCone(self, origin, direction, minDot, distance=None, entType=None, team=None):
+        """
+        Returns a list of the entities whose eye position lies within the
+        cone starting at origin along the normalized direction, where the
+        cosine of the angle to the entity is at least minDot.  If distance is
+        given, the cone is also limited to that range.
+        """
+        ox, oy, oz = origin[0], origin[1], origin[2]
+        dx, dy, dz = direction[0], direction[1], direction[2]
+
+        if distance is not None:
+            cells = self.__gatherCells(ox - distance, oy - distance, ox + distance, oy + distance)
+            dist2 = distance * distance
+        else:
+            cells = self.cells.values()
+            dist2 = None
+
+        ret = []
+        for cell in cells:
+            for ent in cell:
+                if not self.__accept(ent, entType, team):
+                    continue
+                eye = ent.getEyePosition()
+                vx = eye[0] - ox
+                vy = eye[1] - oy
+                vz = eye[2] - oz
+                len2 = vx * vx + vy * vy + vz * vz
+                if dist2 is not None and len2 > dist2:
+                    continue
+                if len2 < 0.0001:
+                    continue
+                dot = (vx * dx + vy * dy + vz * dz) / math.sqrt(len2)
+                if dot >= minDot:
+                    ret.append(ent)
+        return ret
+
+    def __len__(self):
+        return len(self.entCells)
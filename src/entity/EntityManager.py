@@ -8,6 +8,15 @@ class EntityManager:
 
     def __init__(self):
         self.ents = []
+        # Indexes of self.ents, maintained by registerEntity() and
+        # removeEntity().
+        self.entsByTargetName = {}
+        self.entsByClassName = {}
+        # Wildcard name -> compiled regex.
+        self.patterns = {}
+        # Bumped whenever the set of entities changes.  Entity connections
+        # cache their resolved targets against this.
+        self.generation = 0
 
     def getEntityClass(self, classname):
         return EntityRegistry.get(classname)
@@ -18,31 +27,64 @@ class EntityManager:
             return None
         return entCls()
 
-    def findAllEntities(self, pattern):
-        ents = []
-        for e in self.ents:
-            if re.search(pattern, e.targetName):
-                ents.append(e)
-        return ents
+    def getPattern(self, name):
+        pattern = self.patterns.get(name)
+        if pattern is None:
+            # Convert wildcards to python regex wildcard.
+            pattern = re.compile(".*".join(re.escape(part) for part in name.split("*")))
+            self.patterns[name] = pattern
+        return pattern
+
+    def findAllEntities(self, name):
+        """
+        Returns a list of the entities with the given targetname.  A "*" in
+        the name matches any sequence of characters.
+        """
+        if "*" not in name:
+            return list(self.entsByTargetName.get(name, ()))
+
+        match = self.getPattern(name).fullmatch
+        return [e for e in self.ents if match(e.targetName)]
 
     def findExactEntity(self, name):
-        for e in self.ents:
-            if e.targetName == name:
-                return e
+        ents = self.entsByTargetName.get(name)
+        if ents:
+            return ents[0]
         return None
 
     def findAllEntitiesByClassName(self, className):
-        ents = []
-        for e in self.ents:
-            if e.className == className:
-                ents.append(e)
-        return ents
+        return list(self.entsByClassName.get(className, ()))
 
     def registerEntity(self, ent):
         assert ent not in self.ents
         #if ent.targetName:
         self.ents.append(ent)
+        self.entsByTargetName.setdefault(ent.targetName, []).append(ent)
+        self.entsByClassName.setdefault(ent.className, []).append(ent)
+        self.generation += 1
 
     def removeEntity(self, ent):
         if ent in self.ents:
             self.ents.remove(ent)
+            self.__removeFromIndex(self.entsByTargetName, ent.targetName, ent)
+            self.__removeFromIndex(self.entsByClassName, ent.className, ent)
+            self.generation += 1
+
+    @staticmethod
+    def __removeFromIndex(index, key, ent):
+        ents = index.get(key)
+        if ents is None:
+            return
+        if ent in ents:
+            ents.remove(ent)
+        if not ents:
+            del index[key]
+
+    def resolveConnections(self):
+        """
+        Resolves the targets of every entity's output connections up front.
+        Called once all the level entities have been created.
+        """
+        for e in self.ents:
+            if e.connMgr:
+                e.connMgr.resolveConnections()
@@ -0,0 +1,142 @@
+"""ThinkScheduler module: contains the ThinkScheduler class."""
+
+import heapq
+import time
+
+from panda3d.core import PStatCollector
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+thinkPColl = PStatCollector("App:Think")
+
+class ThinkContext:
+    """
+    One scheduled think function of an owner, usually an entity.  An owner
+    may have several contexts, each with its own next think time.
+    """
+
+    __slots__ = ('owner', 'func', 'name', 'nextThinkTick', 'statName')
+
+    def __init__(self, owner, func, name=''):
+        self.owner = owner
+        self.func = func
+        self.name = name
+        # -1 if not scheduled.
+        self.nextThinkTick = -1
+        self.statName = owner.__class__.__name__
+
+class ThinkScheduler:
+    """
+    Server-side think scheduler, in the style of Source's SetNextThink().
+    Instead of every entity running its own simulation task each tick,
+    think contexts are bucketed by the tick they next want to think on and
+    a single task dispatches each tick's bucket.  Entities that aren't
+    scheduled cost nothing.
+
+    Think functions are one-shot; a think that wants to run again must call
+    setNextThink() from within itself.  Thinks scheduled for the current
+    tick from inside a think run on the next tick.
+    """
+
+    notify = directNotify.newCategory("ThinkScheduler")
+
+    def __init__(self):
+        # Tick -> list of ThinkContexts.
+        self.buckets = {}
+        # Heap of ticks that have a bucket.
+        self.tickHeap = []
+        # The last tick that was dispatched.
+        self.lastTick = -1
+        # Owner class name -> [numThinks, totalSeconds].
+        self.classStats = {}
+        self.task = None
+
+    def start(self, sort=0):
+        if not self.task:
+            self.task = base.simTaskMgr.add(self.__thinkTask, 'entityThink', sort=sort)
+
+    def stop(self):
+        if self.task:
+            self.task.remove()
+            self.task = None
+
+    def setNextThink(self, ctx, thinkTime):
+        """
+        Schedules the context to think on the first tick at or after the
+        given simulation time.  A thinkTime of None or less than zero
+        unschedules it.
+        """
+        if thinkTime is None or thinkTime < 0:
+            ctx.nextThinkTick = -1
+            return
+
+        tick = max(self.lastTick + 1, base.timeToTicks(thinkTime))
+        if ctx.nextThinkTick == tick:
+            return
+        # Any entry in a previous bucket is now stale and gets skipped.
+        ctx.nextThinkTick = tick
+
+        bucket = self.buckets.get(tick)
+        if bucket is None:
+            bucket = []
+            self.buckets[tick] = bucket
+            heapq.heappush(self.tickHeap, tick)
+        bucket.append(ctx)
+
+    def getNextThinkTime(self, ctx):
+        if ctx.nextThinkTick < 0:
+            return -1
+        return base.ticksToTime(ctx.nextThinkTick)
+
+    def __thinkTask(self, task):
+        tick = base.tickCount
+        self.lastTick = tick
+
+        heap = self.tickHeap
+        if not heap or heap[0] > tick:
+            return task.cont
+
+        thinkPColl.start()
+        buckets = self.buckets
+        classStats = self.classStats
+        perfCounter = time.perf_counter
+        while heap and heap[0] <= tick:
+            bucketTick = heapq.heappop(heap)
+            for ctx in buckets.pop(bucketTick):
+                if ctx.nextThinkTick != bucketTick:
+                    # Rescheduled or cancelled since it was bucketed.
+                    continue
+                ctx.nextThinkTick = -1
+                start = perfCounter()
+                ctx.func()
+                elapsed = perfCounter() - start
+                stats = classStats.get(ctx.statName)
+                if stats is None:
+                    classStats[ctx.statName] = [1, elapsed]
+                else:
+                    stats[0] += 1
+                    stats[1] += elapsed
+        thinkPColl.stop()
+
+        return task.cont
+
+    def getStats(self):
+        """
+        Returns a list of (className, numThinks, totalMs, meanUs) tuples,
+        most total time first.
+        """
+        ret = [(name, count, total * 1000, (total / count) * 1e6)
+               for name, (count, total) in self.classStats.items()]
+        ret.sort(key=lambda x: x[2], reverse=True)
+        return ret
+
+    def resetStats(self):
+        self.classStats = {}
+
+    def getNumScheduled(self):
+        num = 0
+        for bucketTick, bucket in self.buckets.items():
+            for ctx in bucket:
+                if ctx.nextThinkTick == bucketTick:
+                    num += 1
+        return num
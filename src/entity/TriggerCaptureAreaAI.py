@@ -101,10 +101,14 @@ class TriggerCaptureAreaAI(DistributedTriggerAI):
         if defenders:
             base.game.sendUpdate('defendedPointEvent', [defenders[0].doId, self.capPoint.pointName])
 
-    def capUpdate(self, task):
+    def __capThink(self):
+        self.setNextThink(base.clockMgr.getTime())
+        self.capUpdate()
+
+    def capUpdate(self):
         if base.game.isRoundEnded():
             self.setCapProgress(0)
-            return task.cont
+            return
 
         self.setCapperCount(0)
 
@@ -119,7 +123,7 @@ class TriggerCaptureAreaAI(DistributedTriggerAI):
                 if self.capState != CapState.CSBlocked:
                     self.handleBlocked()
                 self.setCapState(CapState.CSBlocked)
-                return task.cont
+                return
 
         # If only one team is on the cap, and that team is allowed to
         # cap, increment progress towards capture.
@@ -173,8 +177,6 @@ class TriggerCaptureAreaAI(DistributedTriggerAI):
             else:
                 self.setCapProgress(0)
 
-        return task.cont
-
     def onEntityStartTouch(self, entity):
         if not entity.isDead() and entity.isPlayer() and not entity in self.playersOnCap:
             self.playersOnCap.append(entity)
@@ -208,7 +210,7 @@ class TriggerCaptureAreaAI(DistributedTriggerAI):
             self.capPoint = base.entMgr.findExactEntity(self.capPointName)
             assert self.capPoint
             self.capDoId = self.capPoint.doId
-        self.addTask(self.capUpdate, 'capUpdate', appendTask=True)
+        self.setNextThink(base.clockMgr.getTime(), self.__capThink)
 
     def setCapState(self, state):
         self.capState = state
@@ -0,0 +1,160 @@
+"""VisibilityCache module: contains the VisibilityCache class."""
+
+from tf.tfbase import CollisionGroups, TFFilters
+
+class VisibilityCache:
+    """
+    Server-side, per-tick cache of world line-of-sight between entities.
+    Bots, sentries and dispensers all ask whether the same pairs of
+    entities can see each other every tick, so the result of the world
+    trace from one entity's eye position to another's is remembered until
+    the end of the tick.  The trace is filtered relative to the looker and
+    reports the looker's first blocker, so each direction is cached on its
+    own.  Pairs whose clusters aren't in each other's PVS are rejected
+    without tracing at all.
+    """
+
+    def __init__(self):
+        self.tick = -1
+        self.lvlData = None
+        self.tree = None
+        # Cluster -> set of clusters in its PVS.
+        self.pvsSets = {}
+        # (looker, target) -> (visible, blockingEntity), per tick.
+        self.losCache = {}
+        # Entity -> cluster of its eye position, per tick.
+        self.entClusters = {}
+
+        self.hits = 0
+        self.traces = 0
+        self.pvsCulled = 0
+        # Stats of the last complete tick.
+        self.lastHits = 0
+        self.lastTraces = 0
+        self.lastPvsCulled = 0
+        # Since the last resetStats().
+        self.totalHits = 0
+        self.totalTraces = 0
+        self.totalPvsCulled = 0
+
+    def __checkTick(self):
+        tick = base.tickCount
+        if tick == self.tick:
+            return
+
+        self.tick = tick
+        self.losCache = {}
+        self.entClusters = {}
+        self.lastHits = self.hits
+        self.lastTraces = self.traces
+        self.lastPvsCulled = self.pvsCulled
+        self.totalHits += self.hits
+        self.totalTraces += self.traces
+        self.totalPvsCulled += self.pvsCulled
+        self.hits = 0
+        self.traces = 0
+        self.pvsCulled = 0
+
+        lvlData = base.game.lvlData
+        if lvlData is not self.lvlData:
+            # Level changed.
+            self.lvlData = lvlData
+            self.tree = lvlData.getAreaClusterTree() if lvlData else None
+            self.pvsSets = {}
+
+    def getCluster(self, pos):
+        self.__checkTick()
+        if not self.tree:
+            return -1
+        return self.tree.getLeafValueFromPoint(pos)
+
+    def getEntityCluster(self, ent):
+        self.__checkTick()
+        cluster = self.entClusters.get(ent)
+        if cluster is None:
+            cluster = self.getCluster(ent.getEyePosition())
+            self.entClusters[ent] = cluster
+        return cluster
+
+    def isClusterVisible(self, fromCluster, toCluster):
+        """
+        Returns False if toCluster is definitely not visible from
+        fromCluster according to the level's PVS.
+        """
+        if fromCluster < 0 or toCluster < 0 or fromCluster == toCluster:
+            # Outside the map or same cluster, can't rule it out.
+            return True
+        pvs = self.pvsSets.get(fromCluster)
+        if pvs is None:
+            data = self.lvlData.getClusterPvs(fromCluster)
+            pvs = set(data.getVisibleCluster(i) for i in range(data.getNumVisibleClusters()))
+            self.pvsSets[fromCluster] = pvs
+        return toCluster in pvs
+
+    def isPointPotentiallyVisible(self, fromPos, toPos):
+        """
+        PVS-only test between two points.  If this returns False, a world
+        trace between the points would be blocked.
+        """
+        if not self.isClusterVisible(self.getCluster(fromPos), self.getCluster(toPos)):
+            self.pvsCulled += 1
+            return False
+        return True
+
+    def isEntityPotentiallyVisible(self, looker, target):
+        if not self.isClusterVisible(self.getEntityCluster(looker), self.getEntityCluster(target)):
+            self.pvsCulled += 1
+            return False
+        return True
+
+    def getCachedEntityVisibility(self, looker, target):
+        """
+        Returns the cached (visible, blockingEntity) world line-of-sight
+        result from looker to target this tick, or None.
+        """
+        self.__checkTick()
+        return self.losCache.get((looker, target))
+
+    def isEntityVisible(self, looker, target):
+        """
+        Returns (visible, blockingEntity) for the world line-of-sight from
+        the looker's eye position to the target's, tracing at most once per
+        looker and target per tick.
+        """
+        self.__checkTick()
+        key = (looker, target)
+        result = self.losCache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        if not self.isEntityPotentiallyVisible(looker, target):
+            result = (False, getattr(base, 'world', None))
+        else:
+            self.traces += 1
+            tr = TFFilters.traceLine(looker.getEyePosition(), target.getEyePosition(),
+                                     CollisionGroups.World, TFFilters.TFQueryFilter(looker))
+            if tr.hit and tr.ent != target:
+                result = (False, tr.ent)
+            else:
+                result = (True, tr.ent if tr.hit else None)
+
+        self.losCache[key] = result
+        return result
+
+    def getStats(self):
+        """
+        Returns (hits, traces, pvsCulled) of the last complete tick.
+        """
+        return (self.lastHits, self.lastTraces, self.lastPvsCulled)
+
+    def getTotalStats(self):
+        """
+        Returns (hits, traces, pvsCulled) since the last resetStats().
+        """
+        return (self.totalHits, self.totalTraces, self.totalPvsCulled)
+
+    def resetStats(self):
+        self.totalHits = 0
+        self.totalTraces = 0
+        self.totalPvsCulled = 0
@@ -56,6 +56,15 @@ class World(DistributedSolidEntity):
                 decalRoot = self.modelNp
             self.projectDecal(decalName, position, normal, roll, decalRoot)
 
+    def getFilterActors(self):
+        actors = DistributedSolidEntity.getFilterActors(self)
+        if self.worldCollisions:
+            actors += self.worldCollisions
+        if base.game and base.game.propPhysRoot:
+            for np in base.game.propPhysRoot.findAllMatches("**/+PhysRigidActorNode"):
+                actors.append(np.node())
+        return actors
+
     def initWorldCollisions(self):
         collideTypeToMask = {
             "": CollisionGroups.World,
@@ -90,6 +99,8 @@ class World(DistributedSolidEntity):
             self.attachNewNode(body)
             self.worldCollisions.append(body)
 
+        self.updateFilterData()
+
     def generate(self):
         DistributedSolidEntity.generate(self)
         base.world = self
@@ -109,6 +120,7 @@ class World(DistributedSolidEntity):
         for np in base.game.propPhysRoot.findAllMatches("**/+PhysRigidActorNode"):
             np.setPythonTag("entity", self)
             np.setPythonTag("object", self)
+        self.updateFilterData()
 
     def __updateDecalVis(self, task):
         if not self.decalVisRoot:
@@ -150,6 +162,7 @@ class World(DistributedSolidEntity):
         self.decalVisRootNp.removeNode()
         self.decalVisRootNp = None
         self.decalVisRoot = None
+        self.clearFilterData()
         for body in self.worldCollisions:
             body.removeFromScene(base.physicsWorld)
         self.worldCollisions = None
@@ -47,6 +47,10 @@ class GameMovement:
         self.right = Vec3(0)
         self.dt = 0.0
         self.viewAngleQuat = Quat()
+        # Reused trace results for the hull traces.  hullTrace may be handed
+        # back to the caller, scratchTrace is only inspected immediately.
+        self.hullTrace = TFFilters.TraceResult()
+        self.scratchTrace = TFFilters.TraceResult()
 
     def getMovementFilter(self):
         return TFFilters.TFQueryFilter(self.player, (TFFilters.ignoreTeammateBuildings_nonBuilder,))
@@ -209,14 +213,14 @@ class GameMovement:
     def canUnDuckJump(self):
         end = Vec3(self.mv.origin)
         end.z -= 36.0
-        tr = self.tracePlayerHull(self.mv.origin, end)
+        tr = self.tracePlayerHull(self.mv.origin, end, self.hullTrace)
         if tr['frac'] < 1.0:
             end.z = mv.origin.z + (-36.0 * tr['frac'])
 
             # Test a normal hull.
             wasDucked = self.player.ducked
             self.player.ducked = False
-            trUp = self.tracePlayerHull(end, end)
+            trUp = self.tracePlayerHull(end, end, self.scratchTrace)
             self.player.ducked = wasDucked
             if not tr['startsolid']:
                 return (True, tr)
@@ -270,7 +274,7 @@ class GameMovement:
 
         wasDucked = self.player.ducked
         self.player.ducked = True
-        tr = self.tracePlayerHull(newOrigin, newOrigin)
+        tr = self.tracePlayerHull(newOrigin, newOrigin, self.scratchTrace)
         self.player.ducked = wasDucked
         if tr['startsolid'] or tr['frac'] != 1.0:
             return False
@@ -441,17 +445,21 @@ class GameMovement:
     def getPlayerHullMaxs(self, ducked):
         return Vec3(VEC_DUCK_HULL_MAX) if ducked else Vec3(VEC_HULL_MAX)
 
-    def tracePlayerHull(self, start, end):
+    def tracePlayerHull(self, start, end, tr=None):
         mins = self.getPlayerHullMins(self.player.ducked)
         maxs = self.getPlayerHullMaxs(self.player.ducked)
-        tr = TFFilters.traceBox(start, end, mins, maxs, self.playerCollideMask, self.movementFilter)
+        tr = TFFilters.traceBox(start, end, mins, maxs, self.playerCollideMask, self.movementFilter, tr=tr)
         return tr
 
     def testPlayerPosition(self, pos):
+        """
+        Returns the trace result if the player hull is stuck at the given
+        position, or None.  The result is overwritten by the next call.
+        """
         tr = TFFilters.traceBox(pos, pos, self.getPlayerHullMins(self.player.ducked), self.getPlayerHullMaxs(self.player.ducked),
-                                self.playerCollideMask, self.movementFilter)
-        if tr['hit'] and tr['ent']:
-            if tr['actor'].getFromCollideMask() & self.playerCollideMask:
+                                self.playerCollideMask, self.movementFilter, tr=self.scratchTrace)
+        if tr.hit and tr.ent:
+            if tr.actor.getFromCollideMask() & self.playerCollideMask:
                 return tr
 
         return None
@@ -343,6 +343,7 @@ class BaseObject(BaseClass):
             base.game.objectsByTeam[self.team].append(self)
             self.setSkin(TFGlobals.getTeamSkin(bldr.team))
             self.setCollideMasks()
+            self.updateFilterData()
 
         #def getRepairRate(self):
             # TODO
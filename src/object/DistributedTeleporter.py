@@ -417,7 +417,7 @@ class DistributedTeleporter(BaseObject):
             system.addFunction(LinearMotionParticleFunction())
             system.addFunction(AngularMotionParticleFunction())
             system.start(base.dynRender)
-            Sequence(Wait(0.55), Func(system.softStop)).start()
+            base.softStopParticleSystem(system, 0.55)
 
         def announceGenerate(self):
             BaseObject.announceGenerate(self)
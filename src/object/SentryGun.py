@@ -331,7 +331,7 @@ class SentryGun(BaseObject):
                 self.nextRocketAttack = base.clockMgr.getTime() + 0.5
 
         def attack(self):
-            self.character.update()
+            self.updateAnimation()
 
             if not self.findTarget():
                 # Lost target.
@@ -488,8 +488,20 @@ class SentryGun(BaseObject):
 
             opposingTeam = TFGlobals.getEnemyTeam(self.team)
 
+            # Only consider targets near the sentry, but we still need the
+            # old target's distance even if it left the range.
+            if oldTarget and not oldTarget.isDODeleted() and oldTarget.team == opposingTeam \
+                and not (oldTarget.isPlayer() and oldTarget.isDead()):
+                oldTargetDist2 = (oldTarget.getPos() + oldTarget.viewOffset - sentryOrigin).lengthSquared()
+
+            # The grid tests entity origins, pad the range by the view offset.
+            nearby = base.entGrid.queryRadius(sentryOrigin, 1100 + 100, team=opposingTeam)
+
             # Try to attack players first, then objects.
-            for player in base.game.playersByTeam[opposingTeam]:
+            for player in nearby:
+                if not player.isPlayer():
+                    continue
+
                 if player.isDead():
                     continue
 
@@ -498,10 +510,6 @@ class SentryGun(BaseObject):
                 segment = targetCenter - sentryOrigin
                 dist2 = segment.lengthSquared()
 
-                # Store the current target distance if we come across it.
-                if player == oldTarget:
-                    oldTargetDist2 = dist2
-
                 # Check to see if the target is closer than the already validated target.
                 if dist2 > minDist2:
                     continue
@@ -513,15 +521,14 @@ class SentryGun(BaseObject):
 
             # If we already have a target, don't check objects.
             if currentTarget is None:
-                for obj in base.game.objectsByTeam[opposingTeam]:
+                for obj in nearby:
+                    if not obj.isObject():
+                        continue
+
                     targetCenter = obj.getEyePosition()
                     segment = targetCenter - sentryOrigin
                     dist2 = segment.lengthSquared()
 
-                    # Store the current target distance if we come across it.
-                    if obj == oldTarget:
-                        oldTargetDist2 = dist2
-
                     # Check to see if the target is closer than the already validated target.
                     if dist2 > minDist2:
                         continue
@@ -551,7 +558,7 @@ class SentryGun(BaseObject):
                 self.firingState = SG_FS_NOT_FIRING
 
             # Animate
-            self.character.update()
+            self.updateAnimation()
 
             # Look for a target
             if self.findTarget():
@@ -112,6 +112,12 @@ class DistributedTFPlayer(DistributedChar, DistributedTFPlayerShared):
     def getWorldSpaceCenter(self):
         return DistributedTFPlayerShared.getWorldSpaceCenter(self)
 
+    def getFilterActors(self):
+        actors = DistributedChar.getFilterActors(self)
+        if self.controller:
+            actors.append(self.controller.getActorNode())
+        return actors
+
     def getNumHealers(self):
         return len(self.healerDoIds)
 
@@ -226,10 +232,10 @@ class DistributedTFPlayer(DistributedChar, DistributedTFPlayerShared):
         emitNode = base.render.attachNewNode("emitBloodGoop")
         emitNode.setPos(pos)
 
-        effect = TFEffects.getBloodGoopEffect()
+        effect = TFEffects.acquireEffect("blood_goop")
         effect.setInput(0, emitNode, True)
         effect.start(base.dynRender)
-        Sequence(Wait(0.1), Func(effect.softStop)).start()
+        base.softStopParticleSystem(effect, 0.1, "blood_goop")
 
     def createOverhealedEffect(self):
         system = TFEffects.getOverhealedEffect(self.team)
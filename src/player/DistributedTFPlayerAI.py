@@ -154,6 +154,12 @@ class DistributedTFPlayerAI(DistributedCharAI, DistributedTFPlayerShared):
     def getWorldSpaceCenter(self):
         return DistributedTFPlayerShared.getWorldSpaceCenter(self)
 
+    def getFilterActors(self):
+        actors = DistributedCharAI.getFilterActors(self)
+        if self.controller:
+            actors.append(self.controller.getActorNode())
+        return actors
+
     def SendProxy_healerDoIds(self):
         # FIXME: probably slow
         if not self.healers:
@@ -361,7 +367,9 @@ class DistributedTFPlayerAI(DistributedCharAI, DistributedTFPlayerShared):
     def onDamagedOther(self, other, dmg):
         self.sendUpdate('onDamagedOther', [dmg, other.getPos() + other.viewOffset + (0, 0, 8)])
 
-    def __conditionThinkAI(self, task):
+    def __conditionThinkAI(self):
+        self.setNextThink(base.clockMgr.getTime(), context='conditionThink')
+
         for cond, timeLeft in self.conditions.items():
             if timeLeft != -1:
                 reduction = base.clockMgr.getDeltaTime()
@@ -455,8 +463,6 @@ class DistributedTFPlayerAI(DistributedCharAI, DistributedTFPlayerShared):
                 if self.nextBurningSound < base.clockMgr.getTime():
                     self.nextBurningSound = base.clockMgr.getTime() + 2.5
 
-        return task.cont
-
     def setPos(self, *args, **kwargs):
         DistributedCharAI.setPos(self, *args, **kwargs)
         if self.controller:
@@ -1462,7 +1468,7 @@ class DistributedTFPlayerAI(DistributedCharAI, DistributedTFPlayerShared):
         base.game.allPlayers[self.doId] = self
 
         # Start condition update logic.
-        self.addTask(self.__conditionThinkAI, 'TFPlayerConditionThinkAI', appendTask=True, sim=True)
+        self.setNextThink(base.clockMgr.getTime(), self.__conditionThinkAI, 'conditionThink')
 
         # Player simulation task.
         self.addTask(self.__simulateTask, 'TFPlayerSimulateAI', appendTask=True, sim=True)
@@ -29,7 +29,7 @@ from tf.tfgui.VoiceCommandMenu import VoiceCommandMenu
 from .DistributedTFPlayer import DistributedTFPlayer
 from .InputButtons import InputFlag
 from .ObserverMode import ObserverMode
-from .PlayerCommand import PlayerCommand
+from .PlayerCommand import PlayerCommand, makeRandomSeed
 from .ScreenShake import ScreenShake
 from .TFClass import *
 from .TFPlayerState import TFPlayerState
@@ -1310,8 +1310,7 @@ class DistributedTFPlayerOV(DistributedTFPlayer):
         cmd = self.getNextCommand()
         cmd.clear()
         cmd.commandNumber = self.getNextCommandNumber()
-        rand = random.Random(cmd.commandNumber)
-        cmd.randomSeed = rand.randint(0, 0xFFFFFFFF)
+        cmd.randomSeed = makeRandomSeed(cmd.commandNumber)
         cmd.tickCount = base.tickCount
 
         fastWpnSwitch = base.config.GetBool('tf-fast-weapon-switch', 0)
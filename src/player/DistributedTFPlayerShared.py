@@ -460,7 +460,14 @@ class DistributedTFPlayerShared:
         start = info['src']
         end = start + info['dirShooting'] * info['distance']
         tr = TFFilters.traceLine(start, end, CollisionGroups.Mask_BulletCollide, TFFilters.TFQueryFilter(self))
+        self.onBulletTrace(info, tr, doEffects, damageType, customDamageType)
 
+    def onBulletTrace(self, info, tr, doEffects, damageType, customDamageType):
+        """
+        Handles the result of tracing a bullet fired by this player:
+        tracers, impact effects, and on the server, damage.  Split from
+        fireBullet() so FireBullets can trace all pellets in one batch.
+        """
         impactVol = 1.0 / info['shots']
 
         if tr['hit']:
@@ -567,6 +574,7 @@ class DistributedTFPlayerShared:
         self.controller.setFootPosition(self.getPos())
         self.controller.getActorNode().setPythonTag("entity", self)
         self.controller.getActorNode().setPythonTag("object", self)
+        TFFilters.setActorFilterData(self.controller.getActorNode(), self)
 
     def applyControllerMasks(self):
         if self.team == TFGlobals.TFTeam.Red:
@@ -590,6 +598,7 @@ class DistributedTFPlayerShared:
             if actor:
                 actor.clearPythonTag("entity")
                 actor.clearPythonTag("object")
+                TFFilters.clearActorFilterData(actor)
             self.controller.destroy()
             self.controller = None
 
@@ -1,72 +1,167 @@
 """LagCompensation module: contains the LagCompensation class."""
 
+import numpy
 from panda3d.core import *
 
 from direct.directnotify.DirectNotifyGlobal import directNotify
 from direct.showbase.DirectObject import DirectObject
+from tf.tfbase.TFGlobals import (HITBOX_PADDING, VEC_HULL_MAX, VEC_HULL_MIN,
+                                 sphereIntersectsCone)
 
 maxUnlag = 1.0
 
+# Bounding sphere of the player hull, padded because hit boxes can stick out
+# of it.  Used when testing a player's swept bounds against a shot.
+hullCenter = (VEC_HULL_MIN + VEC_HULL_MAX) * 0.5
+hullRadius = (VEC_HULL_MAX - VEC_HULL_MIN).length() * 0.5 + HITBOX_PADDING
+
 #tf_server_lag_comp_debug = ConfigVariableBool("tf-server-lag-comp-debug", False)
 
 class PlayerSample:
-    pass
+    __slots__ = ('pos', 'hpr', 'eyeH', 'eyeP')
 
 class PlayerRecord:
 
-    def __init__(self, doId):
+    def __init__(self, doId, row):
         self.doId = doId
-        self.track = []
+        # Row of this player in the history arrays.
+        self.row = row
         self.needsRestore = False
         self.restore = PlayerSample()
         self.change = PlayerSample()
 
 class LagCompensation(DirectObject):
+    """
+    Keeps the recent positions of every player so a shot can be checked
+    against where the shooter saw them.
+
+    Every player is recorded on the same tick, so the history is one ring
+    buffer of ticks shared by everybody: a single time column, plus NumPy
+    arrays indexed [slot, row], where each registered player owns a row.
+    Backtracking finds the target sample once and then interpolates, checks
+    and sweeps every player at the same time.
+    """
+
     notify = directNotify.newCategory("LagCompensationAI")
     #notify.setDebug(True)
 
     def __init__(self):
         #self.notify.setDebug(True)
         self.playerRecords = {}
+        # One sample is recorded per tick, so this holds maxUnlag seconds
+        # worth of history with a bit of slack.
+        self.capacity = base.timeToTicks(maxUnlag) + 2
+        # Slot of the most recent sample.
+        self.head = -1
+        self.numSamples = 0
+        self.freeRows = []
+        self.numRows = 0
+        self.allocHistory(32)
 
     def cleanup(self):
         self.playerRecords = None
+        self.time = None
+        self.pos = None
+        self.hpr = None
+        self.eye = None
+        self.alive = None
+
+    def allocHistory(self, numRows):
+        """
+        Allocates history arrays with room for numRows players, keeping the
+        rows recorded so far.
+        """
+        cap = self.capacity
+        time = numpy.zeros(cap)
+        pos = numpy.zeros((cap, numRows, 3))
+        hpr = numpy.zeros((cap, numRows, 3))
+        # [..., 0] is eyeH, [..., 1] is eyeP.
+        eye = numpy.zeros((cap, numRows, 2))
+        alive = numpy.zeros((cap, numRows), dtype=bool)
+        if self.numRows:
+            n = self.numRows
+            time[:] = self.time
+            pos[:, :n] = self.pos
+            hpr[:, :n] = self.hpr
+            eye[:, :n] = self.eye
+            alive[:, :n] = self.alive
+        self.freeRows += range(numRows - 1, self.numRows - 1, -1)
+        self.numRows = numRows
+        self.time = time
+        self.pos = pos
+        self.hpr = hpr
+        self.eye = eye
+        self.alive = alive
 
     def registerPlayer(self, plyr):
-        self.playerRecords[plyr.doId] = PlayerRecord(plyr.doId)
+        self.unregisterPlayer(plyr)
+        if not self.freeRows:
+            self.allocHistory(self.numRows * 2)
+        row = self.freeRows.pop()
+        # Don't inherit the history of the row's previous owner.
+        self.alive[:, row] = False
+        self.playerRecords[plyr.doId] = PlayerRecord(plyr.doId, row)
 
     def unregisterPlayer(self, plyr):
-        if plyr.doId in self.playerRecords:
-            del self.playerRecords[plyr.doId]
+        record = self.playerRecords.pop(plyr.doId, None)
+        if record:
+            self.freeRows.append(record.row)
 
     def recordPlayerPositions(self):
-        minTime = base.clockMgr.getTime() - maxUnlag
+        now = base.clockMgr.getTime()
+        minTime = now - maxUnlag
 
-        #self.notify.debug("Recording player positions at time " + str(base.clockMgr.getTime()) + ", min time " + str(minTime))
+        #self.notify.debug("Recording player positions at time " + str(now) + ", min time " + str(minTime))
 
-        for doId, record in self.playerRecords.items():
-            record.track = [x for x in record.track if x.simulationTime >= minTime]
-            track = record.track
+        cap = self.capacity
+        time = self.time
+        # Drop samples recorded before minTime.
+        while self.numSamples and time[(self.head - self.numSamples + 1) % cap] < minTime:
+            self.numSamples -= 1
 
-            if track and track[0].simulationTime >= base.clockMgr.getTime():
-                continue
+        if self.numSamples and time[self.head] >= now:
+            return
 
-            plyr = base.air.doId2do.get(doId)
+        rows = []
+        pos = []
+        hpr = []
+        eye = []
+        alive = []
+        doId2do = base.air.doId2do
+        for doId, record in self.playerRecords.items():
+            plyr = doId2do.get(doId)
             if not plyr:
                 continue
 
             #self.notify.debug("Record plyr " + str(plyr.doId) + " at pos " + str(plyr.getPos()) + ", hpr " + str(plyr.getHpr()) + ", alive " + str(not plyr.isDead()))
 
-            sample = PlayerSample()
-            sample.alive = not plyr.isDead()
-            sample.simulationTime = base.clockMgr.getTime()
-            sample.pos = plyr.getPos()
-            sample.hpr = plyr.getHpr()
-            sample.eyeH = plyr.eyeH
-            sample.eyeP = plyr.eyeP
-            track.insert(0, sample)
+            rows.append(record.row)
+            pos.append(tuple(plyr.getPos()))
+            hpr.append(tuple(plyr.getHpr()))
+            eye.append((plyr.eyeH, plyr.eyeP))
+            alive.append(not plyr.isDead())
+
+        head = (self.head + 1) % cap
+        self.head = head
+        if self.numSamples < cap:
+            self.numSamples += 1
+        time[head] = now
+        # Players that weren't recorded this tick count as dead in it.
+        self.alive[head] = False
+        if rows:
+            self.pos[head, rows] = pos
+            self.hpr[head, rows] = hpr
+            self.eye[head, rows] = eye
+            self.alive[head, rows] = alive
+
+    def startLagCompensation(self, plyr, cmd, rayOrigin=None, rayDir=None, rayDistance=0.0, raySpread=0.0, rayRadius=0.0):
+        """
+        Moves every other player back to where plyr saw them when the
+        command was issued.  If a ray is given, only players whose movement
+        since then overlaps the ray, widened by rayRadius units plus
+        raySpread units per unit of distance, are moved.
+        """
 
-    def startLagCompensation(self, plyr, cmd):
         correct = 0.0
         # Half RTT in seconds.
         correct += plyr.owner.averageRtt * 0.0005
@@ -94,15 +189,16 @@ class LagCompensation(DirectObject):
 
         #positions = []
 
-        for doId, record in self.playerRecords.items():
-            if doId == plyr.doId:
-                continue
+        cull = rayOrigin is not None
 
-            otherPlyr = base.air.doId2do.get(doId)
-            if not otherPlyr:
+        # Compute the target pose of every other player in one pass over
+        # the history, then only move the players that could actually be
+        # hit by the shot.
+        for record, otherPlyr, pose in self.computeBacktrackPoses(plyr.doId, targetTime, cull):
+            if cull and not self.poseIntersectsCone(otherPlyr, pose, rayOrigin, rayDir, rayDistance, raySpread, rayRadius):
                 continue
 
-            self.backtrackPlayer(otherPlyr, record, targetTime)
+            self.applyBacktrackPose(otherPlyr, record, pose)
 
             #if doLagCompDebug:
             #    positions.append(otherPlyr.getPos())
@@ -110,6 +206,107 @@ class LagCompensation(DirectObject):
         #if doLagCompDebug:
         #    plyr.sendUpdate('lagCompDebug', [positions])
 
+    def findSample(self, targetTime):
+        """
+        Returns (slots, i, frac) for targetTime, or None if nothing has been
+        recorded.  slots lists the buffer slots of the samples from newest
+        to oldest, i is the index in slots of the most recent sample
+        recorded at or before targetTime (or of the oldest sample if every
+        sample is newer), and frac is how far to interpolate from that
+        sample towards the next newer one.
+        """
+
+        n = self.numSamples
+        if not n:
+            return None
+
+        slots = (self.head - numpy.arange(n)) % self.capacity
+        times = self.time[slots]
+        # Times are descending, so search the negated column.
+        i = min(int(numpy.searchsorted(-times, -targetTime)), n - 1)
+
+        sampleTime = times[i]
+        if i > 0 and sampleTime < targetTime and sampleTime < times[i - 1]:
+            prevTime = times[i - 1]
+            assert targetTime < prevTime
+
+            frac = (targetTime - sampleTime) / (prevTime - sampleTime)
+            assert frac > 0 and frac < 1
+        else:
+            frac = 0.0
+
+        return (slots, i, float(frac))
+
+    def computeBacktrackPoses(self, excludeId, targetTime, wantSweep=False):
+        """
+        Computes the interpolated pose at targetTime for every recorded
+        player except excludeId.  Returns a list of (record, player, pose)
+        tuples, where pose is the tuple returned by computeBacktrackPose().
+        """
+
+        sample = self.findSample(targetTime)
+        if not sample:
+            return []
+        slots, i, frac = sample
+        slot = slots[i]
+        passed = slots[:i + 1]
+
+        # Only players that were alive for the whole stretch get moved.
+        alive = self.alive[passed].all(axis=0).tolist()
+        if frac:
+            prevSlot = slots[i - 1]
+            pos = self.pos[slot] + (self.pos[prevSlot] - self.pos[slot]) * frac
+            hpr = self.hpr[slot] + (self.hpr[prevSlot] - self.hpr[slot]) * frac
+            eye = self.eye[slot] + (self.eye[prevSlot] - self.eye[slot]) * frac
+        else:
+            pos = self.pos[slot]
+            hpr = self.hpr[slot]
+            eye = self.eye[slot]
+        pos = pos.tolist()
+        hpr = hpr.tolist()
+        eye = eye.tolist()
+        if wantSweep:
+            swept = self.pos[passed]
+            mins = swept.min(axis=0).tolist()
+            maxs = swept.max(axis=0).tolist()
+
+        poses = []
+        doId2do = base.air.doId2do
+        for doId, record in self.playerRecords.items():
+            if doId == excludeId:
+                continue
+
+            row = record.row
+            if not alive[row]:
+                continue
+
+            otherPlyr = doId2do.get(doId)
+            if not otherPlyr:
+                continue
+
+            if wantSweep:
+                sweep = (mins[row], maxs[row])
+            else:
+                sweep = None
+
+            eyeH, eyeP = eye[row]
+            poses.append((record, otherPlyr, (Point3(*pos[row]), Vec3(*hpr[row]), eyeH, eyeP, i, sweep)))
+        return poses
+
+    def poseIntersectsCone(self, plyr, pose, origin, direction, distance, spread, coneRadius=0.0):
+        """
+        Returns True if the player's swept bounds, from their current
+        position back to the backtracked pose, intersect the given ray or
+        cone.
+        """
+        mins, maxs = pose[5]
+        curPos = plyr.getPos()
+        mins = Point3(min(mins[0], curPos[0]), min(mins[1], curPos[1]), min(mins[2], curPos[2]))
+        maxs = Point3(max(maxs[0], curPos[0]), max(maxs[1], curPos[1]), max(maxs[2], curPos[2]))
+        center = (mins + maxs) * 0.5 + hullCenter
+        radius = (maxs - mins).length() * 0.5 + hullRadius
+        return sphereIntersectsCone(center, radius, origin, direction, distance, spread, coneRadius)
+
     def finishLagCompensation(self, plyr):
         for doId, record in self.playerRecords.items():
 
@@ -149,64 +346,63 @@ class LagCompensation(DirectObject):
             record.needsRestore = False
 
     def backtrackPlayer(self, plyr, record, targetTime):
-        track = record.track
-
-        if not track:
-            return
-
-        curPos = plyr.getPos()
-        curHpr = plyr.getHpr()
-        curEyeH = plyr.eyeH
-        curEyeP = plyr.eyeP
-
-        prevPos = Point3(plyr.getPos())
-        prevSample = None
-        sample = None
-
-        for i in range(len(track)):
-            prevSample = sample
-            sample = track[i]
-
-            if not sample.alive:
-                return
-
-            delta = sample.pos - prevPos
-            #if delta.lengthSquared() > 128.0:
-            #    return
-
-            if sample.simulationTime <= targetTime:
-                break
-
-            prevPos = Point3(sample.pos)
-
-        assert sample
+        pose = self.computeBacktrackPose(record, targetTime)
+        if pose is not None:
+            self.applyBacktrackPose(plyr, record, pose)
+
+    def computeBacktrackPose(self, record, targetTime, wantSweep=False):
+        """
+        Returns (pos, hpr, eyeH, eyeP, sampleIndex, sweep) for the player at
+        targetTime, or None if the player should not be backtracked.  If
+        wantSweep is True, sweep is the (mins, maxs) of the samples that were
+        passed over, otherwise it is None.
+        """
+
+        sample = self.findSample(targetTime)
+        if not sample:
+            return None
+        slots, i, frac = sample
+        row = record.row
+        passed = slots[:i + 1]
+
+        if not self.alive[passed, row].all():
+            return None
+
+        slot = slots[i]
+        p = self.pos[slot, row]
+        hpr = self.hpr[slot, row]
+        eye = self.eye[slot, row]
+        if frac:
+            prevSlot = slots[i - 1]
+            p = p + (self.pos[prevSlot, row] - p) * frac
+            hpr = hpr + (self.hpr[prevSlot, row] - hpr) * frac
+            eye = eye + (self.eye[prevSlot, row] - eye) * frac
+        eyeH, eyeP = eye.tolist()
+
+        if wantSweep:
+            swept = self.pos[passed, row]
+            sweep = (swept.min(axis=0).tolist(), swept.max(axis=0).tolist())
+        else:
+            sweep = None
 
-        p = Point3()
-        hpr = Vec3()
+        return (Point3(*p.tolist()), Vec3(*hpr.tolist()), eyeH, eyeP, i, sweep)
 
-        frac = 0.0
-        if prevSample and (sample.simulationTime < targetTime) and (sample.simulationTime < prevSample.simulationTime):
-            assert prevSample.simulationTime > sample.simulationTime
-            assert targetTime < prevSample.simulationTime
+    def applyBacktrackPose(self, plyr, record, pose):
+        """
+        Moves the player to a pose computed by computeBacktrackPose(),
+        remembering where to restore them to.
+        """
 
-            frac = (targetTime - sample.simulationTime) / (prevSample.simulationTime - sample.simulationTime)
-            assert frac > 0 and frac < 1
+        p, hpr, eyeH, eyeP = pose[:4]
 
-            p = sample.pos + (prevSample.pos - sample.pos) * frac
-            hpr = sample.hpr + (prevSample.hpr - sample.hpr) * frac
-            eyeP = sample.eyeP + (prevSample.eyeP - sample.eyeP) * frac
-            eyeH = sample.eyeH + (prevSample.eyeH - sample.eyeH) * frac
-        else:
-            p = sample.pos
-            hpr = sample.hpr
-            eyeP = sample.eyeP
-            eyeH = sample.eyeH
+        curPos = plyr.getPos()
+        curHpr = plyr.getHpr()
 
         assert self.notify.debug("for plyr " + str(plyr.doId) + ", p " + str(p) + ", hpr " + str(hpr))
         assert self.notify.debug("cur server pos " + str(curPos) + ", hpr " + str(curHpr))
 
-        pdiff = plyr.getPos() - p
-        hdiff = plyr.getHpr() - hpr
+        pdiff = curPos - p
+        hdiff = curHpr - hpr
         eyeHDiff = plyr.eyeH - eyeH
         eyePDiff = plyr.eyeP - eyeP
 
@@ -216,8 +412,8 @@ class LagCompensation(DirectObject):
         change.eyeH = eyeH
         change.eyeP = eyeP
         restore = record.restore
-        restore.hpr = plyr.getHpr()
-        restore.pos = plyr.getPos()
+        restore.hpr = curHpr
+        restore.pos = curPos
         restore.eyeH = plyr.eyeH
         restore.eyeP = plyr.eyeP
 
@@ -5,15 +5,52 @@ This class contains the inputs of a player for a particular server tick.  The
 server runs the commands and the client predicts his own commands.
 """
 
-import random
+import struct
 
 from panda3d.core import Vec2, Vec3
 
 from .InputButtons import InputFlag
 
+# Bits of the changed-fields mask that prefixes each command on the wire.
+# Fields are packed in bit order after the mask.
+CF_COMMAND_NUMBER = 1 << 0
+CF_TICK_COUNT = 1 << 1
+CF_VIEW_ANGLES = 1 << 2
+CF_MOVE = 1 << 3
+CF_BUTTONS = 1 << 4
+CF_WEAPON_SELECT = 1 << 5
+CF_MOUSE_DELTA = 1 << 6
+CF_COUNT = 7
+
+FieldFormats = ('I', 'I', '3f', '3f', 'I', 'b', '2f')
+
+# Precompiled packer for the fields present in each possible mask, so a
+# command decodes with a single unpack() call.
+FieldPackers = []
+for mask in range(1 << CF_COUNT):
+    FieldPackers.append(struct.Struct('<' + ''.join(
+        FieldFormats[i] for i in range(CF_COUNT) if mask & (1 << i))))
+del mask
+
+def makeRandomSeed(commandNumber):
+    """
+    Returns the prediction random seed for the given command number.  This
+    is the MurmurHash3 32-bit finalizer, which spreads sequential command
+    numbers over the full 32-bit range.
+    """
+    h = commandNumber & 0xFFFFFFFF
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    h ^= h >> 16
+    return h
 
 class PlayerCommand:
 
+    __slots__ = ('buttons', 'viewAngles', 'mouseDelta', 'move', 'weaponSelect',
+                 'hasBeenPredicted', 'tickCount', 'commandNumber', 'randomSeed')
+
     def __init__(self, init=True):
         if init:
             self.clear()
@@ -52,82 +89,110 @@ class PlayerCommand:
 
     @staticmethod
     def readDatagram(dgi, prev):
-        # Assume no change.
-        cmd = prev.makeCopy()
-
-        if dgi.getUint8():
-            cmd.commandNumber = dgi.getUint32()
+        """
+        Reads a command delta-encoded against prev.  Unchanged vector fields
+        share prev's vector objects rather than copying them, so decoded
+        commands must be treated as read-only.
+        """
+        cmd = PlayerCommand(False)
+        cmd.hasBeenPredicted = False
+
+        mask = dgi.getUint8()
+        if not mask:
+            # Nothing changed, assume steady increment.
+            cmd.commandNumber = prev.commandNumber + 1
+            cmd.tickCount = prev.tickCount + 1
+            cmd.viewAngles = prev.viewAngles
+            cmd.move = prev.move
+            cmd.buttons = prev.buttons
+            cmd.weaponSelect = prev.weaponSelect
+            cmd.mouseDelta = prev.mouseDelta
+            cmd.randomSeed = makeRandomSeed(cmd.commandNumber)
+            return cmd
+
+        packer = FieldPackers[mask]
+        values = packer.unpack(dgi.extractBytes(packer.size))
+        i = 0
+
+        if mask & CF_COMMAND_NUMBER:
+            cmd.commandNumber = values[i]
+            i += 1
         else:
             # Assume steady increment.
             cmd.commandNumber = prev.commandNumber + 1
 
-        rand = random.Random(cmd.commandNumber)
-        cmd.randomSeed = rand.randint(0, 0xFFFFFFFF)
+        cmd.randomSeed = makeRandomSeed(cmd.commandNumber)
 
-        if dgi.getUint8():
-            cmd.tickCount = dgi.getUint32()
+        if mask & CF_TICK_COUNT:
+            cmd.tickCount = values[i]
+            i += 1
         else:
             # Assume steady increment.
             cmd.tickCount = prev.tickCount + 1
 
-        if dgi.getUint8():
-            cmd.viewAngles.readDatagramFixed(dgi)
+        if mask & CF_VIEW_ANGLES:
+            cmd.viewAngles = Vec3(values[i], values[i + 1], values[i + 2])
+            i += 3
+        else:
+            cmd.viewAngles = prev.viewAngles
 
-        if dgi.getUint8():
-            cmd.move.readDatagramFixed(dgi)
+        if mask & CF_MOVE:
+            cmd.move = Vec3(values[i], values[i + 1], values[i + 2])
+            i += 3
+        else:
+            cmd.move = prev.move
 
-        if dgi.getUint8():
-            cmd.buttons = dgi.getUint32()
+        if mask & CF_BUTTONS:
+            cmd.buttons = values[i]
+            i += 1
+        else:
+            cmd.buttons = prev.buttons
 
-        if dgi.getUint8():
-            cmd.weaponSelect = dgi.getInt8()
+        if mask & CF_WEAPON_SELECT:
+            cmd.weaponSelect = values[i]
+            i += 1
+        else:
+            cmd.weaponSelect = prev.weaponSelect
 
-        if dgi.getUint8():
-            cmd.mouseDelta.readDatagramFixed(dgi)
+        if mask & CF_MOUSE_DELTA:
+            cmd.mouseDelta = Vec2(values[i], values[i + 1])
+        else:
+            cmd.mouseDelta = prev.mouseDelta
 
         return cmd
 
     def writeDatagram(self, dg, prev):
+        mask = 0
+        values = []
+
         if self.commandNumber != (prev.commandNumber + 1):
-            dg.addUint8(1)
-            dg.addUint32(self.commandNumber)
-        else:
-            dg.addUint8(0)
+            mask |= CF_COMMAND_NUMBER
+            values.append(self.commandNumber)
 
         if self.tickCount != (prev.tickCount + 1):
-            dg.addUint8(1)
-            dg.addUint32(self.tickCount)
-        else:
-            dg.addUint8(0)
+            mask |= CF_TICK_COUNT
+            values.append(self.tickCount)
 
         if self.viewAngles != prev.viewAngles:
-            dg.addUint8(1)
-            self.viewAngles.writeDatagramFixed(dg)
-        else:
-            dg.addUint8(0)
+            mask |= CF_VIEW_ANGLES
+            values.extend(self.viewAngles)
 
         if self.move != prev.move:
-            dg.addUint8(1)
-            self.move.writeDatagramFixed(dg)
-        else:
-            dg.addUint8(0)
+            mask |= CF_MOVE
+            values.extend(self.move)
 
         if self.buttons != prev.buttons:
-            dg.addUint8(1)
-            dg.addUint32(self.buttons)
-        else:
-            dg.addUint8(0)
+            mask |= CF_BUTTONS
+            values.append(self.buttons)
 
         if self.weaponSelect != prev.weaponSelect:
-            dg.addUint8(1)
-            dg.addInt8(self.weaponSelect)
-        else:
-            dg.addUint8(0)
+            mask |= CF_WEAPON_SELECT
+            values.append(self.weaponSelect)
 
         if self.mouseDelta != prev.mouseDelta:
-            dg.addUint8(1)
-            self.mouseDelta.writeDatagramFixed(dg)
-        else:
-            dg.addUint8(0)
-
+            mask |= CF_MOUSE_DELTA
+            values.extend(self.mouseDelta)
 
+        dg.addUint8(mask)
+        if mask:
+            dg.appendData(FieldPackers[mask].pack(*values))
@@ -0,0 +1,67 @@
+"""
+Cache of the physics meshes generated from model collision data.  Every
+instance of the same collision mesh shares one PhysTriangleMesh or
+PhysConvexMesh, and meshes are kept across level loads, so they are only
+generated once per process.
+"""
+
+import hashlib
+
+from panda3d.pphysics import *
+
+# Content hash of collision mesh data -> PhysTriangleMesh or PhysConvexMesh,
+# or None if the mesh couldn't be generated.
+MeshesByHash = {}
+# Model filename -> content hash of its collision mesh data.  Only trusted
+# for the duration of a level load, in case the model changes on disk.
+HashesByModel = {}
+
+NumGenerated = 0
+NumShared = 0
+
+def getMeshHash(part):
+    return hashlib.sha1(bytes(part.mesh_data)).digest() + (b'c' if part.concave else b'v')
+
+def getCollisionMesh(part, modelFilename=None):
+    """
+    Returns the physics mesh for the given model collision part, generating
+    it if no instance of the same mesh was seen before, along with its
+    content hash.  The mesh is None if it couldn't be generated.
+    """
+    global NumGenerated, NumShared
+
+    meshHash = HashesByModel.get(modelFilename) if modelFilename is not None else None
+    if meshHash is None:
+        meshHash = getMeshHash(part)
+        if modelFilename is not None:
+            HashesByModel[modelFilename] = meshHash
+
+    if meshHash in MeshesByHash:
+        NumShared += 1
+        return (MeshesByHash[meshHash], meshHash)
+
+    if part.concave:
+        mdata = PhysTriangleMeshData(part.mesh_data)
+    else:
+        mdata = PhysConvexMeshData(part.mesh_data)
+    if not mdata.generateMesh():
+        mesh = None
+    elif part.concave:
+        mesh = PhysTriangleMesh(mdata)
+    else:
+        mesh = PhysConvexMesh(mdata)
+    NumGenerated += 1
+    MeshesByHash[meshHash] = mesh
+    return (mesh, meshHash)
+
+def beginLevelLoad():
+    HashesByModel.clear()
+
+def endLevelLoad(usedHashes):
+    """
+    Throws away the meshes that the level just loaded doesn't use.  Meshes
+    it does use are kept for the next level load.
+    """
+    for meshHash in list(MeshesByHash.keys()):
+        if meshHash not in usedHashes:
+            del MeshesByHash[meshHash]
@@ -0,0 +1,222 @@
+"""DynamicLightManager module: contains the DynamicLightManager class."""
+
+from panda3d.core import PStatCollector, Vec3
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+totalLightsPColl = PStatCollector("DynamicLights:Total")
+activeLightsPColl = PStatCollector("DynamicLights:Active")
+mergedLightsPColl = PStatCollector("DynamicLights:Merged")
+culledLightsPColl = PStatCollector("DynamicLights:Culled")
+
+class DynamicLight:
+    """
+    A light registered with the DynamicLightManager.
+    """
+
+    __slots__ = ('light', 'initialColor', 'color', 'followParent', 'fadeTime',
+                 'startTime', 'radius', 'pos', 'score', 'budgetFade',
+                 'mergedLights', 'writtenColor', 'active')
+
+    def __init__(self, light, followParent, fadeTime, startTime):
+        self.light = light
+        self.initialColor = Vec3(light.getColorLinear())
+        # The color the owner wants, before the budget fade and merging.
+        self.color = Vec3(self.initialColor)
+        self.followParent = followParent
+        self.fadeTime = fadeTime
+        self.startTime = startTime
+        self.radius = max(1.0, light.getAttenuationRadius())
+        self.pos = None
+        self.score = 0.0
+        # Fades the light in and out of the budget.
+        self.budgetFade = 1.0
+        # The lights merged into this one this frame.
+        self.mergedLights = None
+        # The last color we set on the light, to tell whether the owner
+        # changed it since.
+        self.writtenColor = None
+        # True if the light is added to the qpLightManager.
+        self.active = False
+
+class DynamicLightManager:
+    """
+    Keeps the number of dynamic lights rendered under a budget.  Every
+    frame, each light is scored by its intensity and radius, falling off
+    with the square of its distance to the camera beyond its radius.  The
+    best maxLights lights are rendered.  A light that is close to a better
+    light of a similar color is merged into it instead of taking up a
+    slot, and lights that drop out of the budget fade out over fadeTime
+    rather than popping off.
+
+    Owners may keep changing the color of their light after adding it;
+    the manager picks up the new color on the next update.
+    """
+
+    notify = directNotify.newCategory("DynamicLightManager")
+
+    def __init__(self, lightMgr, maxLights=16, mergeDistance=48.0,
+                 mergeColorDot=0.95, fadeTime=0.15):
+        self.lightMgr = lightMgr
+        self.maxLights = maxLights
+        self.mergeDistanceSq = mergeDistance * mergeDistance
+        self.mergeColorDot = mergeColorDot
+        self.fadeTime = fadeTime
+
+        # qpLight -> DynamicLight.
+        self.lights = {}
+        self.lastUpdateTime = 0.0
+
+        # Counts from the last update.
+        self.numActive = 0
+        self.numMerged = 0
+        self.numCulled = 0
+
+    def getNumLights(self):
+        return len(self.lights)
+
+    def getStats(self):
+        """
+        Returns the number of registered lights and how many of them were
+        rendered, merged into another light and culled by the budget on
+        the last update.
+        """
+        return (len(self.lights), self.numActive, self.numMerged, self.numCulled)
+
+    def addLight(self, light, followParent=None, fadeTime=0.0):
+        if light in self.lights:
+            return
+        rec = DynamicLight(light, followParent, fadeTime, base.clockMgr.getClientFrameTime())
+        self.lights[light] = rec
+        # New lights show up right away.  They get culled on the next
+        # update if they don't make the budget.
+        self.__activate(rec)
+
+    def removeLight(self, light):
+        rec = self.lights.pop(light, None)
+        if not rec:
+            return
+        self.__deactivate(rec)
+        # Give the owner back the color it set.
+        if rec.writtenColor is not None and not rec.fadeTime:
+            light.setColorLinear(rec.color)
+
+    def clear(self):
+        for light in list(self.lights.keys()):
+            self.removeLight(light)
+
+    def __activate(self, rec):
+        if not rec.active:
+            self.lightMgr.addDynamicLight(rec.light)
+            rec.active = True
+
+    def __deactivate(self, rec):
+        if rec.active:
+            self.lightMgr.removeDynamicLight(rec.light)
+            rec.active = False
+
+    def update(self):
+        now = base.clockMgr.getClientFrameTime()
+        dt = max(0.0, now - self.lastUpdateTime)
+        self.lastUpdateTime = now
+
+        if not self.lights:
+            self.numActive = self.numMerged = self.numCulled = 0
+            self.__updatePStats()
+            return
+
+        render = base.render
+        camPos = base.cam.getPos(render)
+
+        expired = []
+        for rec in self.lights.values():
+            light = rec.light
+            if rec.followParent is not None:
+                light.setPos(rec.followParent.getPos(render))
+
+            if rec.fadeTime > 0.0:
+                frac = max(0.0, min(1.0, (now - rec.startTime) / rec.fadeTime))
+                if frac >= 1.0:
+                    expired.append(rec)
+                    continue
+                rec.color = rec.initialColor * (1.0 - frac)
+            else:
+                color = light.getColorLinear()
+                if rec.writtenColor is None or not color.almostEqual(rec.writtenColor):
+                    rec.color = Vec3(color)
+
+            rec.pos = light.getPos()
+            intensity = max(rec.color[0], rec.color[1], rec.color[2])
+            radiusSq = rec.radius * rec.radius
+            distSq = (rec.pos - camPos).lengthSquared()
+            rec.score = intensity * radiusSq / max(distSq, radiusSq)
+
+        for rec in expired:
+            self.removeLight(rec.light)
+
+        # Pick the best lights, merging lights that are near a better light
+        # of a similar color into it.
+        kept = []
+        merged = []
+        culled = []
+        for rec in sorted(self.lights.values(), key=lambda r: r.score, reverse=True):
+            rec.mergedLights = None
+            if rec.score <= 0.0:
+                culled.append(rec)
+                continue
+
+            colorDir = rec.color.normalized()
+            into = None
+            for other in kept:
+                if (other.pos - rec.pos).lengthSquared() > self.mergeDistanceSq:
+                    continue
+                if colorDir.dot(other.color.normalized()) >= self.mergeColorDot:
+                    into = other
+                    break
+
+            if into:
+                into.mergedLights.append(rec)
+                merged.append(rec)
+            elif len(kept) < self.maxLights:
+                rec.mergedLights = []
+                kept.append(rec)
+            else:
+                culled.append(rec)
+
+        fadeStep = (dt / self.fadeTime) if self.fadeTime > 0.0 else 1.0
+
+        # A merged light is within the budget, rendered by the light it was
+        # merged into.
+        for rec in merged:
+            rec.budgetFade = min(1.0, rec.budgetFade + fadeStep)
+            self.__deactivate(rec)
+
+        for rec in culled:
+            rec.budgetFade = max(0.0, rec.budgetFade - fadeStep)
+            if rec.budgetFade <= 0.0:
+                self.__deactivate(rec)
+            else:
+                self.__setColor(rec, rec.color * rec.budgetFade)
+
+        for rec in kept:
+            rec.budgetFade = min(1.0, rec.budgetFade + fadeStep)
+            color = rec.color * rec.budgetFade
+            for other in rec.mergedLights:
+                color += other.color * other.budgetFade
+            self.__activate(rec)
+            self.__setColor(rec, color)
+
+        self.numActive = len(kept) + sum(1 for rec in culled if rec.active)
+        self.numMerged = len(merged)
+        self.numCulled = len(culled)
+        self.__updatePStats()
+
+    def __setColor(self, rec, color):
+        rec.light.setColorLinear(color)
+        rec.writtenColor = Vec3(color)
+
+    def __updatePStats(self):
+        totalLightsPColl.setLevel(len(self.lights))
+        activeLightsPColl.setLevel(self.numActive)
+        mergedLightsPColl.setLevel(self.numMerged)
+        culledLightsPColl.setLevel(self.numCulled)
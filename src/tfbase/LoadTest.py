@@ -0,0 +1,256 @@
+"""LoadTest module: contains the LoadTest class."""
+
+import gc
+import json
+import random
+import sys
+
+from panda3d.direct import DCPacker
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+def getPercentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+def getMaxRss():
+    """
+    Returns the peak resident set size of the process in kilobytes, or None
+    if it can't be determined on this platform.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes on macOS.
+        rss //= 1024
+    return rss
+
+# Rough per-object and per-field overhead of a snapshot entry: the doId
+# and field count, and the field index.
+SnapshotObjectHeaderBytes = 6
+SnapshotFieldHeaderBytes = 2
+
+class LoadTest:
+    """
+    Headless server load test.  Fills the server with bots through the
+    regular makeBot path, runs a fixed number of simulation ticks with a
+    fixed random seed, then reports the tick time distribution, memory
+    growth and snapshot bytes per tick and quits.  Started from TFStart with
+    --loadtest.
+
+    Bots have no client connection, so nothing is actually sent to them.
+    Instead, every tick the state fields of every object are packed the way
+    a snapshot would pack them, and the fields that changed since the last
+    tick are counted.  This is what a client that sees every object would
+    be sent.
+    """
+
+    notify = directNotify.newCategory("LoadTest")
+
+    def __init__(self, numBots, numTicks, seed=0, warmupTicks=66, outFile=None):
+        self.numBots = numBots
+        self.numTicks = numTicks
+        self.seed = seed
+        # Ticks to run before measuring, so bots can spawn and settle.
+        self.warmupTicks = warmupTicks
+        self.outFile = outFile
+        # Take a memory sample every this many ticks.
+        self.memorySampleInterval = 66
+
+        self.tick = 0
+        self.lastBytesSent = 0
+        self.bytesPerTick = []
+        self.snapshotBytesPerTick = []
+        # doId -> {fieldName: packed bytes} as of the last tick.
+        self.lastState = {}
+        self.memorySamples = []
+        self.task = None
+
+    def start(self):
+        self.notify.info("Starting load test: %i bots, %i ticks, seed %i" %
+                         (self.numBots, self.numTicks, self.seed))
+        random.seed(self.seed)
+        # The bot think budget is wall-clock based, which would make the
+        # run differ between machines and runs.  Think a fixed number of
+        # bots per tick instead, enough for each to think every minInterval
+        # ticks.
+        thinkMgr = base.botThinkMgr
+        thinkMgr.maxThinksPerTick = max(1, -(-self.numBots // thinkMgr.minInterval))
+        for _ in range(self.numBots):
+            base.game.makeBot('')
+        self.task = base.simTaskMgr.add(self.__tickTask, 'loadTestTick', sort=10001)
+
+    def __beginMeasuring(self):
+        prof = base.tickProfiler
+        prof.window = self.numTicks
+        prof.reset()
+        prof.start()
+        self.lastBytesSent = base.sv.bytesSent
+        self.measureSnapshotBytes()
+        self.sampleMemory()
+
+    def sampleMemory(self):
+        self.memorySamples.append({
+            'tick': self.tick - self.warmupTicks,
+            'maxRssKb': getMaxRss(),
+            'pyObjects': len(gc.get_objects())
+        })
+
+    def packObjectState(self, do):
+        """
+        Returns a dictionary of the object's state fields, packed as they
+        would be in a snapshot.
+        """
+        state = {}
+        dclass = getattr(do, 'dclass', None)
+        if not dclass:
+            return state
+        for i in range(dclass.getNumInheritedFields()):
+            field = dclass.getInheritedField(i)
+            if not field.asParameter():
+                # Not a state field, sent as an update instead.
+                continue
+            name = field.getName()
+            proxy = getattr(do, 'SendProxy_' + name, None)
+            if proxy:
+                value = proxy()
+            else:
+                value = getattr(do, name, None)
+                if value is None:
+                    continue
+            packer = DCPacker()
+            packer.beginPack(field)
+            packer.packObject(value)
+            if packer.endPack():
+                state[name] = packer.getBytes()
+        return state
+
+    def measureSnapshotBytes(self):
+        """
+        Returns about how many bytes of state changed since the last call,
+        which is what a delta snapshot of every object would carry.
+        """
+        total = 0
+        lastState = self.lastState
+        newState = {}
+        for doId, do in list(base.sv.doId2do.items()):
+            state = self.packObjectState(do)
+            newState[doId] = state
+            prev = lastState.get(doId, {})
+            numChanged = 0
+            for name, data in state.items():
+                if prev.get(name) != data:
+                    total += len(data) + SnapshotFieldHeaderBytes
+                    numChanged += 1
+            if numChanged:
+                total += SnapshotObjectHeaderBytes
+        self.lastState = newState
+        return total
+
+    def __tickTask(self, task):
+        self.tick += 1
+        if self.tick <= self.warmupTicks:
+            if self.tick == self.warmupTicks:
+                self.__beginMeasuring()
+            return task.cont
+
+        # This task runs after the tick profiler's end of tick, so the time
+        # spent packing state isn't counted as tick time.
+        self.snapshotBytesPerTick.append(self.measureSnapshotBytes())
+
+        bytesSent = base.sv.bytesSent
+        self.bytesPerTick.append(bytesSent - self.lastBytesSent)
+        self.lastBytesSent = bytesSent
+
+        measured = self.tick - self.warmupTicks
+        if (measured % self.memorySampleInterval) == 0:
+            self.sampleMemory()
+
+        if measured >= self.numTicks:
+            self.sampleMemory()
+            self.finish()
+            self.task = None
+            # Let the current frame finish, then return from base.run().
+            base.taskMgr.stop()
+            return task.done
+
+        return task.cont
+
+    def getReport(self):
+        prof = base.tickProfiler
+        tickTimes = sorted(t * 1000 for t in prof.tickTimes.samples)
+        byteCounts = sorted(self.bytesPerTick)
+        snapshotCounts = sorted(self.snapshotBytesPerTick)
+        first = self.memorySamples[0]
+        last = self.memorySamples[-1]
+
+        report = {
+            'bots': self.numBots,
+            'ticks': self.numTicks,
+            'seed': self.seed,
+            'budgetMs': prof.budget * 1000,
+            'tickMs': {
+                'mean': sum(tickTimes) / len(tickTimes) if tickTimes else 0.0,
+                'p50': getPercentile(tickTimes, 50),
+                'p90': getPercentile(tickTimes, 90),
+                'p99': getPercentile(tickTimes, 99),
+                'max': tickTimes[-1] if tickTimes else 0.0
+            },
+            'overBudgetTicks': prof.numOverBudget,
+            'snapshotBytesPerTick': {
+                'mean': sum(snapshotCounts) / len(snapshotCounts) if snapshotCounts else 0.0,
+                'p50': getPercentile(snapshotCounts, 50),
+                'p99': getPercentile(snapshotCounts, 99),
+                'max': snapshotCounts[-1] if snapshotCounts else 0
+            },
+            'bytesSentPerTick': {
+                'mean': sum(byteCounts) / len(byteCounts) if byteCounts else 0.0,
+                'p50': getPercentile(byteCounts, 50),
+                'p99': getPercentile(byteCounts, 99),
+                'max': byteCounts[-1] if byteCounts else 0
+            },
+            'memory': {
+                'maxRssGrowthKb': (last['maxRssKb'] - first['maxRssKb'])
+                                  if first['maxRssKb'] is not None else None,
+                'pyObjectGrowth': last['pyObjects'] - first['pyObjects'],
+                'samples': self.memorySamples
+            },
+            'tasks': [
+                {'name': name, 'count': count, 'meanMs': mean, 'p50Ms': p50,
+                 'p99Ms': p99, 'maxMs': maxMs}
+                for name, count, mean, p50, p99, maxMs in prof.getReport()[1:]
+            ]
+        }
+        return report
+
+    def finish(self):
+        report = self.getReport()
+        ticks = report['tickMs']
+        self.notify.info("Load test finished: %i bots, %i ticks" % (self.numBots, self.numTicks))
+        self.notify.info("Tick ms: mean %.2f, p50 %.2f, p90 %.2f, p99 %.2f, max %.2f; %i over %.2f ms budget" %
+                         (ticks['mean'], ticks['p50'], ticks['p90'], ticks['p99'], ticks['max'],
+                          report['overBudgetTicks'], report['budgetMs']))
+        snap = report['snapshotBytesPerTick']
+        self.notify.info("Snapshot bytes per tick: mean %.1f, p50 %i, p99 %i, max %i" %
+                         (snap['mean'], snap['p50'], snap['p99'], snap['max']))
+        sent = report['bytesSentPerTick']
+        self.notify.info("Bytes sent to clients per tick: mean %.1f, p50 %i, p99 %i, max %i" %
+                         (sent['mean'], sent['p50'], sent['p99'], sent['max']))
+        mem = report['memory']
+        self.notify.info("Memory growth: max RSS %s KB, %i Python objects" %
+                         (mem['maxRssGrowthKb'], mem['pyObjectGrowth']))
+        for task in report['tasks'][:10]:
+            self.notify.info("  %s: p50 %.3f ms, p99 %.3f ms" % (task['name'], task['p50Ms'], task['p99Ms']))
+
+        if self.outFile:
+            with open(self.outFile, 'w') as f:
+                json.dump(report, f, indent=2)
+            self.notify.info("Wrote load test report to %s" % self.outFile)
@@ -0,0 +1,77 @@
+"""ParticleScheduler module: contains the ParticleScheduler class."""
+
+import heapq
+
+from panda3d.core import PStatCollector
+
+from tf.tfbase import TFEffects
+
+liveEffectsPColl = PStatCollector("Effects:Live")
+pooledEffectsPColl = PStatCollector("Effects:Pooled")
+
+class ParticleScheduler:
+    """
+    Starts and soft-stops one-shot particle systems from a single task,
+    instead of an interval per system.  Systems that came from an effect
+    pool are watched after they are soft-stopped, and given back to their
+    pool once their last particle has died.  A system that is still running
+    lingerTime after it was soft-stopped is stopped outright.
+    """
+
+    def __init__(self, lingerTime=5.0):
+        self.lingerTime = lingerTime
+        # (system, parent, duration, effectName) to start on the next update.
+        self.startQueue = []
+        # Heap of (stopTime, sequence, system, effectName).
+        self.stopQueue = []
+        self.stopSequence = 0
+        # (giveUpTime, system, effectName) of soft-stopped pooled systems.
+        self.finishing = []
+
+    def queue(self, system, parent, duration, effectName=None):
+        """
+        Starts the system under parent on the next update, and soft-stops it
+        duration seconds later.  If effectName is given, the system was
+        acquired from that effect's pool and is released to it when done.
+        """
+        self.startQueue.append((system, parent, duration, effectName))
+
+    def softStop(self, system, delay, effectName=None):
+        """
+        Soft-stops an already started system delay seconds from now.
+        """
+        stopTime = base.clockMgr.getClientFrameTime() + delay
+        heapq.heappush(self.stopQueue, (stopTime, self.stopSequence, system, effectName))
+        self.stopSequence += 1
+
+    def update(self):
+        if self.startQueue:
+            startQueue = self.startQueue
+            self.startQueue = []
+            for system, parent, duration, effectName in startQueue:
+                system.start(parent)
+                self.softStop(system, duration, effectName)
+
+        now = base.clockMgr.getClientFrameTime()
+        stopQueue = self.stopQueue
+        while stopQueue and stopQueue[0][0] <= now:
+            _, _, system, effectName = heapq.heappop(stopQueue)
+            system.softStop()
+            if effectName:
+                self.finishing.append((now + self.lingerTime, system, effectName))
+
+        if self.finishing:
+            stillFinishing = []
+            for entry in self.finishing:
+                giveUpTime, system, effectName = entry
+                if system.isRunning():
+                    if now < giveUpTime:
+                        stillFinishing.append(entry)
+                        continue
+                    system.stop()
+                TFEffects.releaseEffect(effectName, system)
+            self.finishing = stillFinishing
+
+        numLive, numPooled = TFEffects.getEffectStats()
+        liveEffectsPColl.setLevel(numLive)
+        pooledEffectsPColl.setLevel(numPooled)
@@ -2,13 +2,17 @@
 Builds the sound list from the script file.
 """
 
+import marshal
 import math
+import os
 import random
 from enum import IntEnum
 
-from panda3d.core import (ConfigVariableDouble, ConfigVariableList, Filename,
-                          KeyValues, ProxyAudioSound, PStatCollector,
-                          SteamAudioProperties, loadPrcFileData)
+from panda3d.core import (ConfigVariableDouble, ConfigVariableList,
+                          ConfigVariableString, Filename, KeyValues,
+                          ProxyAudioSound, PStatCollector,
+                          SteamAudioProperties, VirtualFileSystem,
+                          getModelPath, loadPrcFileData)
 
 from tf.tfbase import TFGlobals
 
@@ -20,6 +24,12 @@ snd_refdist = ConfigVariableDouble("snd-refdist", 36)
 
 load_sounds = ConfigVariableList("load-sounds")
 
+# Compiled sound scripts, so they don't have to be parsed on every startup.
+# Set to an empty string to disable.
+sound_cache_file = ConfigVariableString("sound-cache-file", "cache/sounds.cache")
+# Bump this when the format of the compiled sound records changes.
+SOUND_CACHE_VERSION = 1
+
 def attenToSoundLevel(attn):
     return ((50 + 20 / float(attn)) if attn else 0.0)
 
@@ -167,8 +177,65 @@ class SoundInfo:
           waves       {self.waves}
         """
 
-Sounds = {}
-AllSounds = []
+class SoundTable:
+    """
+    Name -> SoundInfo mapping of all loaded sounds.  Sounds are stored as
+    compiled records and their SoundInfos are only built the first time
+    they're asked for, since most sounds are never played in a session.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.indices = {}
+        self.infos = []
+
+    def setRecords(self, records):
+        self.records = records
+        self.indices = {record[0]: i for i, record in enumerate(records)}
+        self.infos = [None] * len(records)
+
+    def getByIndex(self, index):
+        info = self.infos[index]
+        if info is None:
+            info = makeSoundInfo(self.records[index], index)
+            self.infos[index] = info
+        return info
+
+    def get(self, name, default=None):
+        index = self.indices.get(name)
+        if index is None:
+            return default
+        return self.getByIndex(index)
+
+    def __getitem__(self, name):
+        return self.getByIndex(self.indices[name])
+
+    def __contains__(self, name):
+        return name in self.indices
+
+    def __len__(self):
+        return len(self.records)
+
+    def keys(self):
+        return self.indices.keys()
+
+class SoundIndexList:
+    """
+    Index -> SoundInfo view of a SoundTable, in script order.  The index is
+    what gets sent over the network.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, index):
+        return self.table.getByIndex(index)
+
+    def __len__(self):
+        return len(self.table.records)
+
+Sounds = SoundTable()
+AllSounds = SoundIndexList(Sounds)
 
 def createSound(info, spatial=False, getWave=False):
     if not info:
@@ -269,88 +336,167 @@ def createSoundServer(name):
     return [info.index, waveIdx, random.uniform(info.volume[0], info.volume[1]),
             random.uniform(info.pitch[0], info.pitch[1]), info.channel]
 
-def processSound(kv):
-    global Sounds
+def parseWaveName(value):
+    """
+    Strips the spatialization prefix off of a wave name.  Returns the
+    lowercase filename and whether the wave is spatialized.
+    """
+    if value.startswith(")") or value.startswith(">") or value.startswith("<"):
+        return (value[1:].lower(), True)
+    elif value.startswith("#"):
+        return (value[1:].lower(), False)
+    return (value.lower(), False)
 
-    info = SoundInfo()
-    info.name = kv.getName()
+def compileSound(kv):
+    """
+    Parses a sound script entry into a record of plain values, which is
+    what gets stored in the sound cache.  The record is:
+    (name, channel, volume, pitch, soundLevel, wave, waves), where wave is
+    None or (filename, spatialized, loopStart, loopEnd) and waves is a
+    tuple of (filename, spatialized).  soundLevel is None if the entry
+    doesn't have one.
+    """
+    channel = Channel.CHAN_AUTO
+    volume = (1.0, 1.0)
+    pitch = (1.0, 1.0)
+    soundLevel = None
+    wave = None
     for i in range(kv.getNumKeys()):
         key = kv.getKey(i)
         value = kv.getValue(i)
 
         if key == "channel":
-            info.channel = Channel[value]
+            channel = Channel[value]
         elif key == "volume":
             if value == "VOL_NORM":
-                info.volume = [1.0, 1.0]
+                volume = (1.0, 1.0)
             else:
                 minmax = "".join(value.split()).split(",")
                 if len(minmax) > 1:
-                    info.volume = [float(minmax[0]), float(minmax[1])]
+                    volume = (float(minmax[0]), float(minmax[1]))
                 else:
-                    info.volume = [float(minmax[0]), float(minmax[0])]
+                    volume = (float(minmax[0]), float(minmax[0]))
         elif key == "soundlevel":
             dbs = value.lower().split("sndlvl_")[1]
             if dbs.endswith("db"):
-                info.soundLevel = int(dbs[:len(dbs) - 2])
+                soundLevel = int(dbs[:len(dbs) - 2])
             elif dbs.endswith("dbm"):
                 # Fuckers.
-                info.soundLevel = int(dbs[:len(dbs) - 3])
-            else:
-                info.soundLevel = SoundLevel[value]
-            info.distMult = soundLevelToDistMult(info.soundLevel)
-            if info.distMult > 0.0:
-                info.minDistance = 1.0 / info.distMult
+                soundLevel = int(dbs[:len(dbs) - 3])
             else:
-                info.minDistance = 1000000.0
+                soundLevel = int(SoundLevel[value])
         elif key == "wave":
-            info.wave = Wave()
-            if value.startswith(")") or value.startswith(">") or value.startswith("<"):
-                info.wave.spatialized = True
-                value = value[1:]
-            elif value.startswith("#"):
-                value = value[1:]
-            info.wave.filename = Filename.fromOsSpecific(value.lower())
+            filename, spatialized = parseWaveName(value)
+            wave = [filename, spatialized, 0.0, -1.0]
         elif key == "loopstart":
-            assert info.wave
-            info.wave.loopStart = float(value)
+            assert wave
+            wave[2] = float(value)
         elif key == "loopend":
-            assert info.wave
-            info.wave.loopEnd = float(value)
+            assert wave
+            wave[3] = float(value)
         elif key == "pitch":
             if value.upper() in Pitch.__members__:
-                info.pitch = [Pitch[value.upper()], Pitch[value.upper()]]
+                pitch = (Pitch[value.upper()], Pitch[value.upper()])
             else:
                 minmax = "".join(value.split()).split(",")
                 if len(minmax) > 1:
-                    info.pitch = [float(minmax[0]), float(minmax[1])]
+                    pitch = (float(minmax[0]), float(minmax[1]))
                 else:
-                    info.pitch = [float(minmax[0]), float(minmax[0])]
+                    pitch = (float(minmax[0]), float(minmax[0]))
 
-            info.pitch[0] = sourcePitchToPlayRate(info.pitch[0])
-            info.pitch[1] = sourcePitchToPlayRate(info.pitch[1])
+            pitch = (sourcePitchToPlayRate(pitch[0]), sourcePitchToPlayRate(pitch[1]))
 
+    waves = []
     for i in range(kv.getNumChildren()):
         child = kv.getChild(i)
         if child.getName() == "rndwave":
             for j in range(child.getNumKeys()):
-                value = child.getValue(j)
-                wave = Wave()
-                if value.startswith(")") or value.startswith(">") or value.startswith("<"):
-                    wave.spatialized = True
-                    value = value[1:]
-                elif value.startswith("#"):
-                    value = value[1:]
-                wave.filename = Filename.fromOsSpecific(value.lower())
-                info.waves.append(wave)
-
-    info.index = len(AllSounds)
-    Sounds[info.name] = info
-    AllSounds.append(info)
-
-def loadSounds(server = False):
-    for i in range(load_sounds.getNumUniqueValues()):
-        filename = Filename.fromOsSpecific(load_sounds.getUniqueValue(i))
+                waves.append(parseWaveName(child.getValue(j)))
+
+    return (kv.getName(), int(channel), volume, pitch, soundLevel,
+            tuple(wave) if wave else None, tuple(waves))
+
+def makeSoundInfo(record, index):
+    """
+    Builds the SoundInfo of a compiled sound record.
+    """
+    name, channel, volume, pitch, soundLevel, wave, waves = record
+
+    info = SoundInfo()
+    info.name = name
+    info.channel = Channel(channel)
+    info.volume = list(volume)
+    info.pitch = list(pitch)
+    if soundLevel is not None:
+        info.soundLevel = soundLevel
+        info.distMult = soundLevelToDistMult(soundLevel)
+        if info.distMult > 0.0:
+            info.minDistance = 1.0 / info.distMult
+        else:
+            info.minDistance = 1000000.0
+    if wave:
+        info.wave = Wave()
+        info.wave.filename = Filename.fromOsSpecific(wave[0])
+        info.wave.spatialized = wave[1]
+        info.wave.loopStart = wave[2]
+        info.wave.loopEnd = wave[3]
+    for filename, spatialized in waves:
+        w = Wave()
+        w.filename = Filename.fromOsSpecific(filename)
+        w.spatialized = spatialized
+        info.waves.append(w)
+    info.index = index
+    return info
+
+def getScriptKeys(filenames):
+    """
+    Returns what the sound cache is keyed on: the full path, timestamp and
+    size of each sound script.
+    """
+    vfs = VirtualFileSystem.getGlobalPtr()
+    keys = []
+    for filename in filenames:
+        fn = Filename(filename)
+        vfile = vfs.getFile(fn) if vfs.resolveFilename(fn, getModelPath().value) else None
+        if vfile:
+            keys.append((fn.getFullpath(), vfile.getTimestamp(), vfile.getFileSize()))
+        else:
+            keys.append((fn.getFullpath(), -1, -1))
+    return keys
+
+def readSoundCache(keys):
+    """
+    Returns the compiled sound records from the sound cache, or None if
+    there is no cache or it's out of date.
+    """
+    cacheFile = sound_cache_file.value
+    if not cacheFile:
+        return None
+    try:
+        with open(Filename(cacheFile).toOsSpecific(), 'rb') as f:
+            version, cacheKeys, records = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != SOUND_CACHE_VERSION or cacheKeys != keys:
+        return None
+    return records
+
+def writeSoundCache(keys, records):
+    cacheFile = sound_cache_file.value
+    if not cacheFile:
+        return
+    fn = Filename(cacheFile)
+    try:
+        os.makedirs(Filename(fn.getDirname()).toOsSpecific() or '.', exist_ok=True)
+        with open(fn.toOsSpecific(), 'wb') as f:
+            f.write(marshal.dumps((SOUND_CACHE_VERSION, keys, records)))
+    except OSError as e:
+        print("Unable to write sound cache %s: %s" % (cacheFile, e))
+
+def compileSoundScripts(filenames):
+    records = []
+    for filename in filenames:
+        filename = Filename.fromOsSpecific(filename)
 
         print("Loading sounds from %s" % filename.getFullpath())
 
@@ -360,8 +506,30 @@ def loadSounds(server = False):
             continue
 
         for j in range(kv.getNumChildren()):
-            child = kv.getChild(j)
-            processSound(child)
+            records.append(compileSound(kv.getChild(j)))
+    return records
+
+def loadSounds(server = False, useCache = True):
+    """
+    Loads the sounds of every script listed in load-sounds.  If the scripts
+    haven't changed since the last time, their compiled records are read
+    from the sound cache instead of parsing them again.
+    """
+    filenames = [load_sounds.getUniqueValue(i) for i in range(load_sounds.getNumUniqueValues())]
+
+    records = None
+    if useCache:
+        keys = getScriptKeys(filenames)
+        records = readSoundCache(keys)
+        if records is not None:
+            print("Loaded %i sounds from %s" % (len(records), sound_cache_file.value))
+
+    if records is None:
+        records = compileSoundScripts(filenames)
+        if useCache:
+            writeSoundCache(keys, records)
+
+    Sounds.setRecords(records)
 
     #print(repr(Sounds))
 
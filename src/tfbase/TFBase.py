@@ -15,14 +15,17 @@ from direct.interval.IntervalGlobal import (Func, LerpColorScaleInterval,
 from direct.showbase.ShowBase import ShowBase
 from tf.actor.Actor import Actor
 from tf.distributed.TFClientRepository import TFClientRepository
-from tf.tfbase import (Sounds, Soundscapes, SurfaceProperties, TFGlobals,
-                       TFLocalizer)
+from tf.tfbase import (Sounds, Soundscapes, SurfaceProperties, TFEffects,
+                       TFGlobals, TFLocalizer)
 from tf.tfgui.GuiPanel import GuiPanel
 from tf.tfgui.NotifyView import NotifyView
 from tf.tfgui.TFDialog import TFDialog
 from tf.tfgui.TFMainMenu import TFMainMenu
+from tf.weapon.FlameManager import FlameManager
 
 from . import CollisionGroups, Sounds
+from .DynamicLightManager import DynamicLightManager
+from .ParticleScheduler import ParticleScheduler
 from .PlanarReflector import PlanarReflector
 from .TFPostProcess import TFPostProcess
 
@@ -81,6 +84,7 @@ class TFBase(ShowBase, FSM):
         Sounds.loadSounds()
         SurfaceProperties.loadSurfaceProperties()
         Soundscapes.loadSoundscapes()
+        TFEffects.loadEffectDefinitions()
 
         self.render.hide(DirectRender.ShadowCameraBitmask)
 
@@ -221,14 +225,26 @@ class TFBase(ShowBase, FSM):
 
         GuiPanel.initialize()
 
-        self.particleQueue = []
+        # Starts and soft-stops one-shot particle systems, and gives pooled
+        # ones back to their pool once they finish.
+        self.particleScheduler = ParticleScheduler()
 
         # Nodes that render once and get removed at the start of the next frame.
         self.oneOffNodes = set()
 
         self.game = None
 
-        self.dynamicLights = []
+        # Keeps the dynamic lights (muzzle flashes, explosions, flames)
+        # rendered each frame under a budget.
+        self.dynLightMgr = DynamicLightManager(self.lightMgr,
+                                               self.config.GetInt('tf-max-dynamic-lights', 16),
+                                               self.config.GetFloat('tf-dynamic-light-merge-dist', 48.0))
+
+        # Simulates every flamethrower flame in one update per tick, with a
+        # single light per flame stream.
+        self.flameMgr = FlameManager(self.config.GetInt('tf-max-flames', 256),
+                                     self.config.GetInt('tf-max-flame-lights', 8))
+        self.flameMgr.start()
 
         # Set up the tracer for the audio system to calculate
         # sound occlusion.
@@ -314,38 +330,14 @@ class TFBase(ShowBase, FSM):
         self.sfxManager.clearReverb()
 
     def addDynamicLight(self, lnp, followParent=None, fadeTime=0.0):
-        self.dynamicLights.append((lnp, Vec3(lnp.getColorLinear()), followParent, fadeTime, base.clockMgr.getClientFrameTime()))
-        self.lightMgr.addDynamicLight(lnp)
+        self.dynLightMgr.addLight(lnp, followParent, fadeTime)
 
     def removeDynamicLight(self, lnp):
-        for data in self.dynamicLights:
-            if data[0] == lnp:
-                self.lightMgr.removeDynamicLight(lnp)
-                self.dynamicLights.remove(data)
-                break
+        self.dynLightMgr.removeLight(lnp)
 
     def __processDynamicLights(self, task):
+        self.dynLightMgr.update()
         self.lightMgr.update()
-
-        if not self.dynamicLights:
-            return task.cont
-
-        removed = []
-        for data in self.dynamicLights:
-            if data[2] is not None:
-                data[0].setPos(data[2].getPos(self.render))
-            if data[3] > 0.0:
-                now = base.clockMgr.getTime()
-                elapsed = now - data[4]
-                frac = max(0.0, min(1.0, elapsed / data[3]))
-                if frac >= 1.0:
-                    removed.append(data)
-                data[0].setColorLinear(data[1] * (1.0 - frac))
-        if removed:
-            for x in removed:
-                self.lightMgr.removeDynamicLight(x[0])
-                self.dynamicLights.remove(x)
-
         return task.cont
 
     def doScreenshot(self):
@@ -375,17 +367,14 @@ class TFBase(ShowBase, FSM):
         self.processParticleQueue()
         return task.cont
 
-    def queueParticleSystem(self, system, parent, duration):
-        self.particleQueue.append((system, parent, duration))
+    def queueParticleSystem(self, system, parent, duration, effectName=None):
+        self.particleScheduler.queue(system, parent, duration, effectName)
 
-    def processParticleQueue(self):
-        if not self.particleQueue:
-            return
+    def softStopParticleSystem(self, system, delay, effectName=None):
+        self.particleScheduler.softStop(system, delay, effectName)
 
-        for sys, parent, duration in self.particleQueue:
-            sys.start(parent)
-            Sequence(Wait(duration), Func(sys.softStop)).start()
-        self.particleQueue = []
+    def processParticleQueue(self):
+        self.particleScheduler.update()
 
     def printVMRenderMasks(self):
         self.r_printNodeMasks(self.vmRender.node(), 0)
@@ -2,14 +2,21 @@
 
 from panda3d.core import *
 from panda3d.pphysics import PhysRayCastResult, PhysSphere, PhysSweepResult
+from panda3d.tf import TFQueryFilter as NativeQueryFilter
 
 from tf.tfbase import CollisionGroups
 
 tf_filter_coll = PStatCollector("App:TFFilterQuery:DoFilter")
 tf_filter_pytag_coll = PStatCollector("App:TFFilterQuery:DoFilter:GetPythonTag")
 
+# If false, all query filters run the Python filter functions, for debugging
+# the native filter.
+tf_native_query_filter = ConfigVariableBool("tf-native-query-filter", True).value
+
 ENTITY_TAG = "entity"
 
+NativeQueryFilter.setHitBoxMask(CollisionGroups.HitBox)
+
 def hitBoxes(actor, mask, entity, source):
     """
     If the given entity has hitboxes and the mask contains the CollisionGroups.HitBox
@@ -126,14 +133,98 @@ def worldOnly(actor, mask, entity, source):
         return 1
     return 0
 
+# Filter functions that have a native implementation in the C++ query filter.
+NativeFilterFlags = {
+    hitBoxes: NativeQueryFilter.F_hit_boxes,
+    ignorePlayers: NativeQueryFilter.F_ignore_players,
+    ignoreEnemies: NativeQueryFilter.F_ignore_enemies,
+    ignoreEnemyPlayers: NativeQueryFilter.F_ignore_enemy_players,
+    ignoreEnemyBuildings: NativeQueryFilter.F_ignore_enemy_buildings,
+    ignoreTeammates: NativeQueryFilter.F_ignore_teammates,
+    ignoreTeammatePlayers: NativeQueryFilter.F_ignore_teammate_players,
+    ignoreTeammateBuildings: NativeQueryFilter.F_ignore_teammate_buildings,
+    ignoreTeammateBuildings_nonBuilder: NativeQueryFilter.F_ignore_teammate_buildings_non_builder,
+    ignoreSelf: NativeQueryFilter.F_ignore_self,
+    worldOnly: NativeQueryFilter.F_world_only
+}
+
+def setActorFilterData(actor, entity):
+    """
+    Registers the entity information that the native query filter needs for
+    the given physics actor belonging to the entity.
+    """
+    flags = 0
+    builderId = -1
+    if entity.isPlayer():
+        flags |= NativeQueryFilter.EF_player
+    elif entity.isObject():
+        flags |= NativeQueryFilter.EF_object
+        builderId = entity.builderDoId
+        if entity.fromCollideMask & CollisionGroups.Teleporter:
+            flags |= NativeQueryFilter.EF_teleporter
+    if entity is getattr(base, 'world', None):
+        flags |= NativeQueryFilter.EF_world
+    if entity.hitBoxes:
+        flags |= NativeQueryFilter.EF_has_hit_boxes
+    NativeQueryFilter.setActorData(actor, getFilterId(entity), entity.team, flags, builderId)
+
+def getFilterId(entity):
+    """
+    Returns the ID the native query filter knows the entity by.  Entities
+    build their collisions before they are generated, when they have no doId
+    yet; they register again in generate().
+    """
+    if entity.doId is None:
+        return -1
+    return entity.doId
+
+def clearActorFilterData(actor):
+    NativeQueryFilter.clearActorData(actor)
+
 class TFQueryFilter:
 
-    def __init__(self, sourceEntity = None, filters = [], ignoreSource = True):
-        self.filter = CallbackObject.make(self.__doFilter)
+    def __init__(self, sourceEntity = None, filters = [], ignoreSource = True, native = True):
         self.sourceEntity = sourceEntity
         self.ignoreSource = ignoreSource
         self.filters = filters
 
+        flags = self.getNativeFlags() if (native and tf_native_query_filter) else None
+        if flags is not None:
+            self.nativeFilter = NativeQueryFilter(-1, -1, flags)
+            self.callback = self.nativeFilter
+        else:
+            # One of the filters is a custom Python function, or the caller
+            # asked for Python filtering.
+            self.nativeFilter = None
+            self.callback = CallbackObject.make(self.__doFilter)
+
+    @property
+    def filter(self):
+        """
+        The callback object to pass to the physics query.  The source
+        entity's doId and team are read here, at query time, since filters
+        can outlive a team change.
+        """
+        if self.nativeFilter is not None and self.sourceEntity is not None:
+            self.nativeFilter.setSource(getFilterId(self.sourceEntity), self.sourceEntity.team)
+        return self.callback
+
+    def getNativeFlags(self):
+        """
+        Returns the native filter flags equivalent to this filter's set of
+        Python filter functions, or None if any of them has no native
+        equivalent.
+        """
+        flags = NativeQueryFilter.F_hit_boxes
+        if self.ignoreSource:
+            flags |= NativeQueryFilter.F_ignore_self
+        for f in self.filters:
+            flag = NativeFilterFlags.get(f)
+            if flag is None:
+                return None
+            flags |= flag
+        return flags
+
     def __doFilter(self, cbdata):
         ret = self.doFilter(cbdata.actor, cbdata.into_collide_mask, cbdata.result)
         cbdata.result = ret
@@ -165,38 +256,91 @@ class TFQueryFilter:
 
         return hitType
 
-def makeTraceInfo(start, end, dir, dist, result):
-    data = {}
-    data['tracestart'] = start
-    data['traceend'] = end
-    data['tracedir'] = dir
-    data['tracedist'] = dist
-    data['ret'] = result
-    data['hit'] = result.hasBlock()
-    if result.hasBlock():
+class TraceResult:
+    """
+    Result of a trace query.  Filled in place by makeTraceInfo() so hot
+    paths can keep one around and pass it to every trace instead of
+    allocating a new result each time.
+
+    Supports dict-style access (tr['frac']) for compatibility with code
+    written against the old dictionary results.  The vector members are
+    rebound, never modified in place, so it is safe to hold on to them
+    after the result has been reused.
+    """
+
+    __slots__ = ('tracestart', 'traceend', 'tracedir', 'tracedist', 'ret',
+                 'hit', 'block', 'actor', 'pos', 'norm', 'mat', 'ent',
+                 'frac', 'endpos', 'startsolid')
+
+    def __init__(self):
+        self.tracestart = None
+        self.traceend = None
+        self.tracedir = None
+        self.tracedist = 0.0
+        self.ret = None
+        self.hit = False
+        self.block = None
+        self.actor = None
+        self.pos = None
+        self.norm = None
+        self.mat = None
+        self.ent = None
+        self.frac = 1.0
+        self.endpos = None
+        self.startsolid = False
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+def makeTraceInfo(start, end, dir, dist, result, tr=None):
+    if tr is None:
+        tr = TraceResult()
+    tr.tracestart = start
+    tr.traceend = end
+    tr.tracedir = dir
+    tr.tracedist = dist
+    tr.ret = result
+    tr.hit = result.hasBlock()
+    if tr.hit:
         block = result.getBlock()
         actor = block.getActor()
-        data['block'] = block
-        data['actor'] = actor
-        data['pos'] = block.getPosition()
-        data['norm'] = block.getNormal()
-        data['mat'] = block.getMaterial()
-        data['ent'] = actor.getPythonTag('entity') if actor else None
-        data['frac'] = (block.getDistance() / dist) if dist > 0.0 else 0.0
-        #assert data['frac'] >= 0.0 and data['frac'] <= 1.0
-        data['endpos'] = start + dir * block.getDistance()
-        data['startsolid'] = block.getDistance() < 0
+        blockDist = block.getDistance()
+        tr.block = block
+        tr.actor = actor
+        tr.pos = block.getPosition()
+        tr.norm = block.getNormal()
+        tr.mat = block.getMaterial()
+        tr.ent = actor.getPythonTag('entity') if actor else None
+        tr.frac = (blockDist / dist) if dist > 0.0 else 0.0
+        #assert tr.frac >= 0.0 and tr.frac <= 1.0
+        tr.endpos = start + dir * blockDist
+        tr.startsolid = blockDist < 0
     else:
-        data['block'] = None
-        data['actor'] = None
-        data['pos'] = Point3()
-        data['norm'] = Vec3()
-        data['mat'] = None
-        data['ent'] = None
-        data['frac'] = 1.0
-        data['endpos'] = end
-        data['startsolid'] = False
-    return data
+        tr.block = None
+        tr.actor = None
+        tr.pos = Point3()
+        tr.norm = Vec3()
+        tr.mat = None
+        tr.ent = None
+        tr.frac = 1.0
+        tr.endpos = end
+        tr.startsolid = False
+    return tr
 
 def traceCalcVector(start, end):
     dir = end - start
@@ -205,31 +349,67 @@ def traceCalcVector(start, end):
         dir = Vec3.forward()
     return (dir, dist)
 
-def traceLine(start, end, intoMask, filter):
+def getRayCastResult(tr):
+    if tr is not None and isinstance(tr.ret, PhysRayCastResult):
+        return tr.ret
+    return PhysRayCastResult()
+
+def getSweepResult(tr):
+    if tr is not None and isinstance(tr.ret, PhysSweepResult):
+        return tr.ret
+    return PhysSweepResult()
+
+def traceLine(start, end, intoMask, filter, tr=None):
     dir, dist = traceCalcVector(start, end)
-    result = PhysRayCastResult()
+    result = getRayCastResult(tr)
     base.physicsWorld.raycast(result, start, dir, dist, intoMask, 0, filter.filter)
-    return makeTraceInfo(start, end, dir, dist, result)
+    return makeTraceInfo(start, end, dir, dist, result, tr)
 
-def traceBox(start, end, mins, maxs, intoMask, filter, hpr=Vec3(0)):
+def traceLines(start, dirs, dist, intoMask, filter, results=None):
+    """
+    Casts a batch of rays of the same length from a common start point, i.e.
+    the pellets of a shotgun blast, sharing the query filter between them.
+    The directions must be normalized.  Returns a list of TraceResults, one
+    per direction.  If results is given, its TraceResults are filled in
+    place and it is grown to fit.
+    """
+    if results is None:
+        results = []
+    while len(results) < len(dirs):
+        results.append(TraceResult())
+
+    raycast = base.physicsWorld.raycast
+    qfilter = filter.filter
+    dist = max(0.01, dist)
+    for i, dir in enumerate(dirs):
+        tr = results[i]
+        result = getRayCastResult(tr)
+        raycast(result, start, dir, dist, intoMask, 0, qfilter)
+        makeTraceInfo(start, start + dir * dist, dir, dist, result, tr)
+
+    if len(results) > len(dirs):
+        del results[len(dirs):]
+    return results
+
+def traceBox(start, end, mins, maxs, intoMask, filter, hpr=Vec3(0), tr=None):
     dir, dist = traceCalcVector(start, end)
-    result = PhysSweepResult()
+    result = getSweepResult(tr)
     base.physicsWorld.boxcast(result, start + mins, start + maxs, dir, dist,
                               hpr, intoMask, 0, filter.filter)
-    return makeTraceInfo(start, end, dir, dist, result)
+    return makeTraceInfo(start, end, dir, dist, result, tr)
 
-def traceSphere(start, end, radius, intoMask, filter):
+def traceSphere(start, end, radius, intoMask, filter, tr=None):
     dir, dist = traceCalcVector(start, end)
-    result = PhysSweepResult()
+    result = getSweepResult(tr)
     base.physicsWorld.sweep(result, PhysSphere(radius), start, Vec3(0), dir, dist,
                             intoMask, 0, filter.filter)
-    return makeTraceInfo(start, end, dir, dist, result)
+    return makeTraceInfo(start, end, dir, dist, result, tr)
 
-def traceGeometry(start, end, geom, intoMask, filter, hpr=Vec3(0)):
+def traceGeometry(start, end, geom, intoMask, filter, hpr=Vec3(0), tr=None):
     dir, dist = traceCalcVector(start, end)
-    result = PhysSweepResult()
+    result = getSweepResult(tr)
     base.physicsWorld.sweep(result, geom, start, hpr, dir, dist, intoMask, 0, filter.filter)
-    return makeTraceInfo(start, end, dir, dist, result)
+    return makeTraceInfo(start, end, dir, dist, result, tr)
 
 def clipVelocity(inVel, normal, outVel, overBounce):
     angle = normal.z
@@ -254,16 +434,20 @@ def clipVelocity(inVel, normal, outVel, overBounce):
 
     return blocked
 
-def collideAndSlide(origin, velocity, collInfo, intoMask, filter):
+def collideAndSlide(origin, velocity, collInfo, intoMask, filter, tr=None):
     """
     Origin: current object position.
     Velocity: desired movement offset
     Mins: object bbox mins (origin relative)
     Maxs: object bbox maxs (origin relative)
+    Tr: optional TraceResult to reuse for the traces
 
     Velocity is modified in place, contains corrected movement offset.
     """
 
+    if tr is None:
+        tr = TraceResult()
+
     origVelocity = Vec3(velocity)
     primalVelocity = Vec3(velocity)
 
@@ -287,12 +471,12 @@ def collideAndSlide(origin, velocity, collInfo, intoMask, filter):
         # end point.
         end = origin + velocity * timeLeft
         if collInfo['type'] == 'box':
-            tr = traceBox(origin, end, collInfo['mins'], collInfo['maxs'], intoMask, filter)
+            traceBox(origin, end, collInfo['mins'], collInfo['maxs'], intoMask, filter, tr=tr)
         elif collInfo['type'] == 'sphere':
-            tr = traceSphere(origin, end, collInfo['radius'], intoMask, filter)
+            traceSphere(origin, end, collInfo['radius'], intoMask, filter, tr=tr)
         else:
             assert False
-        fraction = tr['frac']
+        fraction = tr.frac
 
         allFraction += fraction
 
@@ -302,7 +486,7 @@ def collideAndSlide(origin, velocity, collInfo, intoMask, filter):
         #    if numBumps > 0 and fraction == 1:
 
             # Actually covered some distance.
-            origin.assign(tr['endpos'])
+            origin.assign(tr.endpos)
             origVelocity.assign(velocity)
             numPlanes = 0
 
@@ -312,9 +496,9 @@ def collideAndSlide(origin, velocity, collInfo, intoMask, filter):
 
         # If the plane we hit has a high z component in the normal, then
         # it's probably a floor.
-        if tr['norm'].z > 0.7:
+        if tr.norm.z > 0.7:
             blocked |= 1
-        if not tr['norm'].z:
+        if not tr.norm.z:
             blocked |= 2
 
         # Reduce amount of dt left by total time left * fraction that we
@@ -326,7 +510,7 @@ def collideAndSlide(origin, velocity, collInfo, intoMask, filter):
             break
 
         # Setup next cliping plane
-        planes[numPlanes] = tr['norm']
+        planes[numPlanes] = tr.norm
         numPlanes += 1
 
         allOk = True
@@ -244,6 +244,22 @@ def approachAngle(target, value, speed):
 
     return value
 
+def sphereIntersectsCone(center, radius, origin, direction, distance, spread, coneRadius=0.0):
+    """
+    Returns True if the sphere overlaps the cone that starts at origin and
+    extends along the normalized direction for distance units, widening by
+    spread units for every unit travelled.  coneRadius is the width of the
+    cone at origin, for swept boxes and spheres.  Used as a cheap,
+    conservative pre-test before doing real ray casts.
+    """
+    delta = center - origin
+    t = delta.dot(direction)
+    if t < -radius - coneRadius or t > distance + radius + coneRadius:
+        return False
+    t = max(0.0, min(distance, t))
+    allowed = radius + coneRadius + t * spread
+    return (delta - direction * t).lengthSquared() <= allowed * allowed
+
 def configureFont(fnt, ppu=48):
     fnt.setPixelsPerUnit(ppu)
     fnt.setNativeAntialias(True)
@@ -361,6 +377,9 @@ VEC_OBS_HULL_MAX = Vec3(10, 10, 10)
 VEC_DEAD_VIEWHEIGHT = Vec3(0, 0, 14)
 DUCK_HULL_HALF_HEIGHT = (VEC_DUCK_HULL_MAX.z - VEC_DUCK_HULL_MIN.z) * 0.5
 STAND_HULL_HALF_HEIGHT = (VEC_HULL_MAX.z - VEC_HULL_MIN.z) * 0.5
+# How far hit boxes may stick out of a character's hull.  Used when culling
+# lag compensation and hit box synchronization against a shot.
+HITBOX_PADDING = 16.0
 
 # List of models that we should preload at game launch.
 # Anything that could be used during the course of the game
@@ -4,10 +4,17 @@ from panda3d.pphysics import *
 
 from direct.directnotify.DirectNotifyGlobal import directNotify
 from direct.showbase.HostBase import HostBase
+from tf.actor.Actor import Actor
+from tf.bot.BotThinkScheduler import BotThinkScheduler
 from tf.distributed.TFServerRepository import TFServerRepository
 from tf.entity.EntityConnectionManager import EntityConnectionManager
+from tf.entity.EntityGrid import EntityGrid
 from tf.entity.EntityManager import EntityManager
+from tf.entity.ThinkScheduler import ThinkScheduler
+from tf.entity.VisibilityCache import VisibilityCache
 from tf.tfbase import Sounds, SurfaceProperties, TFGlobals
+from tf.tfbase.TickProfiler import TickProfiler
+from tf.weapon.FlameManager import FlameManager
 
 # Note: The server needs to maintain a minimum of 66 "frames" or simulation
 # ticks per second.  There's a lot more leeway since the server isn't
@@ -54,8 +61,38 @@ class TFServerBase(HostBase):
 
         self.entMgr = EntityManager()
 
+        # Spatial index of entity positions for proximity queries.
+        self.entGrid = EntityGrid()
+        self.simTaskMgr.add(self.__updateEntityGrid, 'updateEntityGrid', sort=-50)
+
         self.simTaskMgr.add(EntityConnectionManager.processIOQueue, 'processEntityIOQueue', sort=0)
 
+        # Dispatches entity thinks scheduled with setNextThink().
+        self.thinkMgr = ThinkScheduler()
+        self.thinkMgr.start(sort=0)
+
+        # Spreads bot decision making across ticks under a time budget.
+        self.botThinkMgr = BotThinkScheduler(self.config.GetFloat('tf-bot-think-budget', 3.0) / 1000.0,
+                                             self.config.GetInt('tf-bot-think-min-interval', 3),
+                                             self.config.GetInt('tf-bot-think-max-interval', 15))
+        self.botThinkMgr.start(sort=-1)
+
+        # Per-tick world line-of-sight results shared by bots, sentries
+        # and dispensers.
+        self.visCache = VisibilityCache()
+
+        # Simulates every flamethrower flame in one update per tick.
+        self.flameMgr = FlameManager(self.config.GetInt('tf-max-flames', 256))
+        self.flameMgr.start(sort=1)
+
+        # Per-task timing of each simulation tick, queryable with the
+        # "tickprof" magic word.
+        self.tickProfiler = TickProfiler(self.simTaskMgr, self.intervalPerTick,
+                                         self.config.GetInt('tf-tick-profiler-window', 1000))
+        self.tickProfiler.warnOverBudget = self.config.GetBool('tf-tick-profiler-warn', False)
+        if self.config.GetBool('tf-tick-profiler', True):
+            self.tickProfiler.start()
+
         self.sv = TFServerRepository(self.config.GetInt("sv_port", 6667))
         self.air = self.sv
         self.sr = self.sv
@@ -69,6 +106,10 @@ class TFServerBase(HostBase):
             # Cache off our relative filename.
             ModelPool.addModel(pc, mdl.node().copySubgraph())
 
+    def __updateEntityGrid(self, task):
+        self.entGrid.update()
+        return task.cont
+
     def __garbageCollectStates(self, task):
         TransformState.garbageCollect()
         RenderState.garbageCollect()
@@ -76,6 +117,7 @@ class TFServerBase(HostBase):
 
     def preRunFrame(self):
         PStatClient.mainTick()
+        Actor.resetHitBoxStats()
         HostBase.preRunFrame(self)
 
     def postRunFrame(self):
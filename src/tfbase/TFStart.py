@@ -80,7 +80,15 @@ import argparse
 p = argparse.ArgumentParser(description='Team Fortress Entry-Point')
 p.add_argument('-s', '--server', help='Launch a server instance instead of a client.', action='store_true', default=False, required=False)
 p.add_argument('-p', '--port', help='Port number when launching a server instance.', type=int, default=-1, required=False)
+p.add_argument('-m', '--map', help='Map to load when launching a server instance.', default=None, required=False)
+p.add_argument('--loadtest', help='Run a headless server load test with this many bots, then quit.  Implies --server.', type=int, default=0, required=False)
+p.add_argument('--loadtest-ticks', help='Number of simulation ticks to measure during the load test.', type=int, default=66 * 60, required=False)
+p.add_argument('--loadtest-seed', help='Random seed for the load test.', type=int, default=0, required=False)
+p.add_argument('--loadtest-out', help='Write the load test report to this JSON file.', default=None, required=False)
+p.add_argument('--build-nav', help='Build the bot navigation graph of the map, write it next to the map file, then quit.  Implies --server.', action='store_true', default=False, required=False)
 args = p.parse_args()
+if args.loadtest > 0 or args.build_nav:
+    args.server = True
 
 print('TFStart: Starting the game.')
 
@@ -96,8 +104,24 @@ if args.server:
     print('TFStart: Running server instance.')
     if args.port != -1:
         loadPrcFileData("cmd args", "sv_port %i" % args.port)
+    if args.map:
+        loadPrcFileData("cmd args", "tf-map %s" % args.map)
     from tf.tfbase.TFServerBase import TFServerBase
     base = TFServerBase()
+    if args.loadtest > 0:
+        from tf.tfbase.LoadTest import LoadTest
+        base.loadTest = LoadTest(args.loadtest, args.loadtest_ticks, args.loadtest_seed,
+                                 outFile=args.loadtest_out)
+        base.loadTest.start()
+    elif args.build_nav:
+        from tf.bot.NavGraph import NavGraphBuilder
+        def buildNav(task):
+            NavGraphBuilder.buildForCurrentLevel()
+            # Let the current frame finish, then return from base.run().
+            base.taskMgr.stop()
+            return task.done
+        # Build once the level's physics scene has been simulated.
+        base.simTaskMgr.add(buildNav, 'buildNav', sort=100)
 else:
     print('TFStart: Running client instance.')
     from tf.tfbase.TFBase import TFBase
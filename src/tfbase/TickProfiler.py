@@ -0,0 +1,197 @@
+"""TickProfiler module: contains the TickProfiler class."""
+
+import collections
+import csv
+import json
+import time
+
+from panda3d.core import AsyncTask
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+class TaskTimes:
+    """
+    Rolling window of the per-tick time spent in all tasks of one name.
+    Tasks sharing a name, i.e. the simulate task of every player, are
+    summed into one sample per tick.
+    """
+
+    def __init__(self, window):
+        self.samples = collections.deque(maxlen=window)
+        self.total = 0.0
+        self.count = 0
+        self.maxTime = 0.0
+
+    def addSample(self, dt):
+        self.samples.append(dt)
+        self.total += dt
+        self.count += 1
+        if dt > self.maxTime:
+            self.maxTime = dt
+
+    def getPercentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100.0))
+        return ordered[index]
+
+    def getMean(self):
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+class TickProfiler:
+    """
+    Always-on profiler for the simulation task manager.  Measures the wall
+    time of each simulation tick and, using the per-task run times that the
+    task manager already records, how much of it each task took.  Keeps
+    rolling p50/p99 per task name and remembers the ticks that ran over
+    budget.  Unlike PStats, this doesn't need a live PStats server, so it can
+    be queried with a magic word or dumped to a file on a loaded server.
+    """
+
+    notify = directNotify.newCategory("TickProfiler")
+
+    StartTaskName = 'tickProfilerStart'
+    EndTaskName = 'tickProfilerEnd'
+
+    def __init__(self, taskMgr, budget, window=1000, maxOverBudget=64):
+        self.taskMgr = taskMgr
+        # Seconds a tick may take before it's considered over budget.
+        self.budget = budget
+        self.window = window
+        self.warnOverBudget = False
+
+        self.tickTimes = TaskTimes(window)
+        self.taskTimes = {}
+        self.numTicks = 0
+        self.numOverBudget = 0
+        # Most recent over-budget ticks, as
+        # (tick, tickTime, [(taskName, taskTime), ...]).
+        self.overBudget = collections.deque(maxlen=maxOverBudget)
+
+        self.tickStart = 0.0
+        self.startTask = None
+        self.endTask = None
+
+    def start(self):
+        if self.startTask:
+            return
+        self.startTask = self.taskMgr.add(self.__tickStart, self.StartTaskName, sort=-10000)
+        self.endTask = self.taskMgr.add(self.__tickEnd, self.EndTaskName, sort=10000)
+
+    def stop(self):
+        if self.startTask:
+            self.taskMgr.remove(self.startTask)
+            self.startTask = None
+        if self.endTask:
+            self.taskMgr.remove(self.endTask)
+            self.endTask = None
+
+    def reset(self):
+        self.tickTimes = TaskTimes(self.window)
+        self.taskTimes = {}
+        self.numTicks = 0
+        self.numOverBudget = 0
+        self.overBudget.clear()
+
+    def __tickStart(self, task):
+        self.tickStart = time.perf_counter()
+        return task.cont
+
+    def __tickEnd(self, task):
+        tickTime = time.perf_counter() - self.tickStart
+        self.numTicks += 1
+        self.tickTimes.addSample(tickTime)
+
+        # Gather what each task took this tick.  Sleeping tasks didn't run.
+        thisTick = {}
+        tasks = self.taskMgr.mgr.getActiveTasks()
+        for i in range(tasks.getNumTasks()):
+            t = tasks.getTask(i)
+            if t.getState() == AsyncTask.SSleeping:
+                continue
+            name = t.getName()
+            if name == self.StartTaskName or name == self.EndTaskName:
+                continue
+            thisTick[name] = thisTick.get(name, 0.0) + t.getDt()
+
+        for name, dt in thisTick.items():
+            times = self.taskTimes.get(name)
+            if times is None:
+                times = TaskTimes(self.window)
+                self.taskTimes[name] = times
+            times.addSample(dt)
+
+        if tickTime > self.budget:
+            self.numOverBudget += 1
+            worst = sorted(thisTick.items(), key=lambda x: x[1], reverse=True)[:3]
+            self.overBudget.append((self.numTicks, tickTime, worst))
+            if self.warnOverBudget:
+                self.notify.warning("Tick %i took %.2f ms (budget %.2f ms), slowest: %s" %
+                    (self.numTicks, tickTime * 1000, self.budget * 1000,
+                     ", ".join("%s %.2f ms" % (n, dt * 1000) for n, dt in worst)))
+
+        return task.cont
+
+    def getReport(self):
+        """
+        Returns a list of (taskName, count, meanMs, p50Ms, p99Ms, maxMs)
+        tuples, slowest p99 first.  The first entry is the whole tick.
+        """
+        def row(name, times):
+            return (name, times.count, times.getMean() * 1000,
+                    times.getPercentile(50) * 1000, times.getPercentile(99) * 1000,
+                    times.maxTime * 1000)
+
+        rows = [row(name, times) for name, times in self.taskTimes.items()]
+        rows.sort(key=lambda x: x[4], reverse=True)
+        rows.insert(0, row('<tick>', self.tickTimes))
+        return rows
+
+    def getSummary(self, numTasks=5):
+        """
+        Returns a short human-readable summary, suitable for a magic word
+        response.
+        """
+        rows = self.getReport()
+        tick = rows[0]
+        lines = ["Tick p50 %.2f ms, p99 %.2f ms, max %.2f ms; %i/%i over %.2f ms budget" %
+                 (tick[3], tick[4], tick[5], self.numOverBudget, self.numTicks, self.budget * 1000)]
+        for name, _, _, p50, p99, _ in rows[1:numTasks + 1]:
+            lines.append("%s: p50 %.2f ms, p99 %.2f ms" % (name, p50, p99))
+        return "\n".join(lines)
+
+    def dump(self, filename):
+        """
+        Writes the report to the given file, as JSON if the filename ends in
+        .json, otherwise as CSV.
+        """
+        rows = self.getReport()
+        if filename.endswith('.json'):
+            data = {
+                'budgetMs': self.budget * 1000,
+                'ticks': self.numTicks,
+                'overBudgetTicks': self.numOverBudget,
+                'tasks': [
+                    {'name': name, 'count': count, 'meanMs': mean, 'p50Ms': p50,
+                     'p99Ms': p99, 'maxMs': maxMs}
+                    for name, count, mean, p50, p99, maxMs in rows
+                ],
+                'recentOverBudget': [
+                    {'tick': tick, 'tickMs': tickTime * 1000,
+                     'slowest': [{'name': n, 'ms': dt * 1000} for n, dt in worst]}
+                    for tick, tickTime, worst in self.overBudget
+                ]
+            }
+            with open(filename, 'w') as f:
+                json.dump(data, f, indent=2)
+        else:
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['task', 'count', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms'])
+                for name, count, mean, p50, p99, maxMs in rows:
+                    writer.writerow([name, count, "%.4f" % mean, "%.4f" % p50,
+                                     "%.4f" % p99, "%.4f" % maxMs])
+        self.notify.info("Wrote tick profile to %s" % filename)
@@ -122,7 +122,7 @@ class BaseRocket(BaseClass):
             if not self.sweepGeometry:
                 self.sweepGeometry = self.makeModelCollisionShape()[0][1]
 
-            self.addTask(self.__simulateTask, 'RocketSimulateAI', sim=True, appendTask=True)
+            self.setNextThink(base.clockMgr.getTime(), self.__simulateThink)
 
     if not IS_CLIENT:
         def delete(self):
@@ -156,9 +156,10 @@ class BaseRocket(BaseClass):
             # Remove the rocket.
             base.net.deleteObject(self)
 
-        def __simulateTask(self, task):
+        def __simulateThink(self):
+            # Schedule the next think first, simulate() may delete us.
+            self.setNextThink(base.clockMgr.getTime())
             self.simulate()
-            return task.cont
 
         def simulate(self):
             BaseClass.simulate(self)
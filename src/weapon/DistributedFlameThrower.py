@@ -1,179 +1,16 @@
 """DistributedFlameThrower module: contains the DistributedFlameThrower class."""
 
-import random
+from panda3d.core import Quat, Vec3
 
-from panda3d.core import Point3, Quat, Vec3, qpLight
-
-from direct.directbase import DirectRender
 from tf.actor.Activity import Activity
 from tf.actor.Actor import Actor
 from tf.player.InputButtons import InputFlag
 from tf.player.PlayerAnimEvent import PlayerAnimEvent
-from tf.tfbase import CollisionGroups, TFFilters, TFGlobals, TFLocalizer
-from tf.weapon.TakeDamageInfo import TakeDamageInfo
+from tf.tfbase import CollisionGroups, TFFilters, TFLocalizer
 
 from .TFWeaponGun import TFWeaponGun
 from .WeaponMode import TFWeaponMode
 
-FLAME_VELOCITY = 2300
-FLAME_DRAG = 0.89
-FLAME_FLOAT = 50
-FLAME_TIME = 0.5
-FLAME_VECRAND = 0.05
-FLAME_BOXSIZE = 8
-FLAME_MAXDAMAGEDIST = 350
-FLAME_SHORTRANGEDAMAGEMULT = 1.2
-FLAME_VELOCITYFADESTART = 0.3
-FLAME_VELOCITYFADEEND = 0.5
-FLAME_START_SCALE = 16.0
-FLAME_END_SCALE = 80.0
-
-class FlameProjectile:
-
-    FlameModel = None
-
-    def __init__(self, shooter, src, dir):
-        self.shooter = shooter
-        self.srcPos = Point3(src)
-        self.pos = Point3(src)
-        self.dir = dir
-        self.damageAmount = 0.0
-
-        self.baseVelocity = self.dir * FLAME_VELOCITY
-        randomMin = -FLAME_VELOCITY * FLAME_VECRAND
-        randomMax = FLAME_VELOCITY * FLAME_VECRAND
-        self.baseVelocity += Vec3(random.uniform(randomMin, randomMax),
-                                  random.uniform(randomMin, randomMax),
-                                  random.uniform(randomMin, randomMax))
-        self.attackerVelocity = Vec3(self.shooter.velocity)
-        self.velocity = Vec3(self.baseVelocity)
-
-        self.size = Vec3(FLAME_BOXSIZE)
-        self.hitEnts = set()
-        self.team = self.shooter.team
-        self.task = base.simTaskMgr.add(self.__flameUpdate, 'flameUpdate')
-        self.filter = TFFilters.TFQueryFilter(self.shooter)
-
-        self.startTime = base.clockMgr.getTime()
-        self.killTime = self.startTime + FLAME_TIME
-        self.wasBlocked = False
-
-        if IS_CLIENT:
-            if not self.FlameModel:
-                self.FlameModel = base.loader.loadModel("models/effects/explosion").find("**/+SequenceNode")
-            self.explScale = 20.0
-            flame = self.FlameModel.copyTo(base.dynRender)
-            flame.setPos(src)
-            flame.hide(DirectRender.ShadowCameraBitmask)
-            duration = flame.node().getNumFrames() / flame.node().getFrameRate()
-            flame.node().setPlayRate(duration / FLAME_TIME)
-            flame.node().play()
-            flame.setBillboardPointEye()
-            self.flame = flame
-            self.flameLightColor = Vec3(1, 0.7, 0) * 1.5
-            self.flameLight = qpLight(qpLight.TPoint)
-            self.flameLight.setAttenuation(1, 0, 0.001)
-            self.flameLight.setAttenuationRadius(200)
-            self.flameLight.setPos(src)
-            self.flameLight.setColorLinear((0, 0, 0))
-            base.addDynamicLight(self.flameLight)
-
-    def __flameUpdate(self, task):
-        self.update()
-        return task.cont
-
-    def kill(self):
-        if self.task:
-            self.task.remove()
-            self.task = None
-        self.filter = None
-        self.shooter = None
-        self.hitEnts = None
-        if IS_CLIENT:
-            if self.flameLight:
-                base.removeDynamicLight(self.flameLight)
-                self.flameLight = None
-            if self.flame:
-                self.flame.removeNode()
-                self.flame = None
-
-    def update(self):
-        origDt = base.clock.dt
-        base.clock.dt = base.intervalPerTick
-
-        if base.clockMgr.getTime() >= self.killTime:
-            base.clock.dt = origDt
-            self.kill()
-            return
-
-        elapsed = base.clockMgr.getTime() - self.startTime
-        frac = max(0.0, min(1.0, elapsed / FLAME_TIME))
-
-        if IS_CLIENT:
-            if frac < 0.5:
-                self.flameLight.setColorSrgb(self.flameLightColor * (frac / 0.5))
-            else:
-                self.flameLight.setColorSrgb(self.flameLightColor * (1.0 - ((frac - 0.5) / 0.5)))
-
-        if not self.wasBlocked:
-            attackerVelocityBlend = TFGlobals.remapValClamped(elapsed, FLAME_VELOCITYFADESTART,
-                FLAME_VELOCITYFADEEND, 1.0, 0.0)
-
-            self.baseVelocity *= FLAME_DRAG
-
-            # Add our float upward velocity.
-            velocity = self.baseVelocity + Vec3(0, 0, FLAME_FLOAT) + (self.attackerVelocity * attackerVelocityBlend)
-
-            # Update our velocity.
-            self.velocity = Vec3(velocity)
-
-        # Now clip the velocity.
-        oldPos = Vec3(self.pos)
-        blocked = TFFilters.collideAndSlide(
-            self.pos, self.velocity, {'type': 'sphere', 'radius': FLAME_BOXSIZE},
-            CollisionGroups.World, self.filter)
-        if blocked:
-            self.wasBlocked = True
-
-        if not IS_CLIENT:
-            tr = TFFilters.traceBox(oldPos, self.pos, -self.size, self.size, CollisionGroups.Mask_AllTeam,
-                                    self.filter)
-            ent = tr['ent']
-            if tr['hit'] and ent:
-                #if not ent.isPlayer() and not ent.isObject():
-                    # Kill the flame if we hit a non-player or object.
-                #    self.kill()
-                #    return
-
-                if ent not in self.hitEnts:
-                    self.hitEnts.add(ent)
-                    if not ent.isDead() and ent.team != self.team:
-
-                        dmgDist = (self.pos - self.srcPos).length()
-                        if dmgDist <= 125:
-                            # At very short range, apply short range damage multiplier
-                            mult = FLAME_SHORTRANGEDAMAGEMULT
-                        else:
-                            mult = TFGlobals.remapValClamped(dmgDist, FLAME_MAXDAMAGEDIST*0.5, FLAME_MAXDAMAGEDIST, 1.0, 0.25)
-                        dmg = self.damageAmount * mult
-                        dmg = max(dmg, 1.0)
-
-                        info = TakeDamageInfo()
-                        info.inflictor = self.shooter
-                        info.attacker = self.shooter
-                        info.damageType = TFGlobals.DamageType.Ignite | TFGlobals.DamageType.PreventPhysicsForce
-                        info.setDamage(dmg)
-                        ent.takeDamage(info)
-                        #if ent.isPlayer():
-                       #     ent.burn(self.shooter)
-                        #base.world.emitSoundSpatial("Weapon_FlameThrower.FireHit", self.pos)
-        else:
-            self.flame.setPos(self.pos)
-            self.flame.setScale((FLAME_START_SCALE / self.explScale) * (1.0 - frac) + (FLAME_END_SCALE / self.explScale) * frac)
-            self.flameLight.setPos(self.pos)
-
-        base.clock.dt = origDt
-
 class DistributedFlameThrower(TFWeaponGun):
 
     WeaponModel = "models/weapons/c_flamethrower"
@@ -222,7 +59,7 @@ class DistributedFlameThrower(TFWeaponGun):
             else:
                 src = self.getMuzzlePosWorld()
             dir = Vec3(dir[0], dir[1], dir[2])
-            FlameProjectile(self.player, src, dir)
+            base.flameMgr.fireFlame(self.player, src, dir)
 
         def generate(self):
             TFWeaponGun.generate(self)
@@ -338,9 +175,8 @@ class DistributedFlameThrower(TFWeaponGun):
             src = self.getMuzzlePosWorld()
             _, q = self.getProjectileFireSetup(self.player, Vec3(0), False, src)
             dir = q.getForward()
-            proj = FlameProjectile(self.player, src, dir)
             flameIval = 0.075
-            proj.damageAmount = self.dmgPerSec * flameIval
+            base.flameMgr.fireFlame(self.player, src, dir, self.dmgPerSec * flameIval)
             self.nextFlameFireTime = base.clockMgr.getTime() + flameIval
             self.sendUpdate('doFlame', [src, dir])
 
@@ -72,11 +72,8 @@ class DistributedKnife(TFWeaponMelee):
         self.readyToBackstab = False
 
     def itemPostFrame(self):
-        if not IS_CLIENT:
-            # Move other players back to history positions based on local player's lag.
-            base.air.lagComp.startLagCompensation(self.player, self.player.currentCommand)
-
-        self.syncAllHitBoxes()
+        # Move other players back to history positions based on local player's lag.
+        self.startSwingLagCompensation()
 
         self.backstabVMThink()
         TFWeaponMelee.itemPostFrame(self)
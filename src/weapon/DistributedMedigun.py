@@ -294,7 +294,12 @@ class DistributedMedigun(TFWeaponGun):
 
     def primaryAttack(self):
         if not IS_CLIENT:
-            base.air.lagComp.startLagCompensation(self.player, self.player.currentCommand)
+            # The heal beam sticks to a target in any direction, so move
+            # back every player within stick range of our eyes.  Heal
+            # traces don't test hit boxes.
+            base.air.lagComp.startLagCompensation(self.player, self.player.currentCommand,
+                                                  self.player.getEyePosition(), Vec3.forward(),
+                                                  0.0, 0.0, self.getStickRange())
 
         if self.findAndHealTargets():
             if not self.healing:
@@ -37,14 +37,13 @@ class DistributedRocketLauncher(TFWeaponGun):
         def doFireEffects(self):
             TFWeaponGun.doFireEffects(self)
             if not self.isOwnedByLocalPlayer():
-                from direct.interval.IntervalGlobal import Func, Sequence, Wait
                 from tf.tfbase import TFEffects
                 node = self.find("**/backblast")
                 if not node.isEmpty():
-                    effect = TFEffects.getRocketBackBlastEffect()
+                    effect = TFEffects.acquireEffect("rocket_backblast")
                     effect.setInput(0, node, False)
                     effect.start(base.dynRender)
-                    Sequence(Wait(0.1), Func(effect.softStop)).start()
+                    base.softStopParticleSystem(effect, 0.1, "rocket_backblast")
 
     def getName(self):
         return TFLocalizer.RocketLauncher
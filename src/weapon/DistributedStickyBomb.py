@@ -49,7 +49,7 @@ class DistributedStickyBomb(BaseClass):
             # Don't collide with teammates for the first bit of life.
             # This works around an issue where the sticky bomb gets shoved by
             # the player that shot the sticky.
-            self.addTask(self.__collideWithPlayersTask, 'stickyCollideWithPlayers', appendTask=True, sim=True, delay=0.25)
+            self.setNextThink(base.clockMgr.getTime() + 0.25, self.__collideWithPlayersThink, 'collideWithPlayers')
 
             # Always collide with enemies from the get-go, but don't collide with teammates
             # until later.
@@ -59,12 +59,12 @@ class DistributedStickyBomb(BaseClass):
                 otherMask = CollisionGroups.Mask_Red
             self.setIntoCollideMask(self.intoCollideMask | otherMask)
 
+            # This one stays a task, it has to run after the physics update.
             self.addTask(self.__stickTask, 'stickTask', appendTask=True, sim=True, sort=51)
 
-        def __collideWithPlayersTask(self, task):
+        def __collideWithPlayersThink(self):
             # Add players and buildings onto the sticky's into mask.
             self.setIntoCollideMask(self.intoCollideMask | CollisionGroups.Mask_AllTeam)
-            return task.done
 
         #def __stickTask(self, task):
 
@@ -2,6 +2,8 @@ import random
 
 from panda3d.core import *
 
+from tf.tfbase import CollisionGroups, TFFilters
+
 from .TakeDamageInfo import *
 from .WeaponEffects import *
 
@@ -10,6 +12,32 @@ if IS_CLIENT:
 else:
     tf_server_lag_comp_debug = ConfigVariableBool("tf-server-lag-comp-debug", False).value
 
+def computePelletDirs(forward, right, up, seed, spread, count):
+    """
+    Returns the normalized direction of each of count pellets.  Each pellet
+    reseeds the generator with seed + its index, so the client and server
+    compute the same pattern.
+    """
+    rand = random.Random()
+    uniform = rand.uniform
+    fx, fy, fz = forward[0], forward[1], forward[2]
+    rx, ry, rz = right[0] * spread, right[1] * spread, right[2] * spread
+    ux, uy, uz = up[0] * spread, up[1] * spread, up[2] * spread
+    dirs = []
+    for i in range(count):
+        rand.seed(seed + i)
+
+        # Get circular gaussian spread.
+        x = uniform(-0.5, 0.5) + uniform(-0.5, 0.5)
+        y = uniform(-0.5, 0.5) + uniform(-0.5, 0.5)
+
+        dir = Vec3(fx + rx * x + ux * y,
+                   fy + ry * x + uy * y,
+                   fz + rz * x + uz * y)
+        dir.normalize()
+        dirs.append(dir)
+    return dirs
+
 def fireBullets(player, origin, angles, weapon, mode, seed, spread, damage = -1.0, critical = False, tracerAttachment = None, tracerStagger=0.0, tracerSpread=0.0):
     """
     Fires some bullets.  Server does damage calculations.  Client would
@@ -18,8 +46,25 @@ def fireBullets(player, origin, angles, weapon, mode, seed, spread, damage = -1.
 
     doEffects = False
 
+    q = Quat()
+    q.setHpr(angles)
+    forward = q.getForward()
+    right = q.getRight()
+    up = q.getUp()
+
+    weaponData = weapon.weaponData.get(mode, {})
+    distance = weaponData.get('range', 1000000)
+
     if not IS_CLIENT:
-        base.air.lagComp.startLagCompensation(player, player.currentCommand)
+        # Every pellet lies within this cone around the aim direction.  Only
+        # players and hitboxes that could be inside it need to be moved and
+        # synced.
+        coneSpread = spread * 1.415
+        base.air.lagComp.startLagCompensation(player, player.currentCommand,
+                                              origin, forward, distance, coneSpread)
+
+        # Sync hitboxes *after* lag compensation.
+        base.net.syncHitBoxesInCone(origin, forward, distance, coneSpread)
 
     elif base.cr.prediction.hasBeenPredicted():
         # Don't see why we would need to predict bullets more than once.  It's only used
@@ -27,8 +72,8 @@ def fireBullets(player, origin, angles, weapon, mode, seed, spread, damage = -1.
         # hit doesn't affect prediction results.
         return
 
-    # Sync hitboxes *after* lag compensation.
-    base.net.syncAllHitBoxes()
+    else:
+        base.net.syncAllHitBoxes()
 
     doLagCompDebug = __debug__ and tf_client_lag_comp_debug if IS_CLIENT else tf_server_lag_comp_debug
     if doLagCompDebug:
@@ -44,22 +89,13 @@ def fireBullets(player, origin, angles, weapon, mode, seed, spread, damage = -1.
                 for h in do.hitBoxes:
                     hitBoxPositions.append(Point3(NodePath(h.body).getNetTransform().getPos()))
 
-
-    q = Quat()
-    q.setHpr(angles)
-    forward = q.getForward()
-    right = q.getRight()
-    up = q.getUp()
-
-    weaponData = weapon.weaponData.get(mode, {})
-
     fireInfo = {}
     fireInfo['src'] = origin
     if damage < 0.0:
         fireInfo['damage'] = weaponData.get('damage', 1.0)
     else:
         fireInfo['damage'] = int(damage)
-    fireInfo['distance'] = weaponData.get('range', 1000000)
+    fireInfo['distance'] = distance
     fireInfo['shots'] = weaponData.get('bulletsPerShot', 1)
     fireInfo['spread'] = Vec3(spread, spread, 0.0)
     fireInfo['ammoType'] = 0
@@ -75,35 +111,22 @@ def fireBullets(player, origin, angles, weapon, mode, seed, spread, damage = -1.
     # Reset multi-damage structures.
     clearMultiDamage()
 
-    rand = random.Random()
+    bulletsPerShot = weaponData.get('bulletsPerShot', 1)
+    rayDirs = computePelletDirs(forward, right, up, seed, spread, bulletsPerShot)
 
-    if doLagCompDebug:
-        rayDirs = []
+    # Trace every pellet up front.  Hitboxes were synced once above, and
+    # damage is accumulated per entity until applyMultiDamage().
+    traces = TFFilters.traceLines(origin, rayDirs, distance, CollisionGroups.Mask_BulletCollide,
+                                  TFFilters.TFQueryFilter(player))
 
     tracerDelay = 0.0
-
-    bulletsPerShot = weaponData.get('bulletsPerShot', 1)
     for i in range(bulletsPerShot):
-        rand.seed(seed)
-
-        # Get circular gaussian spread.
-        x = rand.uniform(-0.5, 0.5) + rand.uniform(-0.5, 0.5)
-        y = rand.uniform(-0.5, 0.5) + rand.uniform(-0.5, 0.5)
-
         # Initialize the variable firing information
-        fireInfo['dirShooting'] = forward + (right * x * spread) + (up * y * spread)
-        fireInfo['dirShooting'].normalize()
+        fireInfo['dirShooting'] = rayDirs[i]
         fireInfo['tracerDelay'] = tracerDelay
         tracerDelay += tracerStagger
 
-        if doLagCompDebug:
-            rayDirs.append(fireInfo['dirShooting'])
-
-        # Fire the bullet!
-        player.fireBullet(fireInfo, doEffects, damageType, customDamageType)
-
-        # Use new seed for next bullet.
-        seed += 1
+        player.onBulletTrace(fireInfo, traces[i], doEffects, damageType, customDamageType)
 
     if doLagCompDebug:
         if not IS_CLIENT:
@@ -0,0 +1,307 @@
+"""FlameManager module: contains the FlameManager class."""
+
+import collections
+import random
+
+from panda3d.core import Point3, PStatCollector, Vec3, qpLight
+
+from direct.directbase import DirectRender
+from direct.directnotify.DirectNotifyGlobal import directNotify
+from tf.tfbase import CollisionGroups, TFFilters, TFGlobals
+from tf.weapon.TakeDamageInfo import TakeDamageInfo
+
+FLAME_VELOCITY = 2300
+FLAME_DRAG = 0.89
+FLAME_FLOAT = 50
+FLAME_TIME = 0.5
+FLAME_VECRAND = 0.05
+FLAME_BOXSIZE = 8
+FLAME_MAXDAMAGEDIST = 350
+FLAME_SHORTRANGEDAMAGEMULT = 1.2
+FLAME_VELOCITYFADESTART = 0.3
+FLAME_VELOCITYFADEEND = 0.5
+FLAME_START_SCALE = 16.0
+FLAME_END_SCALE = 80.0
+FLAME_COLL_INFO = {'type': 'sphere', 'radius': FLAME_BOXSIZE}
+FLAME_LIGHT_COLOR = Vec3(1, 0.7, 0) * 1.5
+FLAME_LIGHT_RADIUS = 200
+FLAME_EXPL_SCALE = 20.0
+
+flamesPColl = PStatCollector("App:Flames")
+activeFlamesPColl = PStatCollector("Flames:Active")
+
+class FlameStream:
+    """
+    The flames fired by one shooter.  The flames of a stream share a query
+    filter and, on the client, one light that stands in for all of them.
+    """
+
+    __slots__ = ('shooter', 'filter', 'numFlames', 'light', 'lightPos', 'lightWeight')
+
+    def __init__(self, shooter):
+        self.shooter = shooter
+        self.filter = TFFilters.TFQueryFilter(shooter)
+        self.numFlames = 0
+        self.light = None
+        # Accumulated while simulating the stream's flames each tick.
+        self.lightPos = Vec3()
+        self.lightWeight = 0.0
+
+class FlameManager:
+    """
+    Simulates the flames of every flamethrower in one update per tick.
+    Flame state is kept in parallel arrays indexed by slot, allocated once
+    up front, and slots are recycled as flames burn out.  When every slot
+    is in use, the oldest flame is evicted to make room for a new one.
+
+    On the client, each slot owns a reusable flame sprite, and instead of
+    a dynamic light per flame each stream gets a single light at the
+    intensity-weighted center of its flames.  At most maxStreamLights
+    streams are lit at once.
+    """
+
+    notify = directNotify.newCategory("FlameManager")
+
+    FlameModel = None
+
+    def __init__(self, maxFlames=256, maxStreamLights=8):
+        self.maxFlames = maxFlames
+        self.maxStreamLights = maxStreamLights
+
+        n = maxFlames
+        self.stream = [None] * n
+        self.team = [0] * n
+        self.damage = [0.0] * n
+        self.startTime = [0.0] * n
+        self.killTime = [0.0] * n
+        self.wasBlocked = [False] * n
+        self.srcPos = [Point3() for _ in range(n)]
+        self.pos = [Point3() for _ in range(n)]
+        self.baseVelocity = [Vec3() for _ in range(n)]
+        self.attackerVelocity = [Vec3() for _ in range(n)]
+        self.velocity = [Vec3() for _ in range(n)]
+        self.hitEnts = [set() for _ in range(n)]
+        if IS_CLIENT:
+            self.sprites = [None] * n
+
+        self.freeSlots = list(reversed(range(n)))
+        # Live slots in the order they were fired.  Every flame lives for
+        # FLAME_TIME, so this is also the order they burn out in.
+        self.activeSlots = collections.deque()
+
+        # Shooter -> FlameStream.
+        self.streams = {}
+
+        self.trace = TFFilters.TraceResult()
+        self.size = Vec3(FLAME_BOXSIZE)
+
+        self.numFired = 0
+        self.numEvicted = 0
+        self.task = None
+
+    def start(self, sort=0):
+        if not self.task:
+            self.task = base.simTaskMgr.add(self.__flameUpdate, 'flameUpdate', sort=sort)
+
+    def stop(self):
+        if self.task:
+            self.task.remove()
+            self.task = None
+
+    def getNumActive(self):
+        return len(self.activeSlots)
+
+    def fireFlame(self, shooter, src, dir, damage=0.0):
+        """
+        Fires a flame from the shooter at src, moving along dir.  damage is
+        dealt to each enemy the flame touches, scaled by distance.
+        """
+        if not self.freeSlots:
+            self.freeSlot(self.activeSlots.popleft())
+            self.numEvicted += 1
+        i = self.freeSlots.pop()
+        self.activeSlots.append(i)
+        self.numFired += 1
+
+        stream = self.streams.get(shooter)
+        if not stream:
+            stream = FlameStream(shooter)
+            self.streams[shooter] = stream
+        stream.numFlames += 1
+
+        now = base.clockMgr.getTime()
+        self.stream[i] = stream
+        self.team[i] = shooter.team
+        self.damage[i] = damage
+        self.startTime[i] = now
+        self.killTime[i] = now + FLAME_TIME
+        self.wasBlocked[i] = False
+        self.srcPos[i].assign(src)
+        self.pos[i].assign(src)
+
+        randomMin = -FLAME_VELOCITY * FLAME_VECRAND
+        randomMax = FLAME_VELOCITY * FLAME_VECRAND
+        baseVelocity = self.baseVelocity[i]
+        baseVelocity.assign(dir * FLAME_VELOCITY)
+        baseVelocity += Vec3(random.uniform(randomMin, randomMax),
+                             random.uniform(randomMin, randomMax),
+                             random.uniform(randomMin, randomMax))
+        self.attackerVelocity[i].assign(shooter.velocity)
+        self.velocity[i].assign(baseVelocity)
+
+        if IS_CLIENT:
+            sprite = self.sprites[i]
+            if not sprite:
+                if not FlameManager.FlameModel:
+                    FlameManager.FlameModel = base.loader.loadModel("models/effects/explosion").find("**/+SequenceNode")
+                sprite = self.FlameModel.copyTo(base.dynRender)
+                sprite.hide(DirectRender.ShadowCameraBitmask)
+                sprite.setBillboardPointEye()
+                seq = sprite.node()
+                duration = seq.getNumFrames() / seq.getFrameRate()
+                seq.setPlayRate(duration / FLAME_TIME)
+                self.sprites[i] = sprite
+            else:
+                sprite.unstash()
+            sprite.setPos(src)
+            sprite.setScale(FLAME_START_SCALE / FLAME_EXPL_SCALE)
+            # A recycled sprite would otherwise carry on from the frame it
+            # was on when its last flame went out.
+            sprite.node().pose(0)
+            sprite.node().play()
+
+        return i
+
+    def freeSlot(self, i):
+        stream = self.stream[i]
+        stream.numFlames -= 1
+        if stream.numFlames <= 0:
+            if stream.light:
+                base.removeDynamicLight(stream.light)
+                stream.light = None
+            del self.streams[stream.shooter]
+        self.stream[i] = None
+        self.hitEnts[i].clear()
+        if IS_CLIENT:
+            self.sprites[i].stash()
+        self.freeSlots.append(i)
+
+    def clear(self):
+        """
+        Puts out every flame.
+        """
+        while self.activeSlots:
+            self.freeSlot(self.activeSlots.popleft())
+
+    def __flameUpdate(self, task):
+        activeSlots = self.activeSlots
+        if not activeSlots:
+            activeFlamesPColl.setLevel(0)
+            return task.cont
+
+        flamesPColl.start()
+
+        now = base.clockMgr.getTime()
+        while activeSlots and now >= self.killTime[activeSlots[0]]:
+            self.freeSlot(activeSlots.popleft())
+
+        if IS_CLIENT:
+            for stream in self.streams.values():
+                stream.lightPos.set(0, 0, 0)
+                stream.lightWeight = 0.0
+
+        # Flames move a full tick each update.
+        origDt = base.clock.dt
+        base.clock.dt = base.intervalPerTick
+        for i in activeSlots:
+            self.__simulateFlame(i, now)
+        base.clock.dt = origDt
+
+        if IS_CLIENT:
+            self.__updateStreamLights()
+
+        activeFlamesPColl.setLevel(len(activeSlots))
+        flamesPColl.stop()
+
+        return task.cont
+
+    def __simulateFlame(self, i, now):
+        stream = self.stream[i]
+        pos = self.pos[i]
+        velocity = self.velocity[i]
+        elapsed = now - self.startTime[i]
+        frac = max(0.0, min(1.0, elapsed / FLAME_TIME))
+
+        if not self.wasBlocked[i]:
+            attackerVelocityBlend = TFGlobals.remapValClamped(elapsed, FLAME_VELOCITYFADESTART,
+                FLAME_VELOCITYFADEEND, 1.0, 0.0)
+
+            baseVelocity = self.baseVelocity[i]
+            baseVelocity *= FLAME_DRAG
+
+            # Add our float upward velocity.
+            velocity.assign(baseVelocity + Vec3(0, 0, FLAME_FLOAT) + (self.attackerVelocity[i] * attackerVelocityBlend))
+
+        # Now clip the velocity.
+        oldPos = Point3(pos)
+        if TFFilters.collideAndSlide(pos, velocity, FLAME_COLL_INFO,
+                                     CollisionGroups.World, stream.filter, self.trace):
+            self.wasBlocked[i] = True
+
+        if not IS_CLIENT:
+            tr = TFFilters.traceBox(oldPos, pos, -self.size, self.size, CollisionGroups.Mask_AllTeam,
+                                    stream.filter, tr=self.trace)
+            ent = tr.ent
+            if tr.hit and ent:
+                hitEnts = self.hitEnts[i]
+                if ent not in hitEnts:
+                    hitEnts.add(ent)
+                    if not ent.isDead() and ent.team != self.team[i]:
+                        dmgDist = (pos - self.srcPos[i]).length()
+                        if dmgDist <= 125:
+                            # At very short range, apply short range damage multiplier
+                            mult = FLAME_SHORTRANGEDAMAGEMULT
+                        else:
+                            mult = TFGlobals.remapValClamped(dmgDist, FLAME_MAXDAMAGEDIST*0.5, FLAME_MAXDAMAGEDIST, 1.0, 0.25)
+                        dmg = self.damage[i] * mult
+                        dmg = max(dmg, 1.0)
+
+                        info = TakeDamageInfo()
+                        info.inflictor = stream.shooter
+                        info.attacker = stream.shooter
+                        info.damageType = TFGlobals.DamageType.Ignite | TFGlobals.DamageType.PreventPhysicsForce
+                        info.setDamage(dmg)
+                        ent.takeDamage(info)
+        else:
+            sprite = self.sprites[i]
+            sprite.setPos(pos)
+            sprite.setScale((FLAME_START_SCALE / FLAME_EXPL_SCALE) * (1.0 - frac) + (FLAME_END_SCALE / FLAME_EXPL_SCALE) * frac)
+
+            # Flames brighten over the first half of their life and fade out
+            # over the second half.
+            if frac < 0.5:
+                intensity = frac / 0.5
+            else:
+                intensity = 1.0 - ((frac - 0.5) / 0.5)
+            stream.lightPos += pos * intensity
+            stream.lightWeight += intensity
+
+    def __updateStreamLights(self):
+        # Light the streams with the most flame first.
+        streams = sorted(self.streams.values(), key=lambda s: s.lightWeight, reverse=True)
+        for n, stream in enumerate(streams):
+            if n >= self.maxStreamLights or stream.lightWeight <= 0.0:
+                if stream.light:
+                    base.removeDynamicLight(stream.light)
+                    stream.light = None
+                continue
+
+            if not stream.light:
+                stream.light = qpLight(qpLight.TPoint)
+                stream.light.setAttenuation(1, 0, 0.001)
+                stream.light.setAttenuationRadius(FLAME_LIGHT_RADIUS)
+                stream.light.setColorLinear((0, 0, 0))
+                base.addDynamicLight(stream.light)
+
+            stream.light.setPos(stream.lightPos / stream.lightWeight)
+            stream.light.setColorSrgb(FLAME_LIGHT_COLOR * min(1.0, stream.lightWeight))
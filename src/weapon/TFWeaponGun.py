@@ -88,10 +88,13 @@ class TFWeaponGun(BaseClass):
         self.nextSecondaryAttack = base.clockMgr.getTime() + 0.5
 
     def fireProjectile(self, player):
-        self.syncAllHitBoxes()
-
         projType = self.weaponData[self.weaponMode]['projectile']
 
+        if projType != TFProjectileType.Bullet:
+            # Bullets sync only the hit boxes along the shot, after lag
+            # compensation.
+            self.syncAllHitBoxes()
+
         if projType == TFProjectileType.Bullet:
             self.fireBullet(player)
         elif projType == TFProjectileType.Rocket:
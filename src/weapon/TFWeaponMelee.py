@@ -15,6 +15,7 @@ from .WeaponMode import TFWeaponMode
 
 SWING_MINS = Vec3(-18)
 SWING_MAXS = Vec3(18)
+SWING_RANGE = 48
 
 tf_meleeattackforcescale = 80.0
 
@@ -82,14 +83,30 @@ class TFWeaponMelee(TFWeapon):
 
         TFWeapon.itemPostFrame(self)
 
+    def getSwingRay(self):
+        q = Quat()
+        q.setHpr(self.player.viewAngles)
+        return self.player.getEyePosition(), q.getForward()
+
+    def startSwingLagCompensation(self):
+        """
+        Moves back the players and syncs the hit boxes that the swing trace
+        could touch.  On the client, all hit boxes are synced.
+        """
+        if not IS_CLIENT:
+            swingStart, forward = self.getSwingRay()
+            swingRadius = SWING_MAXS.length()
+            base.air.lagComp.startLagCompensation(self.player, self.player.currentCommand,
+                                                  swingStart, forward, SWING_RANGE, 0.0, swingRadius)
+            base.net.syncHitBoxesInCone(swingStart, forward, SWING_RANGE, 0.0, swingRadius)
+        else:
+            self.syncAllHitBoxes()
+
     def doSwingTrace(self):
 
         # Setup swing range
-        q = Quat()
-        q.setHpr(self.player.viewAngles)
-        forward = q.getForward()
-        swingStart = self.player.getEyePosition()
-        swingEnd = swingStart + (forward * 48)
+        swingStart, forward = self.getSwingRay()
+        swingEnd = swingStart + (forward * SWING_RANGE)
 
         # See if we hit anything.
         filter = TFFilters.TFQueryFilter(self.player)
@@ -106,10 +123,7 @@ class TFWeaponMelee(TFWeapon):
         return self.weaponData[self.weaponMode]['damage']
 
     def smack(self):
-        if not IS_CLIENT:
-            base.air.lagComp.startLagCompensation(self.player, self.player.currentCommand)
-
-        self.syncAllHitBoxes()
+        self.startSwingLagCompensation()
 
         tr = self.doSwingTrace()
         if tr['hit']:
@@ -52,48 +52,56 @@ class MultiDamage(TakeDamageInfo):
     def isClear(self):
         return self.target is None
 
-g_multiDamage = MultiDamage()
+# Entity -> MultiDamage, in the order the entities were first damaged.  Each
+# entity gets one accumulator, so pellets that alternate between targets are
+# still summed into a single takeDamage() call per entity.
+g_multiDamages = {}
 
 def clearMultiDamage():
     """
-    Resets the global multi-damage accumulator.
+    Resets the global multi-damage accumulators.
     """
-    g_multiDamage.clear()
+    g_multiDamages.clear()
 
 def applyMultiDamage():
     """
-    Inflicts conents of global multi-damage register on multi-damage target.
+    Inflicts contents of global multi-damage registers on their targets.
     """
-    if not g_multiDamage.target:
+    if not g_multiDamages:
         return
 
-    #print("applying multi-damage", g_multiDamage.damage, "to", g_multiDamage.target)
-    g_multiDamage.target.takeDamage(g_multiDamage)
+    # Take the accumulators out before applying, in case the damage causes
+    # another multi-damage (i.e. a building exploding on destruction).
+    damages = list(g_multiDamages.values())
+    g_multiDamages.clear()
 
-    clearMultiDamage()
+    for dmg in damages:
+        #print("applying multi-damage", dmg.damage, "to", dmg.target)
+        dmg.target.takeDamage(dmg)
 
 def addMultiDamage(info, entity):
     """
-    Add damage to the existing multi-damage, and apply if it won't fit.
+    Add damage to the multi-damage accumulator of the given entity.
     """
     if not entity:
         return
 
-    if entity != g_multiDamage.target:
-        applyMultiDamage()
-        g_multiDamage.clear()
-        g_multiDamage.target = entity
-        g_multiDamage.inflictor = info.inflictor
-        g_multiDamage.attacker = info.attacker
-        g_multiDamage.damageType = info.damageType
-        g_multiDamage.customDamage = info.customDamage
-
-    g_multiDamage.damageType |= info.damageType
-    g_multiDamage.setDamage(g_multiDamage.damage + info.damage)
-    g_multiDamage.damageForce += info.damageForce
-    g_multiDamage.damagePosition = info.damagePosition
-    g_multiDamage.sourcePosition = info.sourcePosition
-    g_multiDamage.ammoType = info.ammoType
+    dmg = g_multiDamages.get(entity)
+    if dmg is None:
+        dmg = MultiDamage()
+        dmg.target = entity
+        dmg.inflictor = info.inflictor
+        dmg.attacker = info.attacker
+        dmg.damageType = info.damageType
+        dmg.customDamage = info.customDamage
+        g_multiDamages[entity] = dmg
+
+    dmg.damageType |= info.damageType
+    dmg.setDamage(dmg.damage + info.damage)
+    dmg.damageForce += info.damageForce
+    dmg.damagePosition = info.damagePosition
+    dmg.sourcePosition = info.sourcePosition
+    dmg.ammoType = info.ammoType
 
 def calculateBulletDamageForce(info, forceDir, forceOrigin, scale):
     info.damagePosition = forceOrigin
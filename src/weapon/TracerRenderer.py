@@ -0,0 +1,170 @@
+"""TracerRenderer module: contains the TracerRenderer class."""
+
+import collections
+
+from panda3d.core import *
+
+from tf.weapon import WeaponEffects
+
+tracersPColl = PStatCollector("App:Tracers")
+liveTracersPColl = PStatCollector("Tracers:Live")
+
+TRACER_SPEED = 7500
+TRACER_MAX_LENGTH = 128
+TRACER_HEAD_COLOR = (1.0, 0.9, 0.6, 1.0)
+TRACER_TAIL_COLOR = (0.0, 0.0, 0.0, 0.0)
+
+class TracerRenderer:
+    """
+    Draws every bullet tracer as a line in one shared vertex buffer.  A
+    single task moves the live tracers each frame and rewrites only their
+    end points, so the cost doesn't depend on the fire rate.  There is a
+    fixed number of tracer slots; when they are all in use, the oldest
+    tracer is thrown away to make room for a new one.
+
+    A tracer's head travels from the start to the end point at
+    TRACER_SPEED, with the tail trailing up to TRACER_MAX_LENGTH behind,
+    and disappears once the tail reaches the end point.
+    """
+
+    def __init__(self, maxTracers=128):
+        self.maxTracers = maxTracers
+
+        n = maxTracers
+        self.startPos = [Point3() for _ in range(n)]
+        self.dir = [Vec3() for _ in range(n)]
+        self.length = [0.0] * n
+        self.tailLength = [0.0] * n
+        self.startTime = [0.0] * n
+        self.wantSound = [False] * n
+        self.freeSlots = list(reversed(range(n)))
+        # Live slots, oldest first.
+        self.liveSlots = collections.deque()
+
+        # Each tracer is a line from its head to its tail.  The colors
+        # never change, so they are written once, and each frame the live
+        # tracers are packed into the front of the buffer.
+        vdata = GeomVertexData('tracers', GeomVertexFormat.getV3c4(), GeomEnums.UHDynamic)
+        vdata.uncleanSetNumRows(n * 2)
+        cwriter = GeomVertexWriter(vdata, InternalName.getColor())
+        vwriter = GeomVertexWriter(vdata, InternalName.getVertex())
+        for _ in range(n):
+            cwriter.setData4f(*TRACER_HEAD_COLOR)
+            cwriter.setData4f(*TRACER_TAIL_COLOR)
+            vwriter.setData3f(0, 0, 0)
+            vwriter.setData3f(0, 0, 0)
+
+        geom = Geom(vdata)
+        geom.addPrimitive(GeomLines(GeomEnums.UHDynamic))
+        geomNode = GeomNode('tracers')
+        geomNode.addGeom(geom)
+        # The tracers can be anywhere, don't recompute the bounds every
+        # time they move.
+        geomNode.setBounds(OmniBoundingVolume())
+        geomNode.setFinal(True)
+        self.geomNode = geomNode
+
+        np = base.dynRender.attachNewNode(geomNode)
+        np.setLightOff(1)
+        np.setBin('fixed', 2)
+        np.setRenderModeThickness(4)
+        np.setAttrib(ColorBlendAttrib.make(ColorBlendAttrib.MAdd, ColorBlendAttrib.OOne, ColorBlendAttrib.OOne), 1)
+        np.stash()
+        self.np = np
+
+        self.numEvicted = 0
+        self.task = base.taskMgr.add(self.__updateTracers, 'updateTracers', sort=47)
+
+    def cleanup(self):
+        if self.task:
+            self.task.remove()
+            self.task = None
+        if self.np:
+            self.np.removeNode()
+            self.np = None
+        self.geomNode = None
+
+    def getNumLive(self):
+        return len(self.liveSlots)
+
+    def addTracer(self, start, end, doSound=True, delay=0.0):
+        traceDir = end - start
+        traceLen = traceDir.length()
+        if traceLen <= 0.0:
+            return
+        traceDir /= traceLen
+
+        if not self.freeSlots:
+            self.freeSlots.append(self.liveSlots.popleft())
+            self.numEvicted += 1
+        i = self.freeSlots.pop()
+        self.liveSlots.append(i)
+
+        self.startPos[i].assign(start)
+        self.dir[i].assign(traceDir)
+        self.length[i] = traceLen
+        self.tailLength[i] = min(TRACER_MAX_LENGTH, traceLen)
+        self.startTime[i] = base.clockMgr.getClientFrameTime() + delay
+        self.wantSound[i] = doSound
+
+    def clear(self):
+        while self.liveSlots:
+            self.freeSlots.append(self.liveSlots.popleft())
+
+    def __updateTracers(self, task):
+        liveSlots = self.liveSlots
+        if not liveSlots:
+            if not self.np.isStashed():
+                self.np.stash()
+            liveTracersPColl.setLevel(0)
+            return task.cont
+
+        tracersPColl.start()
+
+        now = base.clockMgr.getClientFrameTime()
+        geom = self.geomNode.modifyGeom(0)
+        vwriter = GeomVertexWriter(geom.modifyVertexData(), InternalName.getVertex())
+        numDrawn = 0
+        for _ in range(len(liveSlots)):
+            i = liveSlots.popleft()
+            elapsed = now - self.startTime[i]
+            if elapsed < 0.0:
+                # Still delayed.
+                liveSlots.append(i)
+                continue
+
+            if self.wantSound[i]:
+                self.wantSound[i] = False
+                start = self.startPos[i]
+                WeaponEffects.tracerSound(start, start + self.dir[i] * self.length[i])
+
+            traveled = elapsed * TRACER_SPEED
+            length = self.length[i]
+            tailDist = traveled - self.tailLength[i]
+            if tailDist >= length:
+                # The tail reached the end point.
+                self.freeSlots.append(i)
+                continue
+
+            start = self.startPos[i]
+            dir = self.dir[i]
+            head = start + dir * min(traveled, length)
+            tail = start + dir * max(0.0, tailDist)
+            vwriter.setData3f(head)
+            vwriter.setData3f(tail)
+            numDrawn += 1
+            liveSlots.append(i)
+
+        prim = geom.modifyPrimitive(0)
+        prim.clearVertices()
+        if numDrawn:
+            prim.addConsecutiveVertices(0, numDrawn * 2)
+            if self.np.isStashed():
+                self.np.unstash()
+        elif not self.np.isStashed():
+            self.np.stash()
+
+        liveTracersPColl.setLevel(len(liveSlots))
+        tracersPColl.stop()
+
+        return task.cont
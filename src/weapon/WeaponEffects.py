@@ -1,7 +1,7 @@
 
 from panda3d.core import *
 
-from direct.interval.IntervalGlobal import Func, LerpFunc, Sequence, Wait
+from direct.interval.IntervalGlobal import Func, LerpFunc, Sequence
 from tf.tfbase import Sounds, TFEffects
 
 
@@ -77,10 +77,11 @@ def makeMuzzleFlash(node, pos, hpr, scale, color = (1, 1, 1, 1), viewModel=False
         saveTime = base.clockMgr.getClientTime()
         base.clock.frame_time = base.clockMgr.getClientFrameTime()
 
-    effect = TFEffects.getMuzzleFlashEffect(viewModel)
+    effectName = "muzzle_flash_viewmodel" if viewModel else "muzzle_flash"
+    effect = TFEffects.acquireEffect(effectName)
     effect.setInput(0, node, False)
     effect.start(node)
-    Sequence(Wait(0.1), Func(effect.softStop)).start()
+    base.softStopParticleSystem(effect, 0.1, effectName)
 
     if base.clockMgr.isInSimulationClock():
         # Restore the simulation time.